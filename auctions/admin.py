@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import AuctionListing, Bid, Comment, Category
+from .models import AuctionListing, Bid, Comment, Category, ProxyBid
 
 # Register your models here.
 admin.site.register(AuctionListing)
 admin.site.register(Bid)
+admin.site.register(ProxyBid)
 admin.site.register(Comment)
 admin.site.register(Category)
@@ -0,0 +1,332 @@
+"""
+Marketplace analytics: bids per hour, final prices and sell-through per category, most watched listings.
+
+The report only reads hourly rollup rows (BidRollup, SalesRollup) and the watcher_count of the
+listings, never the bids or the watchers table, so it takes the same time however long the history
+is. The rollups are added to in the transaction of the bid or the closing that changes them, like the
+catalog stats (catalog.py), and backfill() builds them again from the ledger and the closed listings.
+
+A bid counts in the hour it was first placed with its current amount: editing it changes the volume
+of that hour, deleting it takes it out.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .models import AuctionListing, BidRollup, LedgerEvent, SalesRollup, watch_stats_expressions
+
+# Rows per query of the backfill
+BATCH_SIZE = 5000
+TOP_WATCHED = 10
+# Days the report covers unless ?days= says otherwise, and hours of the bids per hour chart
+DAYS = 30
+MAX_DAYS = 366
+HOURS = 48
+
+SALES_FIELDS = ("category_id", "closed_at", "winner_id", "current_price")
+
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _add(model, hour, category_id, **amounts):
+    # Adds to the counters of one rollup row, created by the first change of its hour
+    rows = model.objects.filter(hour=hour, category_id=category_id)
+    changes = {name: F(name) + amount for name, amount in amounts.items()}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(hour=hour, category_id=category_id, **amounts)
+    except IntegrityError:
+        # Another process created it in the meantime
+        rows.update(**changes)
+
+
+def _subtract(model, hour, category_id, **amounts):
+    # Takes back what _add() added, the row exists then
+    model.objects.filter(hour=hour, category_id=category_id).update(**{
+        name: Greatest(F(name) - amount, 0) for name, amount in amounts.items()
+    })
+
+
+def _add_all(model, totals):
+    # {(hour, category id): {field: amount}}, one UPDATE per row
+    for (hour, category_id), amounts in totals.items():
+        _add(model, hour, category_id, **amounts)
+
+
+def _bid_totals(bids):
+    totals = defaultdict(lambda: {"bids": 0, "volume": Decimal(0)})
+    for category_id, amount, placed_at in bids:
+        row = totals[hour_of(placed_at), category_id]
+        row["bids"] += 1
+        row["volume"] += Decimal(amount)
+    return totals
+
+
+def _sales_totals(listings):
+    totals = defaultdict(lambda: {"closed": 0, "sold": 0, "revenue": Decimal(0)})
+    for category_id, closed_at, winner_id, price in listings:
+        row = totals[hour_of(closed_at), category_id]
+        row["closed"] += 1
+        if winner_id is not None:
+            row["sold"] += 1
+            row["revenue"] += price
+    return totals
+
+
+def bid_placed(bid, placed_at):
+    # A new bid was placed at the time of its ledger event
+    _add_all(BidRollup, _bid_totals([(bid.auction.category_id, bid.amount, placed_at)]))
+
+
+def _placements(bid):
+    # (time, amount) of the placed events of the bid, oldest first
+    events = LedgerEvent.objects.filter(
+        auction_id=bid.auction_id, bid_id=bid.pk, kind=LedgerEvent.PLACED, recorded_at__isnull=False
+    )
+    return list(events.order_by("id").values_list("recorded_at", "amount"))
+
+
+def bid_edited(bid):
+    # The amount of a bid changed, its placed event for the new amount is already recorded
+    placements = _placements(bid)
+    if len(placements) < 2:
+        # Placed before the ledger existed, it counts from now on
+        if placements:
+            bid_placed(bid, placements[-1][0])
+        return
+    delta = placements[-1][1] - placements[-2][1]
+    if delta > 0:
+        _add(BidRollup, hour_of(placements[0][0]), bid.auction.category_id, volume=delta)
+    elif delta < 0:
+        _subtract(BidRollup, hour_of(placements[0][0]), bid.auction.category_id, volume=-delta)
+
+
+def bid_deleted(bid, category_id):
+    # The bid was retracted, it no longer counts in the hour it was placed
+    placements = _placements(bid)
+    if placements:
+        _subtract(BidRollup, hour_of(placements[0][0]), category_id, bids=1, volume=placements[-1][1])
+
+
+def events_recorded(events):
+    # Placed events written in bulk (imports), one query for the categories of their auctions
+    placed = [event for event in events if event.kind == LedgerEvent.PLACED and event.recorded_at]
+    if not placed:
+        return
+    listings = AuctionListing.objects.filter(pk__in={event.auction_id for event in placed})
+    categories = dict(listings.values_list("pk", "category_id"))
+    _add_all(BidRollup, _bid_totals(
+        (categories.get(event.auction_id), event.amount, event.recorded_at) for event in placed
+    ))
+
+
+def listings_closed(listing_ids, closed_at=None):
+    # Auctions close_auctions() (or an import) just closed, one query for the whole batch
+    closed = AuctionListing.objects.filter(pk__in=listing_ids, closed_at__isnull=False)
+    if closed_at is not None:
+        closed = closed.filter(closed_at=closed_at)
+    _add_all(SalesRollup, _sales_totals(closed.values_list(*SALES_FIELDS)))
+
+
+def refresh_watcher_counts(listing_ids=None):
+    # Count the watchers of the listings again, one UPDATE
+    listings = AuctionListing.objects.all()
+    if listing_ids is not None:
+        listings = listings.filter(pk__in=listing_ids)
+    return listings.update(**watch_stats_expressions())
+
+
+def watchers_changed(instance, action, reverse, pk_set):
+    # m2m_changed of the watchers: the listing, or the listings a user started or stopped watching
+    if action in ("post_add", "post_remove"):
+        refresh_watcher_counts(pk_set if reverse else [instance.pk])
+    elif action == "pre_clear" and reverse:
+        # Their ids are gone once the user's watchlist is cleared
+        instance._cleared_watchlist = list(instance.watchlist.values_list("pk", flat=True))
+    elif action == "post_clear":
+        refresh_watcher_counts(getattr(instance, "_cleared_watchlist", []) if reverse else [instance.pk])
+
+
+def _batches(queryset, fields, batch_size):
+    # Rows ordered by primary key, one query per batch (keyset pagination)
+    last = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last).order_by("pk").values_list("pk", *fields)[:batch_size])
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield rows
+
+
+def _sum_into(totals, batch):
+    for key, amounts in batch.items():
+        if key in totals:
+            for name, amount in amounts.items():
+                totals[key][name] += amount
+        else:
+            totals[key] = amounts
+
+
+def _fold_bids(bids, rows, categories):
+    # Placed and retracted events, in order, into {bid: [category id, first placed at, amount, standing]}
+    for event_id, auction_id, kind, bid_id, amount, recorded_at in rows:
+        key = bid_id if bid_id is not None else ("event", event_id)
+        bid = bids.get(key)
+        if kind == LedgerEvent.RETRACTED:
+            if bid is not None:
+                bid[3] = False
+        elif bid is not None:
+            # Edited, it keeps the hour it was first placed in
+            bid[2:] = [amount, True]
+        elif recorded_at is not None:
+            bids[key] = [categories.get(auction_id), recorded_at, amount, True]
+
+
+def _replace(model, totals):
+    # Swaps the rows in, the report never reads a half built table
+    model.objects.all().delete()
+    model.objects.bulk_create([
+        model(hour=hour, category_id=category_id, **amounts) for (hour, category_id), amounts in totals.items()
+    ], batch_size=BATCH_SIZE)
+
+
+def backfill(batch_size=BATCH_SIZE, report=None):
+    """
+    Builds the rollups and watcher counts again: the bids from the placed and retracted events of
+    the ledger, the sales from the closed listings. The rows are read batch_size at a time and summed
+    in memory (one entry per bid, then per hour and category), then swapped in in one transaction
+    with what was recorded in the meantime, so the report keeps its old numbers until then.
+
+    report(name, count) is called after each batch. Returns the rows read per kind.
+    """
+    counts = {"bids": 0, "closed": 0, "listings": 0}
+    kinds = (LedgerEvent.PLACED, LedgerEvent.RETRACTED)
+    fields = ("auction_id", "kind", "bid_id", "amount", "recorded_at")
+
+    def read_events(events, bids):
+        for rows in _batches(events, fields, batch_size):
+            listings = AuctionListing.objects.filter(pk__in={row[1] for row in rows})
+            _fold_bids(bids, rows, dict(listings.values_list("pk", "category_id")))
+            counts["bids"] += sum(1 for row in rows if row[2] == LedgerEvent.PLACED)
+            if report:
+                report("bids", counts["bids"])
+
+    def read_sales(listings, totals):
+        for rows in _batches(listings, SALES_FIELDS, batch_size):
+            _sum_into(totals, _sales_totals(row[1:] for row in rows))
+            counts["closed"] += len(rows)
+            if report:
+                report("closed", counts["closed"])
+
+    last_event_id = LedgerEvent.objects.aggregate(last=Max("id"))["last"] or 0
+    started = timezone.now()
+    bids = {}
+    read_events(LedgerEvent.objects.filter(kind__in=kinds, id__lte=last_event_id), bids)
+    sales_totals = {}
+    read_sales(AuctionListing.objects.filter(closed_at__lte=started), sales_totals)
+
+    with transaction.atomic():
+        # Deleting first holds back the live changes until the commit, the tail read after it
+        # has all the ones committed before
+        BidRollup.objects.all().delete()
+        SalesRollup.objects.all().delete()
+        read_events(LedgerEvent.objects.filter(kind__in=kinds, id__gt=last_event_id), bids)
+        read_sales(AuctionListing.objects.filter(closed_at__gt=started), sales_totals)
+        _replace(BidRollup, _bid_totals(
+            (category_id, amount, placed_at) for category_id, placed_at, amount, standing in bids.values() if standing
+        ))
+        _replace(SalesRollup, sales_totals)
+
+    for rows in _batches(AuctionListing.objects.all(), (), batch_size):
+        AuctionListing.objects.filter(pk__gte=rows[0][0], pk__lte=rows[-1][0]).update(**watch_stats_expressions())
+        counts["listings"] += len(rows)
+        if report:
+            report("listings", counts["listings"])
+    return counts
+
+
+def parse_days(value):
+    # ?days= of the report, DAYS when missing or invalid
+    try:
+        return min(max(int(value), 1), MAX_DAYS)
+    except (TypeError, ValueError):
+        return DAYS
+
+
+def _ratio(part, whole):
+    return part / whole if whole else None
+
+
+def build_report(days=DAYS, hours=HOURS, now=None):
+    """
+    The analytics of the last days as a dict (the JSON of the report), from the rollups alone:
+    bids per hour over the last hours, bids, sales, average final price and sell-through rate per
+    category, and the most watched open listings. Four queries, five when the catalog changed.
+    """
+    now = now or timezone.now()
+    current_hour = hour_of(now)
+    since = current_hour - timedelta(days=days)
+
+    first_hour = current_hour - timedelta(hours=hours - 1)
+    hourly = {
+        row["hour"]: row for row in
+        BidRollup.objects.filter(hour__gte=first_hour).values("hour").annotate(bids=Sum("bids"), volume=Sum("volume")).order_by()
+    }
+    bids_per_hour = []
+    for number in range(hours):
+        hour = first_hour + timedelta(hours=number)
+        row = hourly.get(hour, {})
+        bids_per_hour.append({"hour": hour, "bids": row.get("bids", 0), "volume": row.get("volume") or Decimal(0)})
+
+    categories = defaultdict(lambda: {"bids": 0, "volume": Decimal(0), "closed": 0, "sold": 0, "revenue": Decimal(0)})
+    bids = BidRollup.objects.filter(hour__gte=since).values("category").annotate(bids=Sum("bids"), volume=Sum("volume"))
+    sales = SalesRollup.objects.filter(hour__gte=since).values("category").annotate(
+        closed=Sum("closed"), sold=Sum("sold"), revenue=Sum("revenue")
+    )
+    for rows in (bids, sales):
+        for row in rows.order_by():
+            categories[row.pop("category")].update(row)
+
+    catalog = get_catalog()
+    per_category = []
+    for category_id, stats in categories.items():
+        if category_id is None:
+            name = "Uncategorized"
+        else:
+            entry = catalog.by_id.get(category_id)
+            name = entry.name if entry else "Deleted category"
+        per_category.append({
+            "id": category_id,
+            "name": name,
+            **stats,
+            "average_price": stats["revenue"] / stats["sold"] if stats["sold"] else None,
+            "sell_through": _ratio(stats["sold"], stats["closed"]),
+        })
+    per_category.sort(key=lambda row: (-row["bids"], row["name"]))
+
+    totals = {name: sum(row[name] for row in per_category) for name in ("bids", "volume", "closed", "sold", "revenue")}
+    totals["average_price"] = totals["revenue"] / totals["sold"] if totals["sold"] else None
+    totals["sell_through"] = _ratio(totals["sold"], totals["closed"])
+
+    top_watched = list(
+        AuctionListing.objects.filter(closed_at__isnull=True, watcher_count__gt=0)
+        .order_by("-watcher_count", "pk").values("id", "title", "watcher_count", "current_price")[:TOP_WATCHED]
+    )
+    return {
+        "since": since,
+        "days": days,
+        "bids_per_hour": bids_per_hour,
+        "categories": per_category,
+        "totals": totals,
+        "top_watched": top_watched,
+    }
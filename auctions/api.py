@@ -0,0 +1,284 @@
+"""
+Read-only JSON API (v1) for listings, bid history, the auction ledger and categories.
+
+Responses carry strong ETags built from the listing versions of fragments.py, so a client revalidating
+a listing it already has gets a 304 without the database being touched.
+"""
+import gzip
+import hashlib
+import json
+from decimal import Decimal
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+
+from . import ledger
+from .catalog import get_catalog
+from .fragments import listing_version, listing_versions
+from .models import AuctionListing, Bid
+from .pagination import DEFAULT_SORT, page_size_from, paginate
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+API_VERSION = 1
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 200
+
+# Columns each serializer reads, nothing else is loaded
+LIST_FIELDS = ("id", "title", "current_price", "bid_count", "end_datetime", "datetime_listed", "image_url", "category__name")
+DETAIL_FIELDS = (
+    "id", "title", "description", "current_price", "initial_price", "bid_count", "datetime_listed",
+    "end_datetime", "closed_at", "image_url", "category__name", "listed_by__username", "winner__username",
+)
+
+
+def _etag(*parts):
+    return hashlib.sha1(json.dumps(parts, cls=DjangoJSONEncoder).encode()).hexdigest()[:20]
+
+
+def _matching_tag(request, etag):
+    """
+    The tag of If-None-Match naming the current state, if any. Compressed bodies carry the same tag
+    with an encoding suffix (see compressed()), any of them matches.
+    """
+    for tag in request.headers.get("If-None-Match", "").split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/").strip('"').split("-")[0] == etag:
+            return tag
+    return None
+
+
+def conditional(view):
+    """
+    The view returns (etag, build) where build() makes the data, or an error response. When the
+    client already has that state it gets a 304 and build() never runs.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        result = view(request, *args, **kwargs)
+        if isinstance(result, HttpResponse):
+            return result
+        etag, build = result
+        tag = _matching_tag(request, etag)
+        if tag:
+            response = HttpResponseNotModified()
+            response["ETag"] = tag
+            return response
+        data = build()
+        if isinstance(data, StreamingHttpResponse):
+            # Streamed bodies are tagged like the others
+            response = data
+        elif isinstance(data, HttpResponse):
+            return data
+        else:
+            response = HttpResponse(
+                json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":")),
+                content_type="application/json"
+            )
+        response["ETag"] = f'"{etag}"'
+        # Clients may keep the response but have to revalidate it
+        response["Cache-Control"] = "no-cache"
+        return response
+    return wrapper
+
+
+def compressed(view):
+    """
+    Brotli (when the brotli package is installed) or gzip, by the Accept-Encoding of the request.
+
+    The ETag of a compressed body gets a -br / -gzip suffix, a strong ETag names exact bytes.
+    Streamed bodies are sent as they are.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.streaming:
+            return response
+        response["Vary"] = "Accept-Encoding"
+        if response.status_code != 200 or len(response.content) < MIN_COMPRESS_SIZE:
+            return response
+        accepted = request.headers.get("Accept-Encoding", "")
+        if brotli is not None and "br" in accepted:
+            encoding, content = "br", brotli.compress(response.content)
+        elif "gzip" in accepted:
+            encoding, content = "gzip", gzip.compress(response.content, compresslevel=6, mtime=0)
+        else:
+            return response
+        response.content = content
+        response["Content-Encoding"] = encoding
+        response["ETag"] = response["ETag"][:-1] + f'-{encoding}"'
+        return response
+    return wrapper
+
+
+def api_view(view):
+    return require_safe(compressed(conditional(view)))
+
+
+def not_found(message):
+    return HttpResponse(json.dumps({"error": message}), content_type="application/json", status=404)
+
+
+def serialize_listing(listing):
+    # Only reads LIST_FIELDS
+    return {
+        "id": listing.id,
+        "title": listing.title,
+        "current_price": listing.current_price,
+        "bid_count": listing.bid_count,
+        "end_datetime": listing.end_datetime,
+        "image_url": listing.image_url,
+        "category": listing.category.name if listing.category_id else None,
+    }
+
+
+@api_view
+def listings(request):
+    """
+    Active listings, a page at a time: ?sort=ending|newest|price|price_desc&size=&cursor=&category=<slug>
+    """
+    queryset = AuctionListing.objects.filter(end_datetime__gt=timezone.now())
+    category = request.GET.get("category")
+    if category:
+        # The slug is unique, names aren't
+        queryset = queryset.filter(category__slug=category)
+    queryset = queryset.select_related("category").only(*LIST_FIELDS)
+    page = paginate(
+        queryset,
+        sort=request.GET.get("sort", DEFAULT_SORT),
+        cursor=request.GET.get("cursor"),
+        page_size=page_size_from(request.GET.get("size")),
+    )
+    ids = [listing.id for listing in page.items]
+    versions = listing_versions(ids)
+    # The page changes when a listing on it changes or another listing moves into it
+    etag = _etag(API_VERSION, page.sort, [(listing_id, versions[listing_id]) for listing_id in ids], page.next_cursor)
+
+    def build():
+        # Read again after the versions, the rows of the page may be older than them
+        rows = queryset.in_bulk(ids)
+        return {
+            "results": [serialize_listing(rows[listing_id]) for listing_id in ids if listing_id in rows],
+            "sort": page.sort,
+            "next_cursor": page.next_cursor,
+        }
+    return etag, build
+
+
+@api_view
+def listing(request, id):
+    # The version is known before any query, a matching If-None-Match costs no database work.
+    # Read before the row, it is bumped again once a write commits (fragments.bump_listing_versions).
+    etag = _etag(API_VERSION, "listing", id, listing_version(id))
+
+    def build():
+        row = AuctionListing.objects.filter(pk=id).values(*DETAIL_FIELDS).first()
+        if row is None:
+            return not_found("Listing not found")
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "description": row["description"],
+            "current_price": row["current_price"],
+            "initial_price": row["initial_price"],
+            "bid_count": row["bid_count"],
+            "datetime_listed": row["datetime_listed"],
+            "end_datetime": row["end_datetime"],
+            "closed": row["closed_at"] is not None,
+            "image_url": row["image_url"],
+            "category": row["category__name"],
+            "listed_by": row["listed_by__username"],
+            "winner": row["winner__username"],
+        }
+    return etag, build
+
+
+@api_view
+def bids(request, id):
+    """
+    Bids of a listing, highest first, a page at a time: ?size=&cursor=
+    The bidders aren't shown, like on the listing page for anonymous users.
+    """
+    size = page_size_from(request.GET.get("size"))
+    cursor = request.GET.get("cursor")
+    etag = _etag(API_VERSION, "bids", id, listing_version(id), cursor, size)
+
+    def build():
+        if not AuctionListing.objects.filter(pk=id).exists():
+            return not_found("Listing not found")
+        queryset = Bid.objects.filter(auction=id).order_by("-amount", "id")
+        position = _decode_bid_cursor(cursor)
+        if position:
+            amount, bid_id = position
+            # Same amount and a later id, or a lower amount
+            queryset = queryset.filter(amount__lte=amount).exclude(amount=amount, id__lte=bid_id)
+        rows = list(queryset.values("id", "amount")[:size + 1])
+        has_next = len(rows) > size
+        rows = rows[:size]
+        return {
+            "results": rows,
+            "next_cursor": f"{rows[-1]['amount']}_{rows[-1]['id']}" if has_next else None,
+        }
+    return etag, build
+
+
+@api_view
+def history(request, id):
+    """
+    The ledger of a listing as NDJSON, one event per line, oldest first: ?after=<event id>
+    The bidders are only named to the seller and to staff.
+    """
+    seller_id = AuctionListing.objects.filter(pk=id).values_list("listed_by_id", flat=True).first()
+    if seller_id is None:
+        return not_found("Listing not found")
+    try:
+        after = max(int(request.GET.get("after", 0)), 0)
+    except ValueError:
+        after = 0
+    named = request.user.is_staff or request.user.id == seller_id
+    # Every ledger write and username change bumps the listing version
+    etag = _etag(API_VERSION, "history", id, listing_version(id), after, named)
+
+    def lines():
+        for event in ledger.history(id, after):
+            username = event.pop("user__username")
+            event["user"] = username if named else None
+            yield json.dumps(event, cls=DjangoJSONEncoder, separators=(",", ":")) + "\n"
+
+    def build():
+        # Streamed, a long ledger is never held in memory
+        return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+    return etag, build
+
+
+def _decode_bid_cursor(cursor):
+    # "amount_id" of the last bid of the previous page
+    try:
+        amount, bid_id = cursor.split("_")
+        return Decimal(amount), int(bid_id)
+    except (AttributeError, ValueError, ArithmeticError):
+        return None
+
+
+@api_view
+def categories(request):
+    # Served from the category catalog, tagged with its version
+    catalog = get_catalog()
+    rows = [
+        {
+            "id": entry.id,
+            "name": entry.name,
+            "slug": entry.slug,
+            "active_listings": entry.active_count,
+            "min_price": entry.min_price,
+            "max_price": entry.max_price,
+        }
+        for entry in catalog
+    ]
+    return _etag(API_VERSION, "categories", catalog.version), lambda: {"results": rows}
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from . import api
+
+# Read-only JSON API, mounted at api/v1/ by urls.py and async_urls.py
+app_name = "api"
+urlpatterns = [
+    path("listings", api.listings, name="listings"),
+    path("listings/<int:id>", api.listing, name="listing"),
+    path("listings/<int:id>/bids", api.bids, name="bids"),
+    path("listings/<int:id>/history", api.history, name="history"),
+    path("categories", api.categories, name="categories"),
+]
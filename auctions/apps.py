@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class AuctionsConfig(AppConfig):
     name = 'auctions'
+
+    def ready(self):
+        # Register the model signal handlers
+        from . import signals  # noqa: F401
+        # and the SQLite PRAGMAs of new connections
+        from . import db  # noqa: F401
+        # and the checks of the cache setup
+        from . import checks  # noqa: F401
@@ -0,0 +1,186 @@
+"""
+Hot/cold archival: closed auctions older than AUCTIONS_ARCHIVE_AFTER_DAYS are moved, with their bids,
+comments and watchers, from the live tables to the archive tables (ArchivedListing, ArchivedBid,
+ArchivedComment) in AUCTIONS_ARCHIVE_DATABASE, so the live tables and their indexes only hold the
+auctions people still look at.
+
+Each batch is copied and then deleted in one transaction per database, the archive one committing
+first. A run stopped at any point is resumed by running it again: the copy skips rows already
+archived and a listing is only gone from the live tables once its copy is committed.
+
+The ledger, the analytics rollups and the notifications already sent are kept as they are, the
+ledger references auctions by id only.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import BooleanField, Count, Max, Prefetch, Q, Value
+from django.utils import timezone
+
+from .fragments import bump_listing_versions
+from .models import (
+    ArchivedBid, ArchivedComment, ArchivedListing, AuctionListing, Bid, Comment, LedgerSnapshot, OutboxEvent,
+    ProxyBid, TrendScore,
+)
+
+AFTER_DAYS = getattr(settings, "AUCTIONS_ARCHIVE_AFTER_DAYS", 90)
+BATCH_SIZE = getattr(settings, "AUCTIONS_ARCHIVE_BATCH_SIZE", 500)
+# Latest bids of the user kept on each won auction of the dashboard, as dashboard.RECENT_BIDS
+RECENT_BIDS = 5
+
+LISTING_FIELDS = (
+    "id", "title", "description", "listed_by_id", "datetime_listed", "end_datetime", "initial_price", "image_url",
+    "category_id", "winner_id", "closed_at", "current_price", "highest_bid_id", "bid_count", "watcher_count",
+)
+
+Watch = AuctionListing.watchers.through
+
+
+def cutoff(after_days=AFTER_DAYS, now=None):
+    return (now or timezone.now()) - timedelta(days=after_days)
+
+
+def archivable(before):
+    # A closed auction ended before it closed, so listing_end_idx narrows the scan
+    return AuctionListing.objects.filter(end_datetime__lt=before, closed_at__lt=before)
+
+
+def _copy(listing_ids):
+    # The listings with their watchers, bids and comments, written to the archive database
+    watchers = {}
+    for listing_id, user_id in Watch.objects.filter(auctionlisting_id__in=listing_ids).values_list("auctionlisting_id", "user_id"):
+        watchers.setdefault(listing_id, []).append(user_id)
+    listings = [
+        ArchivedListing(**row, watcher_ids=sorted(watchers.get(row["id"], [])))
+        for row in AuctionListing.objects.filter(pk__in=listing_ids).values(*LISTING_FIELDS)
+    ]
+    bids = [
+        ArchivedBid(id=bid_id, auction_id=auction_id, user_id=user_id, amount=amount)
+        for bid_id, auction_id, user_id, amount in
+        Bid.objects.filter(auction_id__in=listing_ids).values_list("id", "auction_id", "user_id", "amount")
+    ]
+    comments = [
+        ArchivedComment(id=comment_id, auction_id=auction_id, commented_by_id=user_id, datetime_commented=at, comment_text=text)
+        for comment_id, auction_id, user_id, at, text in
+        Comment.objects.filter(auction_id__in=listing_ids).values_list(
+            "id", "auction_id", "commented_by_id", "datetime_commented", "comment_text"
+        )
+    ]
+    # Rows a stopped run already copied are skipped
+    for model, rows in ((ArchivedListing, listings), (ArchivedBid, bids), (ArchivedComment, comments)):
+        model.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return len(listings)
+
+
+def _delete(listing_ids, using):
+    """
+    Plain DELETE statements: no signals, so no retracted bids in the ledger and no stats to refresh
+    for auctions that are gone, and no collector loading the rows first. The rows pointing at the
+    listings go first. Returns how many listings were deleted.
+    """
+    connection = connections[using]
+    placeholders = ", ".join(["%s"] * len(listing_ids))
+    with connection.cursor() as cursor:
+        for model, field in (
+            (Watch, "auctionlisting"),
+            (Comment, "auction"),
+            (Bid, "auction"),
+            (ProxyBid, "auction"),
+            (LedgerSnapshot, "auction"),
+            (OutboxEvent, "listing"),
+            (TrendScore, "listing"),
+            (AuctionListing, "id"),
+        ):
+            table = connection.ops.quote_name(model._meta.db_table)
+            column = connection.ops.quote_name(model._meta.get_field(field).column)
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", listing_ids)
+        return cursor.rowcount
+
+
+def archive_batch(before, batch_size=BATCH_SIZE):
+    """
+    Moves the batch_size oldest closed auctions that closed before the given time to the archive,
+    returns how many were moved (0 once there are none left).
+    """
+    live = router.db_for_write(AuctionListing)
+    archive = router.db_for_write(ArchivedListing)
+    with transaction.atomic(using=live):
+        listing_ids = list(
+            archivable(before).order_by("end_datetime", "pk").values_list("pk", flat=True)[:batch_size]
+        )
+        if not listing_ids:
+            return 0
+        # Committed before the live rows are deleted, nested in the same transaction when it's one database
+        with transaction.atomic(using=archive):
+            _copy(listing_ids)
+        _delete(listing_ids, live)
+        bump_listing_versions(listing_ids, using=live)
+    return len(listing_ids)
+
+
+def archive_auctions(after_days=AFTER_DAYS, batch_size=BATCH_SIZE, limit=None, now=None, report=None):
+    """
+    Archives the closed auctions older than after_days in batches, at most limit of them.
+    report(count) is called after each batch. Returns how many were archived.
+    """
+    before = cutoff(after_days, now)
+    archived = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        moved = archive_batch(before, size)
+        if not moved:
+            break
+        archived += moved
+        if report:
+            report(archived)
+    return archived
+
+
+def archived_listing(listing_id):
+    """
+    The archived auction with this id and its comments newest first, or (None, []). The users and the
+    category are fetched by id, the archive may be in another database.
+    """
+    listing = (
+        ArchivedListing.objects.filter(pk=listing_id)
+        .prefetch_related("listed_by", "winner", "category").first()
+    )
+    if listing is None:
+        return None, []
+    comments = listing.comments.prefetch_related("commented_by").order_by("-datetime_commented")
+    return listing, list(comments)
+
+
+async def aarchived_listing(listing_id):
+    listing = await (
+        ArchivedListing.objects.filter(pk=listing_id)
+        .prefetch_related("listed_by", "winner", "category").afirst()
+    )
+    if listing is None:
+        return None, []
+    comments = listing.comments.prefetch_related("commented_by").order_by("-datetime_commented")
+    return listing, [comment async for comment in comments]
+
+
+def won_listings(user):
+    """
+    Archived auctions the user won, annotated like dashboard.dashboard_listings(). One query, and
+    two more when there are any.
+    """
+    mine = Q(bids__user=user.pk)
+    return (
+        ArchivedListing.objects.filter(winner=user.pk)
+        .annotate(
+            # Archived auctions are off every watchlist
+            is_watching=Value(False, output_field=BooleanField()),
+            my_bid_count=Count("bids", filter=mine),
+            my_top_bid=Max("bids__amount", filter=mine),
+        )
+        .prefetch_related("category", Prefetch(
+            "bids",
+            queryset=ArchivedBid.objects.filter(user=user.pk).order_by("-id")[:RECENT_BIDS],
+            to_attr="my_bids",
+        ))
+        .order_by("end_datetime", "pk")
+    )
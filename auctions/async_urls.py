@@ -0,0 +1,27 @@
+from django.urls import include, path
+
+from . import async_views, views
+
+# Same routes as urls.py with the async views, used when AUCTIONS_ASYNC_VIEWS is on (commerce/asgi.py)
+urlpatterns = [
+    path("", async_views.index, name="index"),
+    path("categories/<str:category>/", async_views.categories, name="categories"),
+    path("new", views.new, name="new"),
+    path("search", views.search, name="search"),
+    path("feeds/<str:name>", views.feed, name="feed"),
+    path("dashboard", views.dashboard, name="dashboard"),
+    path("dashboard.json", views.dashboard_json, name="dashboard_json"),
+    path("analytics", views.analytics_report, name="analytics"),
+    path("analytics.json", views.analytics_json, name="analytics_json"),
+    path("watchlist", async_views.watchlist, name="watchlist"),
+    path("images/<str:rendition>/<str:token>", views.image, name="image"),
+    path("listings/<str:id>", async_views.listings, name="listings"),
+    path("listings/<str:id>/bid", async_views.bid, name="bid"),
+    # Live updates, only served by the ASGI app
+    path("listings/<str:id>/events", async_views.listing_events, name="listing_events"),
+    path("events", async_views.events, name="events"),
+    path("login", views.login_view, name="login"),
+    path("logout", views.logout_view, name="logout"),
+    path("register", views.register, name="register"),
+    path("api/v1/", include("auctions.api_urls"))
+]
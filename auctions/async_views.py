@@ -0,0 +1,188 @@
+"""
+Async versions of the read heavy views and an async bid endpoint, served by commerce/asgi.py.
+
+Data is loaded with the async ORM, templates are rendered in a worker thread since they can
+still touch lazy relations (watchers, cached comment fragments).
+"""
+import decimal
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils import timezone
+
+from . import bidding, live, views
+from .archive import aarchived_listing
+from .catalog import get_catalog
+from .models import AuctionListing
+from .dashboard import is_watching
+from .fragments import listing_version
+from .pagination import apaginate_request
+
+arender = sync_to_async(render)
+
+
+async def _is_authenticated(request):
+    # Loads the session and user in a thread, later request.user lookups are cached
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+async def index(request):
+    # Filter auction listings by active (before end time passes)
+    listings = AuctionListing.objects.filter(end_datetime__gt=timezone.now())
+    page = await apaginate_request(request, listings)
+
+    return await arender(request, "auctions/index.html", {
+        "listings": page.items,
+        "page": page,
+        "title": "Active listings"
+    })
+
+
+async def categories(request, category='all'):
+    catalog = await sync_to_async(get_catalog)()
+    if category == 'all':
+        return await arender(request, "auctions/categories.html", {
+            "categories": catalog
+        })
+
+    entry = catalog.find(category)
+    if entry is None:
+        return await arender(request, "auctions/index.html", {
+            "listings": None,
+            "message": "Error 404: Category not found"
+        })
+    # Get all auction listings where category match and are active
+    listings = AuctionListing.objects.filter(category=entry.id, end_datetime__gt=timezone.now())
+    page = await apaginate_request(request, listings)
+    return await arender(request, "auctions/index.html", {
+        "listings": page.items,
+        "page": page,
+        "category": entry.name,
+        "title": "Active listings"
+    })
+
+
+async def watchlist(request):
+    if not await _is_authenticated(request):
+        return HttpResponseRedirect(f"{reverse('login')}?next={request.path}")
+    listings = AuctionListing.objects.filter(watchers=request.user)
+    page = await apaginate_request(request, listings, default_sort="newest")
+    return await arender(request, "auctions/index.html", {
+        "listings": page.items,
+        "page": page,
+        "title": "Watchlist"
+    })
+
+
+async def listings(request, id):
+    # Watching, unlisting, bids and comments go through the sync view
+    if request.method != "GET" or request.GET.get("watch") or request.GET.get("unlist"):
+        return await sync_to_async(views.listings)(request, id)
+
+    # Read before the listing, as in the sync view
+    version = await sync_to_async(listing_version)(id)
+    listings = AuctionListing.objects.select_related("listed_by", "category")
+    # Only signed in users see whose bid is the highest, anonymous views don't touch the bids
+    if await _is_authenticated(request):
+        listings = listings.select_related("highest_bid").annotate(is_watching=is_watching(request.user))
+    try:
+        listing = await listings.aget(id=id)
+    except ObjectDoesNotExist:
+        archived, comments = await aarchived_listing(id)
+        if archived is not None:
+            return await arender(request, "auctions/archived_listing.html", {
+                "listing": archived,
+                "comments": comments,
+            })
+        return await arender(request, "auctions/listings.html", {
+            "message": "Error 404: Listing doesn't exists"
+        })
+
+    return await arender(request, "auctions/listings.html", {
+        "listing": listing,
+        "version": version,
+        "comments": listing.comments.select_related("commented_by").order_by('-datetime_commented'),
+        "new_comment": views.NewCommentForm(),
+        "new_bid": views.NewBidForm(
+            min_amount=decimal.Decimal(listing.current_price),
+            initial={'amount': decimal.Decimal(listing.current_price), 'seen_price': listing.current_price}
+        ),
+        "events_url": reverse("listing_events", args=[listing.id])
+    })
+
+
+# HTTP status of each bid result
+BID_STATUS = {
+    bidding.PLACED: 201,
+    bidding.TOO_LOW: 409,
+    bidding.OUTBID: 409,
+    bidding.CLOSED: 409,
+    bidding.BUSY: 503,
+    bidding.PROXY_OUTBID: 409,
+}
+
+
+async def bid(request, id):
+    """
+    POST amount (and optionally seen_price, or proxy to make it a maximum), answers with the bid
+    result as JSON.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+    if not await _is_authenticated(request):
+        return JsonResponse({"error": "Login required"}, status=403)
+    form = views.NewBidForm(data=request.POST)
+    if not form.is_valid():
+        return JsonResponse({"error": "Invalid bid amount"}, status=400)
+    if not await AuctionListing.objects.filter(id=id).aexists():
+        return JsonResponse({"error": "Listing doesn't exists"}, status=404)
+
+    # The bid service runs in a transaction, which the async ORM can't do yet
+    if form.cleaned_data["proxy"]:
+        result = await sync_to_async(bidding.set_max_bid)(id, request.user, form.cleaned_data["amount"])
+    else:
+        result = await sync_to_async(bidding.place_bid)(
+            id, request.user, form.cleaned_data["amount"], seen_price=form.cleaned_data["seen_price"]
+        )
+    return JsonResponse({
+        "status": result.status,
+        "message": result.message,
+        "current_price": result.current_price,
+    }, status=BID_STATUS[result.status])
+
+
+def _event_stream(subscription, first=()):
+    response = StreamingHttpResponse(live.stream(subscription, first), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Don't let a proxy (nginx) buffer the events
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def listing_events(request, id):
+    """
+    Server-Sent Events of the listing: its current state first, then price and ended events.
+    """
+    try:
+        listing_id = int(id)
+    except ValueError:
+        return JsonResponse({"error": "Listing doesn't exists"}, status=404)
+    # Subscribe before reading the state so no bid falls in between
+    subscription = live.hub.subscribe([live.listing_topic(listing_id)])
+    states = await sync_to_async(live.listing_states)([listing_id])
+    if listing_id not in states:
+        subscription.close()
+        return JsonResponse({"error": "Listing doesn't exists"}, status=404)
+    return _event_stream(subscription, [live.Event(0, live.PRICE, listing_id, states[listing_id])])
+
+
+async def events(request):
+    """
+    Server-Sent Events of every listing in the user's watchlist.
+    """
+    if not await _is_authenticated(request):
+        return JsonResponse({"error": "Login required"}, status=403)
+    return _event_stream(live.hub.subscribe([live.user_topic(request.user.id)]))
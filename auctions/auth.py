@@ -0,0 +1,39 @@
+"""
+Authentication backend that keeps the users of logged in sessions in the cache for TIMEOUT seconds,
+so a request doesn't load its User row. Saving or deleting a user drops its entry (signals.py), and
+a password change still logs out the other sessions: the cached user carries the new hash.
+QuerySet.update() on users bypasses that, the entry then lives out its TIMEOUT.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = getattr(settings, "AUCTIONS_USER_CACHE", "default")
+TIMEOUT = getattr(settings, "AUCTIONS_USER_CACHE_TIMEOUT", 60)
+
+
+def user_cache_key(user_id):
+    return f"auctions:user:{user_id}"
+
+
+def remember_user(user):
+    caches[CACHE_ALIAS].set(user_cache_key(user.pk), user, TIMEOUT)
+
+
+def forget_user(user_id):
+    cache = caches[CACHE_ALIAS]
+    cache.delete(user_cache_key(user_id))
+    # Again after the commit, a request may have cached the old row in the meantime
+    transaction.on_commit(lambda: cache.delete(user_cache_key(user_id)))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user = caches[CACHE_ALIAS].get(user_cache_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                remember_user(user)
+            return user
+        return user if self.user_can_authenticate(user) else None
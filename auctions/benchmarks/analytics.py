@@ -0,0 +1,106 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from auctions import analytics
+from auctions.models import AuctionListing, Category, LedgerEvent, User
+from auctions.profiling import percentile
+from . import Timer
+
+BATCH_SIZE = 5000
+
+
+def _summary(seconds):
+    ms = sorted(value * 1000 for value in seconds)
+    return {"p50": percentile(ms, 50), "p99": percentile(ms, 99)}
+
+
+def build_history(listing_owner, listings=5000, bids=500000, watchers=20000, days=90, seed=1):
+    """
+    A marketplace with days of history written straight to the tables: listings (half of them
+    closed, most of those sold), placed bid events spread over the days and watchers.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    categories = Category.objects.bulk_create([Category(name=f"Category {number}", slug=f"category-{number}") for number in range(20)])
+    users = User.objects.bulk_create([User(username=f"analytics{number}") for number in range(200)])
+
+    rows = []
+    for number in range(listings):
+        closed_at = now - timedelta(seconds=rng.randrange(days * 24 * 3600)) if number % 2 else None
+        price = Decimal(rng.randint(100, 100000)) / 100
+        rows.append(AuctionListing(
+            title=f"Analytics {number}", description="", listed_by=listing_owner, image_url="https://example.com/image.png",
+            category=rng.choice(categories) if rng.random() < 0.9 else None, initial_price=price, current_price=price,
+            end_datetime=closed_at or now + timedelta(days=7), closed_at=closed_at,
+            winner=rng.choice(users) if closed_at and rng.random() < 0.7 else None,
+        ))
+    AuctionListing.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    listing_ids = list(AuctionListing.objects.values_list("pk", flat=True))
+
+    for start in range(0, bids, BATCH_SIZE):
+        LedgerEvent.objects.bulk_create([
+            LedgerEvent(
+                auction_id=rng.choice(listing_ids), kind=LedgerEvent.PLACED, user_id=rng.choice(users).pk,
+                amount=Decimal(rng.randint(100, 100000)) / 100,
+                recorded_at=now - timedelta(seconds=rng.randrange(days * 24 * 3600)),
+            )
+            for _ in range(min(BATCH_SIZE, bids - start))
+        ])
+
+    Watch = AuctionListing.watchers.through
+    pairs = {(rng.choice(listing_ids), rng.choice(users).pk) for _ in range(watchers)}
+    Watch.objects.bulk_create([Watch(auctionlisting_id=listing_id, user_id=user_id) for listing_id, user_id in pairs], batch_size=BATCH_SIZE)
+    return {"listings": listings, "bids": bids, "watchers": len(pairs), "days": days}
+
+
+def full_scan_report(days=analytics.DAYS, hours=analytics.HOURS):
+    # What the report would take computed from the ledger, the listings and the watchers tables
+    now = timezone.now()
+    since = analytics.hour_of(now) - timedelta(days=days)
+    first_hour = analytics.hour_of(now) - timedelta(hours=hours - 1)
+    placed = LedgerEvent.objects.filter(kind=LedgerEvent.PLACED)
+    list(
+        placed.filter(recorded_at__gte=first_hour).annotate(hour=TruncHour("recorded_at"))
+        .values("hour").annotate(bids=Count("id"), volume=Sum("amount")).order_by()
+    )
+    list(placed.filter(recorded_at__gte=since).values("auction__category").annotate(bids=Count("id"), volume=Sum("amount")).order_by())
+    sold = Q(winner__isnull=False)
+    list(
+        AuctionListing.objects.filter(closed_at__gte=since).values("category")
+        .annotate(closed=Count("id"), sold=Count("id", filter=sold), revenue=Sum("current_price", filter=sold)).order_by()
+    )
+    list(
+        AuctionListing.objects.filter(closed_at__isnull=True).annotate(watches=Count("watchers"))
+        .filter(watches__gt=0).order_by("-watches", "pk").values("id", "title", "watches")[:analytics.TOP_WATCHED]
+    )
+
+
+def run_analytics(listing_owner, listings=5000, bids=500000, watchers=20000, days=90, repeat=20):
+    """
+    Builds the history, backfills the rollups from it and times the report from the rollups
+    against the same numbers computed from the full tables.
+    """
+    history = build_history(listing_owner, listings, bids, watchers, days)
+    with Timer() as backfill:
+        counts = analytics.backfill()
+
+    timings = {"rollups": [], "full_scan": []}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        analytics.build_report(days)
+        timings["rollups"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        full_scan_report(days)
+        timings["full_scan"].append(time.perf_counter() - start)
+    return {
+        **history,
+        "backfill_seconds": backfill.elapsed,
+        "backfill_rows_per_second": backfill.rate(counts["bids"] + counts["closed"] + counts["listings"]),
+        **{name: _summary(seconds) for name, seconds in timings.items()},
+    }
@@ -0,0 +1,69 @@
+import gzip
+import random
+import time
+
+from django.test import Client
+from django.urls import reverse
+
+from auctions.models import AuctionListing
+from auctions.profiling import percentile
+
+
+def _measure(client, urls, headers=None):
+    latencies, sizes, compressed = [], [], []
+    for url in urls:
+        begin = time.perf_counter()
+        response = client.get(url, **(headers or {}))
+        latencies.append((time.perf_counter() - begin) * 1000)
+        sizes.append(len(response.content))
+        # What the body would be gzipped, for the pages that aren't
+        compressed.append(len(gzip.compress(response.content)) if response.content else 0)
+    latencies.sort()
+    return {
+        "requests": len(urls),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "bytes": sum(sizes) / len(sizes),
+        "gzip_bytes": sum(compressed) / len(compressed),
+    }
+
+
+def compare_api(requests=200, random_seed=None):
+    """
+    The same content through the HTML views and the JSON API: listing pages, the index and a
+    revalidation of an unchanged listing (If-None-Match) that the API answers with a 304.
+    """
+    rng = random.Random(random_seed)
+    listing_ids = list(AuctionListing.objects.values_list("id", flat=True))
+    ids = [rng.choice(listing_ids) for _ in range(requests)]
+    client = Client(HTTP_HOST="localhost")
+
+    # Warm the fragment cache and the versions so both sides are measured hot
+    for listing_id in set(ids):
+        client.get(reverse("listings", args=[listing_id]))
+        client.get(reverse("api:listing", args=[listing_id]))
+    etags = {
+        listing_id: client.get(reverse("api:listing", args=[listing_id]))["ETag"] for listing_id in set(ids)
+    }
+
+    results = {
+        "listing html": _measure(client, [reverse("listings", args=[listing_id]) for listing_id in ids]),
+        "listing api": _measure(client, [reverse("api:listing", args=[listing_id]) for listing_id in ids]),
+        "index html": _measure(client, [reverse("index")] * requests),
+        "index api": _measure(client, [reverse("api:listings")] * requests),
+    }
+    latencies = []
+    for listing_id in ids:
+        begin = time.perf_counter()
+        response = client.get(reverse("api:listing", args=[listing_id]), HTTP_IF_NONE_MATCH=etags[listing_id])
+        latencies.append((time.perf_counter() - begin) * 1000)
+        assert response.status_code == 304
+    latencies.sort()
+    results["listing api 304"] = {
+        "requests": requests,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "bytes": 0,
+        "gzip_bytes": 0,
+    }
+    return results
@@ -0,0 +1,108 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from auctions import archive
+from auctions.dashboard import dashboard_listings
+from auctions.models import AuctionListing, Bid, Category, Comment, User
+from auctions.pagination import paginate
+from auctions.profiling import percentile
+from auctions.search import search
+from . import Timer
+
+BATCH_SIZE = 5000
+WORDS = ["vintage", "camera", "lamp", "guitar", "watch", "bike", "chair", "poster", "radio", "vase"]
+
+
+def _summary(seconds):
+    ms = sorted(value * 1000 for value in seconds)
+    return {"p50": percentile(ms, 50), "p99": percentile(ms, 99)}
+
+
+def build_marketplace(listing_owner, listings=100000, bids=10, closed=0.9, seed=1):
+    """
+    Listings written straight to the tables, the closed share of them ended 100 to 400 days ago, with
+    about bids bids and a comment each and a few watchers. Returns the bidder with the most bids.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    categories = Category.objects.bulk_create([Category(name=f"Category {number}", slug=f"category-{number}") for number in range(20)])
+    users = User.objects.bulk_create([User(username=f"archive{number}") for number in range(500)])
+
+    rows = []
+    for number in range(listings):
+        old = rng.random() < closed
+        ended = now - timedelta(days=rng.uniform(100, 400)) if old else now + timedelta(days=rng.uniform(1, 30))
+        price = Decimal(rng.randint(100, 100000)) / 100
+        rows.append(AuctionListing(
+            title=f"{rng.choice(WORDS)} {rng.choice(WORDS)} {number}", description="", listed_by=listing_owner,
+            image_url="https://example.com/image.png", category=rng.choice(categories), initial_price=price,
+            current_price=price + bids, bid_count=bids, datetime_listed=ended - timedelta(days=7), end_datetime=ended,
+            closed_at=ended if old else None, winner=rng.choice(users) if old else None,
+        ))
+    AuctionListing.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    listing_ids = list(AuctionListing.objects.values_list("pk", flat=True))
+
+    heavy = users[0]
+    for start in range(0, len(listing_ids), BATCH_SIZE // bids):
+        batch = listing_ids[start:start + BATCH_SIZE // bids]
+        Bid.objects.bulk_create([
+            Bid(auction_id=listing_id, user=heavy if rng.random() < 0.002 else rng.choice(users), amount=Decimal(number + 1))
+            for listing_id in batch for number in range(bids)
+        ])
+        Comment.objects.bulk_create([
+            Comment(auction_id=listing_id, commented_by=rng.choice(users), comment_text="Is it still available?")
+            for listing_id in batch
+        ])
+    Watch = AuctionListing.watchers.through
+    pairs = {(rng.choice(listing_ids), rng.choice(users).pk) for _ in range(listings // 2)}
+    Watch.objects.bulk_create([Watch(auctionlisting_id=listing_id, user_id=user_id) for listing_id, user_id in pairs], batch_size=BATCH_SIZE)
+    return heavy
+
+
+def live_queries(bidder):
+    # The reads of the pages people keep looking at, all of them against the live tables
+    active = AuctionListing.objects.filter(end_datetime__gt=timezone.now())
+    category = Category.objects.order_by("pk").first()
+    return {
+        "index": lambda: paginate(active),
+        "by_price": lambda: paginate(active, sort="price"),
+        "category": lambda: paginate(active.filter(category=category)),
+        "search": lambda: search("vintage camera"),
+        "dashboard": lambda: list(dashboard_listings(bidder)),
+    }
+
+
+def _time(queries, repeat):
+    timings = {name: [] for name in queries}
+    for _ in range(repeat):
+        for name, query in queries.items():
+            start = time.perf_counter()
+            query()
+            timings[name].append(time.perf_counter() - start)
+    return {name: _summary(seconds) for name, seconds in timings.items()}
+
+
+def run_archive(listing_owner, listings=100000, bids=10, closed=0.9, batch_size=archive.BATCH_SIZE, repeat=20):
+    """
+    Builds the marketplace, times the live queries, archives the closed auctions (every one of
+    them is older than the cutoff) and times the same queries again.
+    """
+    bidder = build_marketplace(listing_owner, listings, bids, closed)
+    queries = live_queries(bidder)
+    before = _time(queries, repeat)
+    with Timer() as timer:
+        archived = archive.archive_auctions(batch_size=batch_size)
+    after = _time(queries, repeat)
+    return {
+        "listings": listings,
+        "archived": archived,
+        "live": AuctionListing.objects.count(),
+        "archive_seconds": timer.elapsed,
+        "archived_per_second": timer.rate(archived),
+        "before": before,
+        "after": after,
+    }
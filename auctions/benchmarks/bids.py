@@ -0,0 +1,87 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.db import OperationalError, connection
+
+from auctions import bidding
+from auctions.models import AuctionListing, Bid
+from auctions.profiling import percentile
+from . import Timer
+
+
+def run_bid_stress(listing, users, threads=8, bids_per_thread=50, seed=None, readers=0):
+    """
+    Hammer one listing with concurrent bidders, every thread bids a bit over the price it last saw.
+
+    Readers threads keep loading the listing and its latest bids (what the listing page reads) while
+    the bidders run. Returns the number of bids per result status plus the elapsed time and accepted
+    bids per second, and the reads done, failed and their latency percentiles (ms) when there are readers.
+    """
+    results = {status: 0 for status in (bidding.PLACED, bidding.TOO_LOW, bidding.OUTBID, bidding.CLOSED, bidding.BUSY)}
+    lock = threading.Lock()
+    start = threading.Barrier(threads + readers)
+    done = threading.Event()
+    latencies = []
+    failed_reads = 0
+
+    def bidder(number):
+        rng = random.Random(None if seed is None else seed + number)
+        user = users[number % len(users)]
+        seen_price = listing.current_price
+        try:
+            start.wait()
+            for _ in range(bids_per_thread):
+                amount = seen_price + Decimal(rng.randint(1, 100)) / 100
+                result = bidding.place_bid(listing.id, user, amount, seen_price=seen_price)
+                if result.current_price is not None:
+                    seen_price = result.current_price
+                with lock:
+                    results[result.status] += 1
+        finally:
+            connection.close()
+
+    def reader():
+        nonlocal failed_reads
+        samples = []
+        failed = 0
+        try:
+            start.wait()
+            while not done.is_set():
+                begin = time.perf_counter()
+                try:
+                    AuctionListing.objects.select_related("highest_bid").get(pk=listing.id)
+                    list(Bid.objects.filter(auction_id=listing.id).order_by("-id")[:10])
+                except OperationalError:
+                    # "database is locked" when the journal mode makes readers wait for the writer
+                    failed += 1
+                    continue
+                samples.append(time.perf_counter() - begin)
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(samples)
+            failed_reads += failed
+
+    bidders = [threading.Thread(target=bidder, args=(number,)) for number in range(threads)]
+    workers = bidders + [threading.Thread(target=reader) for _ in range(readers)]
+    with Timer() as timer:
+        for worker in workers:
+            worker.start()
+        for worker in bidders:
+            worker.join()
+    done.set()
+    for worker in workers:
+        worker.join()
+
+    results["elapsed"] = timer.elapsed
+    results["bids_per_second"] = timer.rate(results[bidding.PLACED])
+    if readers:
+        ms = sorted(latency * 1000 for latency in latencies)
+        results["reads"] = len(ms)
+        results["failed_reads"] = failed_reads
+        results["reads_per_second"] = timer.rate(len(ms))
+        results["read_p50"] = percentile(ms, 50) if ms else 0.0
+        results["read_p99"] = percentile(ms, 99) if ms else 0.0
+    return results
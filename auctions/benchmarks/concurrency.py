@@ -0,0 +1,115 @@
+import asyncio
+import queue
+import random
+import threading
+import time
+
+from django.db import connection
+from django.test import AsyncClient, Client
+
+from auctions.benchmarks.load import Scenarios
+from auctions.models import AuctionListing, Category, User
+
+# Read flows both servers run, bids and comments write through the same sync code either way
+READ_MIX = {"index": 30, "category": 10, "listing": 60}
+
+
+def _clients(make_client, clients, random_seed, anonymous):
+    # Logins use the sync ORM, so the clients are set up before any load starts
+    rng = random.Random(random_seed)
+    listing_ids = list(AuctionListing.objects.values_list("id", flat=True))
+    category_slugs = list(Category.objects.values_list("slug", flat=True))
+    users = list(User.objects.all()[:clients])
+    scenarios = []
+    for number in range(clients):
+        client = make_client()
+        if users and rng.random() >= anonymous:
+            client.force_login(users[number % len(users)])
+        client_rng = random.Random(None if random_seed is None else random_seed + number)
+        scenarios.append(Scenarios(client, client_rng, listing_ids, category_slugs))
+    return scenarios
+
+
+def _pick(scenarios, mix):
+    names = list(mix)
+    return getattr(scenarios, scenarios.rng.choices(names, [mix[name] for name in names])[0])
+
+
+def run_wsgi(clients=1000, requests=5, threads=8, mix=READ_MIX, random_seed=None, anonymous=0.5):
+    """
+    A WSGI server with a fixed pool of worker threads: every client sends its next request as soon
+    as the previous one is answered, requests wait in the queue while all threads are busy.
+
+    Latency is measured from the moment the request was queued. Returns (scenario, latency, ok)
+    samples and the elapsed time.
+    """
+    scenarios = _clients(lambda: Client(HTTP_HOST="localhost"), clients, random_seed, anonymous)
+    remaining = [requests] * clients
+    pending = queue.Queue()
+    samples = []
+    lock = threading.Lock()
+
+    def worker():
+        results = []
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    break
+                number, queued = item
+                flow = _pick(scenarios[number], mix)
+                try:
+                    ok = flow().status_code < 400
+                except Exception:
+                    ok = False
+                results.append((flow.__name__, time.perf_counter() - queued, ok))
+                remaining[number] -= 1
+                if remaining[number]:
+                    pending.put((number, time.perf_counter()))
+                pending.task_done()
+        finally:
+            connection.close()
+        with lock:
+            samples.extend(results)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    begin = time.perf_counter()
+    for number in range(clients):
+        pending.put((number, begin))
+    for thread in workers:
+        thread.start()
+    pending.join()
+    for _ in workers:
+        pending.put(None)
+    for thread in workers:
+        thread.join()
+    return samples, time.perf_counter() - begin
+
+
+def run_asgi(clients=1000, requests=5, mix=READ_MIX, random_seed=None, anonymous=0.5):
+    """
+    Every client is a task on one event loop, talking to the ASGI handler through AsyncClient.
+    Same samples and elapsed time as run_wsgi().
+    """
+    # AsyncClient always sends the "testserver" host
+    scenarios = _clients(AsyncClient, clients, random_seed, anonymous)
+
+    async def client(flows):
+        results = []
+        for _ in range(requests):
+            flow = _pick(flows, mix)
+            begin = time.perf_counter()
+            try:
+                ok = (await flow()).status_code < 400
+            except Exception:
+                ok = False
+            results.append((flow.__name__, time.perf_counter() - begin, ok))
+        return results
+
+    async def main():
+        return await asyncio.gather(*(client(flows) for flows in scenarios))
+
+    begin = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - begin
+    return [sample for client_samples in results for sample in client_samples], elapsed
@@ -0,0 +1,102 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count
+from django.utils import timezone
+
+from auctions import feeds
+from auctions.models import AuctionListing, LedgerEvent, User
+from auctions.profiling import percentile
+from . import Timer
+
+BATCH_SIZE = 5000
+
+
+def _summary(seconds):
+    ms = sorted(value * 1000 for value in seconds)
+    return {"p50": percentile(ms, 50), "p99": percentile(ms, 99)}
+
+
+def build_activity(listing_owner, listings=20000, bids=200000, hours=24, seed=1):
+    """
+    Open listings and placed bid events written straight to the tables, spread over the last hours
+    with a few listings getting most of the bids.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    users = User.objects.bulk_create([User(username=f"feeds{number}") for number in range(200)])
+    AuctionListing.objects.bulk_create([
+        AuctionListing(
+            title=f"Feeds {number}", description="", listed_by=listing_owner, image_url="https://example.com/image.png",
+            initial_price=Decimal(10), current_price=Decimal(10), end_datetime=now + timedelta(minutes=rng.randrange(10, 10000)),
+            watcher_count=int(rng.paretovariate(1.5)) - 1,
+        )
+        for number in range(listings)
+    ], batch_size=BATCH_SIZE)
+    listing_ids = list(AuctionListing.objects.values_list("pk", flat=True))
+    for start in range(0, bids, BATCH_SIZE):
+        LedgerEvent.objects.bulk_create([
+            LedgerEvent(
+                auction_id=listing_ids[min(int(rng.paretovariate(1.2)) - 1, len(listing_ids) - 1)] if rng.random() < 0.5 else rng.choice(listing_ids),
+                kind=LedgerEvent.PLACED, user_id=rng.choice(users).pk, amount=Decimal(11),
+                recorded_at=now - timedelta(seconds=rng.uniform(0, hours * 3600)),
+            )
+            for _ in range(min(BATCH_SIZE, bids - start))
+        ])
+    return listing_ids
+
+
+def most_bids_last_hour(size=feeds.SIZE):
+    # The trending feed without the scores: a count of the last hour's bids of the open listings
+    now = timezone.now()
+    return list(
+        LedgerEvent.objects.filter(
+            kind=LedgerEvent.PLACED, recorded_at__gte=now - timedelta(hours=1),
+            auction__end_datetime__gt=now, auction__closed_at__isnull=True,
+        ).values("auction").annotate(bids=Count("id")).order_by("-bids", "auction")[:size]
+    )
+
+
+def _time(read, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read()
+        seconds.append(time.perf_counter() - start)
+    return _summary(seconds)
+
+
+def run_feeds(listing_owner, listings=20000, bids=200000, updates=5000, repeat=200):
+    """
+    Rebuilds the trend scores from a day of bids, times the incremental update of a bid, then
+    reading the trending feed from memory, from the cache, built from the index and computed from
+    the bids of the last hour.
+    """
+    listing_ids = build_activity(listing_owner, listings, bids)
+    with Timer() as rebuild:
+        scored = feeds.rebuild()
+
+    rng = random.Random(2)
+    with Timer() as incremental:
+        for _ in range(updates):
+            feeds.bid_placed(rng.choice(listing_ids), timezone.now())
+
+    def from_cache():
+        feeds._local.feeds = {}
+        feeds.get_feed(feeds.TRENDING)
+
+    feeds.clear()
+    feeds.get_feed(feeds.TRENDING)
+    return {
+        "listings": listings,
+        "bids": bids,
+        "scored": scored,
+        "rebuild_seconds": rebuild.elapsed,
+        "updates_per_second": incremental.rate(updates),
+        "memory": _time(lambda: feeds.get_feed(feeds.TRENDING).top(20), repeat),
+        "cache": _time(from_cache, repeat),
+        "build": _time(lambda: feeds.build_feed(feeds.TRENDING), repeat),
+        "brute_force": _time(most_bids_last_hour, min(repeat, 20)),
+    }
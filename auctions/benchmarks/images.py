@@ -0,0 +1,60 @@
+import tempfile
+import time
+from concurrent.futures import wait
+
+from django.test import Client
+from django.urls import reverse
+
+from auctions import images
+from auctions.images import ImagePipeline, ImageStore, StubFetcher
+from auctions.profiling import percentile
+from . import Timer
+
+
+def _summary(seconds):
+    ms = sorted(value * 1000 for value in seconds)
+    return {"p50": percentile(ms, 50), "p99": percentile(ms, 99)}
+
+
+def run_images(count=200, size=(1200, 900), workers=4, requests=5):
+    """
+    Push generated images (StubFetcher) through a fresh pipeline in a temporary directory.
+
+    Measures the worker pool throughput, the latency of the image view for a processed image and
+    the bytes of an original against its renditions.
+    """
+    urls = [f"https://images.example/{number}.png" for number in range(count)]
+    with tempfile.TemporaryDirectory(prefix="auctions-images-") as root:
+        fetcher = StubFetcher(size=size)
+        pipeline = ImagePipeline(ImageStore(root), fetcher, workers=workers)
+        previous, images.pipeline = images.pipeline, pipeline
+        # The view serves the renditions with or without Pillow here
+        enabled, images.ENABLED = images.ENABLED, True
+        try:
+            with Timer() as timer:
+                wait([pipeline.submit(url) for url in urls])
+            entries = [pipeline.store.entry(url) for url in urls]
+
+            client = Client()
+            served = []
+            for url in urls[:requests * 20]:
+                path = reverse("image", args=["thumb", images.sign_url(url)])
+                begin = time.perf_counter()
+                response = client.get(path)
+                b"".join(response.streaming_content)
+                served.append(time.perf_counter() - begin)
+        finally:
+            images.pipeline = previous
+            images.ENABLED = enabled
+            pipeline.shutdown()
+
+    original = len(fetcher(urls[0]))
+    return {
+        "images": count,
+        "processed_per_second": timer.rate(count),
+        "failed": sum(1 for entry in entries if entry.get("error")),
+        "serve": _summary(served),
+        "original_bytes": original,
+        "rendition_bytes": {name: entries[0]["renditions"][name]["size"] for name in images.RENDITIONS},
+        "resized": images.Image is not None,
+    }
@@ -0,0 +1,69 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from auctions import ledger
+from auctions.models import AuctionListing, Bid, LedgerSnapshot
+from auctions.profiling import percentile
+
+BATCH_SIZE = 5000
+
+
+def _summary(seconds):
+    ms = sorted(value * 1000 for value in seconds)
+    return {"p50": percentile(ms, 50), "p99": percentile(ms, 99)}
+
+
+def _add_bids(listing, users, count, price, rng, retract_every):
+    # Rising bids in batches, every retract_every-th bid is retracted right after
+    for start in range(0, count, BATCH_SIZE):
+        bids = []
+        for _ in range(min(BATCH_SIZE, count - start)):
+            price += Decimal(rng.randint(1, 100)) / 100
+            bids.append(Bid(auction=listing, user=rng.choice(users), amount=price))
+        Bid.objects.bulk_create(bids)
+        events = []
+        for number, bid in enumerate(bids, start):
+            events.append((listing.id, ledger.PLACED, bid.pk, bid.user_id, bid.amount))
+            if retract_every and number % retract_every == retract_every - 1:
+                events.append((listing.id, ledger.RETRACTED, bid.pk, bid.user_id, None))
+        ledger.record_many(events)
+    return price
+
+
+def run_ledger(listing_owner, users, bids=100000, tail=500, repeat=5, retract_every=50, seed=1):
+    """
+    Record bids events on one auction, then time rebuilding its state from every event (replay)
+    against the latest snapshot plus a tail of events (auction_state).
+    """
+    rng = random.Random(seed)
+    listing = AuctionListing.objects.create(
+        title="Ledger benchmark", description="", listed_by=listing_owner,
+        end_datetime=timezone.now() + timedelta(days=1), initial_price=Decimal("1.00"),
+    )
+    price = _add_bids(listing, users, bids, listing.initial_price, rng, retract_every)
+    start = time.perf_counter()
+    ledger.auction_state(listing.id, snapshot_every=0)
+    snapshot_seconds = time.perf_counter() - start
+    _add_bids(listing, users, tail, price, rng, retract_every)
+
+    replays, rebuilds = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        replayed = ledger.replay(listing.id)
+        replays.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        # Never saves, every run reads the same snapshot and tail
+        rebuilt = ledger.auction_state(listing.id, snapshot_every=tail + bids)
+        rebuilds.append(time.perf_counter() - start)
+    return {
+        "events": listing.ledger.count(),
+        "snapshots": LedgerSnapshot.objects.filter(auction=listing).count(),
+        "first_snapshot_seconds": snapshot_seconds,
+        "replay": _summary(replays),
+        "snapshot_and_tail": _summary(rebuilds),
+        "same_state": (replayed.leader, replayed.bid_count) == (rebuilt.leader, rebuilt.bid_count),
+    }
@@ -0,0 +1,91 @@
+import asyncio
+import resource
+import time
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient
+from django.urls import reverse
+
+from auctions import bidding, live
+from auctions.profiling import percentile
+
+
+def _rss():
+    # Peak resident memory in bytes (Linux reports kilobytes)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_live(listing, bidder, watchers, subscribers=1000, bids=50, interval=0.01, timeout=30):
+    """
+    Open listing streams (anonymous) and watchlist streams (the watchers of the listing) through the
+    async views, place bids on the listing and measure how long each event took to reach every connection.
+    """
+    clients = [AsyncClient() for _ in range(subscribers)]
+    # Logins use the sync ORM, so they happen before the event loop starts
+    for user in watchers:
+        watcher = AsyncClient()
+        watcher.force_login(user)
+        clients.append(watcher)
+
+    latencies = []
+
+    async def listen(client, url, connected):
+        response = await client.get(url)
+        events = aiter(response.streaming_content)
+        # retry: and the first state of the listing
+        await anext(events)
+        if url != reverse("events"):
+            await anext(events)
+        connected.release()
+        received = 0
+        while received < bids:
+            chunk = await anext(events)
+            if not chunk.startswith(b"id: "):
+                continue
+            sent = float(chunk.split(b'"time": ')[1].split(b",")[0])
+            latencies.append(time.time() - sent)
+            received += 1
+
+    async def main():
+        connected = asyncio.Semaphore(0)
+        memory = _rss()
+        begin = time.perf_counter()
+        listing_url = reverse("listing_events", args=[listing.id])
+        tasks = [
+            asyncio.create_task(listen(client, listing_url if number < subscribers else reverse("events"), connected))
+            for number, client in enumerate(clients)
+        ]
+        for _ in clients:
+            await connected.acquire()
+        connect_time = time.perf_counter() - begin
+        memory = _rss() - memory
+
+        begin = time.perf_counter()
+        price = listing.current_price
+        for _ in range(bids):
+            price += Decimal(1)
+            await sync_to_async(bidding.place_bid)(listing.id, bidder, price)
+            await asyncio.sleep(interval)
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        return connect_time, memory, time.perf_counter() - begin, live.hub.stats()
+
+    connect_time, memory, elapsed, stats = asyncio.run(main())
+    latencies.sort()
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "connections": len(clients),
+        "connect_time": connect_time,
+        "memory_per_connection": memory / len(clients),
+        "events": bids,
+        "expected": bids * len(clients),
+        "delivered": len(latencies),
+        "elapsed": elapsed,
+        "p50": percentile(ms, 50) if ms else 0.0,
+        "p95": percentile(ms, 95) if ms else 0.0,
+        "p99": percentile(ms, 99) if ms else 0.0,
+        "max": ms[-1] if ms else 0.0,
+        "hub": stats,
+    }
@@ -0,0 +1,116 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from auctions.models import AuctionListing, Category, User
+
+# Default weights of the request mix
+MIX = {
+    "index": 30,
+    "category": 10,
+    "listing": 40,
+    "bid": 10,
+    "comment": 5,
+    "watch": 5,
+}
+
+
+def parse_mix(text):
+    # "index=30,listing=50,bid=20"
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in MIX:
+            raise ValueError(f"Unknown scenario {name.strip()!r}, expected one of {', '.join(MIX)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class Scenarios:
+    """
+    The user flows of auctions/urls.py, each one does a single request with the worker's client.
+    """
+
+    def __init__(self, client, rng, listing_ids, category_slugs):
+        self.client = client
+        self.rng = rng
+        self.listing_ids = listing_ids
+        self.category_slugs = category_slugs
+
+    def index(self):
+        return self.client.get(reverse("index"), {"sort": self.rng.choice(["ending", "newest", "price"])})
+
+    def category(self):
+        return self.client.get(reverse("categories", args=[self.rng.choice(self.category_slugs)]))
+
+    def listing(self):
+        return self.client.get(reverse("listings", args=[self.rng.choice(self.listing_ids)]))
+
+    def bid(self):
+        listing_id = self.rng.choice(self.listing_ids)
+        price = AuctionListing.objects.values_list("current_price", flat=True).get(pk=listing_id)
+        amount = price + Decimal(self.rng.randint(1, 500)) / 100
+        return self.client.post(reverse("listings", args=[listing_id]), {"amount": amount, "seen_price": price})
+
+    def comment(self):
+        listing_id = self.rng.choice(self.listing_ids)
+        return self.client.post(reverse("listings", args=[listing_id]), {"comment_text": "Load test comment"})
+
+    def watch(self):
+        listing_id = self.rng.choice(self.listing_ids)
+        watch = self.rng.choice(["true", "false"])
+        return self.client.get(reverse("listings", args=[listing_id]), {"watch": watch})
+
+
+def run_load(workers=8, requests=200, mix=MIX, random_seed=None, anonymous=0.5):
+    """
+    Replay a weighted mix of requests from concurrent workers, each with its own test client.
+
+    A share of the workers browse anonymously (they only run the read scenarios). Returns the
+    (scenario, latency, ok) samples and the elapsed time.
+    """
+    listing_ids = list(AuctionListing.objects.values_list("id", flat=True))
+    category_slugs = list(Category.objects.values_list("slug", flat=True))
+    user_ids = list(User.objects.values_list("id", flat=True))
+    samples = []
+    lock = threading.Lock()
+    start = threading.Barrier(workers)
+
+    def worker(number):
+        rng = random.Random(None if random_seed is None else random_seed + number)
+        client = Client(HTTP_HOST="localhost")
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        if rng.random() >= anonymous:
+            client.force_login(User.objects.get(pk=rng.choice(user_ids)))
+        else:
+            weights = [weight if name in ("index", "category", "listing") else 0 for name, weight in zip(names, weights)]
+        scenarios = Scenarios(client, rng, listing_ids, category_slugs)
+        results = []
+        try:
+            start.wait()
+            for _ in range(requests):
+                name = rng.choices(names, weights)[0]
+                begin = time.perf_counter()
+                try:
+                    ok = getattr(scenarios, name)().status_code < 400
+                except Exception:
+                    ok = False
+                results.append((name, time.perf_counter() - begin, ok))
+        finally:
+            connection.close()
+        with lock:
+            samples.extend(results)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(workers)]
+    begin = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - begin
@@ -0,0 +1,60 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.utils import timezone
+
+from auctions import bidding, notifications
+from auctions.models import AuctionListing, OutboxEvent, User
+from . import Timer
+
+BATCH_SIZE = 5000
+
+
+def run_fanout(listing_owner, watchers=100000, bids=20, bidders=5):
+    """
+    One listing with the given number of watchers gets bids, then the outbox is processed into the
+    locmem email backend: fan-out time, emails per second, and how many emails a notification per
+    bid would have been.
+    """
+    listing = AuctionListing.objects.create(
+        title="Fan-out benchmark", description="", listed_by=listing_owner, initial_price=Decimal("1.00"),
+    )
+    with Timer() as setup:
+        Watch = AuctionListing.watchers.through
+        for start in range(0, watchers, BATCH_SIZE):
+            users = User.objects.bulk_create([
+                User(username=f"watcher{number}", email=f"watcher{number}@example.com")
+                for number in range(start, min(start + BATCH_SIZE, watchers))
+            ])
+            Watch.objects.bulk_create([Watch(auctionlisting_id=listing.id, user_id=user.pk) for user in users])
+    bidding_users = [User.objects.create_user(f"bidder{number}", f"bidder{number}@example.com") for number in range(bidders)]
+
+    with Timer() as placing:
+        for number in range(bids):
+            bidding.place_bid(listing.id, bidding_users[number % bidders], listing.initial_price + number + 1)
+    depth = notifications.outbox_metrics()["depth"]
+
+    connection = get_connection("django.core.mail.backends.locmem.EmailBackend")
+    mail.outbox = []
+    now = timezone.now() + timedelta(seconds=notifications.WINDOW * 2)
+    begin = time.perf_counter()
+    result = notifications.process_outbox(now=now, connection=connection)
+    elapsed = time.perf_counter() - begin
+    sent = len(mail.outbox)
+    mail.outbox = []
+    return {
+        "watchers": watchers,
+        "setup_seconds": setup.elapsed,
+        "bid_ms": placing.elapsed / bids * 1000 if bids else 0.0,
+        "queue_depth": depth,
+        "events": result["events"],
+        "emails": sent,
+        "fanout_seconds": elapsed,
+        "backend_seconds": result["send_seconds"],
+        "emails_per_second": sent / elapsed if elapsed else 0.0,
+        "emails_without_batching": (watchers + bidders) * bids,
+        "pending_after": OutboxEvent.objects.filter(processed_at__isnull=True).count(),
+    }
@@ -0,0 +1,102 @@
+import random
+import time
+from decimal import Decimal
+
+from django.db import transaction
+
+from auctions import bidding
+from auctions.models import AuctionListing, Bid, ProxyBid, User
+from auctions.profiling import percentile
+from auctions.proxy import ProxyBook, increment, resolve_proxies
+from . import Timer
+
+
+def _summary(seconds):
+    ms = sorted(value * 1000 for value in seconds)
+    return {"p50": percentile(ms, 50), "p99": percentile(ms, 99)}
+
+
+def _maximums(count, rng):
+    return [(user_id, Decimal(rng.randint(1000, 10000000)) / 100) for user_id in range(count)]
+
+
+def run_engine(proxies=5000, seed=1):
+    """
+    The engine alone, in memory: maximums arriving one at a time against one auction, each arrival
+    resolved (what a hot auction sees), and full resolutions from scratch as load_book() does them.
+
+    Also counts the bids one-increment-at-a-time proxy bidding would have written for the arrivals.
+    """
+    rng = random.Random(seed)
+    maximums = _maximums(proxies, rng)
+
+    book = ProxyBook()
+    price, holder = Decimal("10.00"), None
+    naive_bids = 0
+    with Timer() as arrivals:
+        for order, (user_id, amount) in enumerate(maximums):
+            book.set(user_id, amount, order)
+            resolution = book.resolve(price, holder)
+            if resolution is not None:
+                holder, price = resolution
+    # One increment per bid up to the second highest maximum, only counted
+    runner_up = sorted(amount for _, amount in maximums)[-2]
+    step_price = Decimal("10.00")
+    while step_price < runner_up:
+        step_price += increment(step_price)
+        naive_bids += 1
+
+    rounds = 20
+    with Timer() as rebuilds:
+        for _ in range(rounds):
+            ProxyBook((user_id, amount, order) for order, (user_id, amount) in enumerate(maximums)).resolve(Decimal("10.00"))
+    return {
+        "proxies": proxies,
+        "arrivals_per_second": arrivals.rate(proxies),
+        "rebuild_ms": rebuilds.elapsed / rounds * 1000,
+        "final_price": price,
+        "increment_bids": naive_bids,
+    }
+
+
+def run_database(listing_owner, proxies=5000, calls=200, seed=1):
+    """
+    On an auction with the given number of maximums: resolving all of them at once (rolled back
+    every time, each run loads every maximum), then a bidding war of set_max_bid() calls from new
+    users raising a little over the price. Counts the bids written.
+    """
+    rng = random.Random(seed)
+    listing = AuctionListing.objects.create(
+        title="Proxy benchmark", description="", listed_by=listing_owner, initial_price=Decimal("10.00"),
+    )
+    users = User.objects.bulk_create([User(username=f"proxy{number}") for number in range(proxies + calls)])
+    ProxyBid.objects.bulk_create([
+        ProxyBid(auction=listing, user=user, max_amount=amount)
+        for user, (_, amount) in zip(users, _maximums(proxies, rng))
+    ])
+
+    resolutions = []
+    for _ in range(max(calls // 10, 1)):
+        begin = time.perf_counter()
+        with transaction.atomic():
+            resolve_proxies(listing.id, listing.initial_price)
+            transaction.set_rollback(True)
+        resolutions.append(time.perf_counter() - begin)
+
+    bidding.set_max_bid(listing.id, users[proxies], Decimal("10.50"))
+    samples = []
+    statuses = {}
+    for user in users[proxies + 1:]:
+        price = AuctionListing.objects.values_list("current_price", flat=True).get(pk=listing.id)
+        amount = price + increment(price) * rng.randint(1, 5)
+        begin = time.perf_counter()
+        result = bidding.set_max_bid(listing.id, user, amount)
+        samples.append(time.perf_counter() - begin)
+        statuses[result.status] = statuses.get(result.status, 0) + 1
+    return {
+        "resolve_all": _summary(resolutions),
+        "calls": len(samples),
+        "set_max_bid": _summary(samples),
+        "statuses": statuses,
+        "bids": Bid.objects.filter(auction=listing).count(),
+    }
@@ -0,0 +1,68 @@
+import random
+import threading
+
+from auctions.ratelimit import BID, COMMENT, WATCH, CacheBuckets, Limiter, LocalBuckets
+from . import Timer
+
+
+def run_decisions(threads=4, decisions=100000, backend="local", keys=1000):
+    """
+    Admission decisions per second, split over threads, on keys distinct users and one listing each.
+    The limits are high enough that every request is let in, so each decision writes its buckets.
+    """
+    buckets = LocalBuckets() if backend == "local" else CacheBuckets()
+    limiter = Limiter(buckets, limits={BID: (1e6, 1e6)}, capacity=(1e9, 1e9))
+    per_thread = decisions // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(number):
+        clients = [f"u{number}-{key}" for key in range(keys)]
+        barrier.wait()
+        for index in range(per_thread):
+            limiter.admit(BID, clients[index % keys], index % 7)
+
+    workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+    for thread in workers:
+        thread.start()
+    with Timer() as timer:
+        barrier.wait()
+        for thread in workers:
+            thread.join()
+    return {"threads": threads, "backend": backend, "per_second": timer.rate(per_thread * threads)}
+
+
+def run_flood(seconds=60, bidders=50, bot_rate=500, bot_addresses=5000, reserve=0.5, seed=1):
+    """
+    Simulated minute of a listing under a flood of comments and watch toggles from many addresses,
+    while the bidders bid every few seconds. Returns the accepted and shed counts per lane.
+
+    The clock is simulated, so the result only depends on the limits, not on this machine.
+    """
+    rng = random.Random(seed)
+    now = [0.0]
+    buckets = LocalBuckets()
+    buckets.clock = lambda: now[0]
+    limiter = Limiter(buckets, reserve=reserve)
+
+    arrivals = []
+    for bidder in range(bidders):
+        at = rng.uniform(0, 5)
+        while at < seconds:
+            arrivals.append((at, BID, f"u{bidder}"))
+            at += rng.expovariate(1 / 5)
+    at = 0.0
+    while at < seconds:
+        arrivals.append((at, rng.choice((COMMENT, WATCH)), f"10.0.{rng.randrange(bot_addresses)}"))
+        at += rng.expovariate(bot_rate)
+    arrivals.sort()
+
+    for at, lane, client in arrivals:
+        now[0] = at
+        limiter.admit(lane, client, 1)
+    counts = limiter.counters()
+    results = {}
+    for lane in (BID, COMMENT, WATCH):
+        accepted, shed = counts.get(f"{lane}.accepted", 0), counts.get(f"{lane}.shed", 0)
+        results[lane] = {"accepted": accepted, "shed": shed, "shed_ratio": shed / max(accepted + shed, 1)}
+    results["writes_per_second"] = sum(results[lane]["accepted"] for lane in (BID, COMMENT, WATCH)) / seconds
+    return results
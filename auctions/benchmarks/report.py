@@ -0,0 +1,93 @@
+import json
+import subprocess
+from collections import defaultdict
+
+from django.utils import timezone
+
+from auctions.profiling import percentile
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(samples, elapsed, options=None):
+    """
+    Summarise (endpoint, latency in seconds, ok) samples into requests per second and latency
+    percentiles (ms) per endpoint.
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for endpoint, latency, ok in samples:
+        latencies[endpoint].append(latency * 1000)
+        if not ok:
+            errors[endpoint] += 1
+
+    endpoints = {}
+    for endpoint, values in sorted(latencies.items()):
+        values.sort()
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "errors": errors[endpoint],
+            "rps": len(values) / elapsed if elapsed else 0.0,
+            "mean": sum(values) / len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "commit": git_commit(),
+        "created": timezone.now().isoformat(),
+        "options": options or {},
+        "elapsed": elapsed,
+        "requests": total,
+        "rps": total / elapsed if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def format_report(report, baseline=None):
+    lines = [
+        f"Commit {report['commit'] or 'unknown'}: {report['requests']} requests in {report['elapsed']:.1f}s, "
+        f"{report['rps']:.1f} req/s",
+        f"{'endpoint':<10} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}",
+    ]
+    for name, endpoint in report["endpoints"].items():
+        lines.append(
+            f"{name:<10} {endpoint['requests']:>9} {endpoint['errors']:>7} {endpoint['rps']:>8.1f} "
+            f"{endpoint['p50']:>8.2f} {endpoint['p95']:>8.2f} {endpoint['p99']:>8.2f}"
+        )
+    if baseline:
+        lines.append(f"\nCompared to {baseline['commit'] or 'baseline'} (latency + is slower, req/s + is more):")
+        for name, endpoint in report["endpoints"].items():
+            before = baseline["endpoints"].get(name)
+            if not before:
+                continue
+            lines.append(
+                f"{name:<10} p50 {_change(before['p50'], endpoint['p50']):>8} "
+                f"p95 {_change(before['p95'], endpoint['p95']):>8} "
+                f"req/s {_change(before['rps'], endpoint['rps']):>8}"
+            )
+    return "\n".join(lines)
+
+
+def _change(before, after):
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def save_report(report, path):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def load_report(path):
+    with open(path) as file:
+        return json.load(file)
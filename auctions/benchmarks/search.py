@@ -0,0 +1,77 @@
+import itertools
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from auctions import search
+from auctions.models import AuctionListing, Category
+from auctions.profiling import percentile
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "shi", "ber", "dan", "gor", "pel", "tri", "xen", "qua", "zim"]
+
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def insert_listings(user, count, words=20000, batch_size=5000, random_seed=None):
+    """
+    Bulk insert listings with random text, word frequencies follow a Zipf like curve so some words
+    are in most listings and most words in only a few. The triggers index them as they go in.
+
+    Returns the vocabulary, most frequent first.
+    """
+    rng = random.Random(random_seed)
+    vocab = vocabulary(words, rng)
+    # Weight of the word of rank n is 1/n
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocab) + 1)))
+    categories = [Category.objects.create(name=f"Category {number}") for number in range(10)]
+    now = timezone.now()
+
+    def text(length):
+        return " ".join(rng.choices(vocab, cum_weights=weights, k=length))
+
+    for start in range(0, count, batch_size):
+        batch = []
+        for _ in range(min(batch_size, count - start)):
+            price = Decimal(rng.randint(1, 500))
+            batch.append(AuctionListing(
+                title=text(rng.randint(3, 6)),
+                description=text(rng.randint(20, 40)),
+                listed_by=user,
+                category=rng.choice(categories),
+                end_datetime=now + timedelta(hours=rng.randint(-72, 24 * 14)),
+                initial_price=price,
+                current_price=price,
+                image_url="https://example.com/image.png",
+            ))
+        with transaction.atomic():
+            AuctionListing.objects.bulk_create(batch)
+    return vocab, categories
+
+
+def time_queries(queries, repeat=20, **filters):
+    """
+    {name: {p50, p95, results}} in milliseconds for each (name, text) query.
+    """
+    timings = {}
+    for name, text in queries:
+        latencies = []
+        for _ in range(repeat):
+            begin = time.perf_counter()
+            results = search.search(text, **filters)
+            latencies.append((time.perf_counter() - begin) * 1000)
+        latencies.sort()
+        timings[name] = {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "results": len(results.items),
+        }
+    return timings
@@ -0,0 +1,81 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from auctions.analytics import refresh_watcher_counts
+from auctions.models import AuctionListing, User
+from auctions.transfer import Importer
+
+# Default scale of a seeded marketplace, bids, comments and watchers are averages per listing
+SCALE = {
+    "users": 200,
+    "categories": 10,
+    "listings": 1000,
+    "bids": 10,
+    "comments": 3,
+    "watchers": 5,
+}
+
+
+def generate_records(users, categories, listings, bids, comments, rng):
+    # Import records for a random marketplace, a tenth of the listings have already ended
+    now = timezone.now()
+    for listing_id in range(1, listings + 1):
+        if rng.random() < 0.1:
+            end = now - timedelta(hours=rng.randint(1, 72))
+        else:
+            end = now + timedelta(hours=rng.randint(1, 24 * 14))
+        price = Decimal(rng.randint(1, 500))
+        yield {
+            "type": "auction",
+            "id": listing_id,
+            "title": f"Auction {listing_id}",
+            "description": f"Generated listing number {listing_id}",
+            "listed_by": f"user{rng.randrange(users)}",
+            "datetime_listed": (now - timedelta(days=rng.randint(1, 30))).isoformat(),
+            "end_datetime": end.isoformat(),
+            "initial_price": str(price),
+            "image_url": "https://example.com/image.png",
+            "category": f"Category {rng.randrange(categories)}" if rng.random() < 0.9 else None,
+        }
+        for _ in range(rng.randint(0, bids * 2)):
+            price += Decimal(rng.randint(1, 1000)) / 100
+            yield {
+                "type": "bid",
+                "auction": listing_id,
+                "user": f"user{rng.randrange(users)}",
+                "amount": str(price),
+            }
+        for number in range(rng.randint(0, comments * 2)):
+            yield {
+                "type": "comment",
+                "auction": listing_id,
+                "commented_by": f"user{rng.randrange(users)}",
+                "comment_text": f"Generated comment {number}",
+            }
+
+
+def seed(users=SCALE["users"], categories=SCALE["categories"], listings=SCALE["listings"],
+         bids=SCALE["bids"], comments=SCALE["comments"], watchers=SCALE["watchers"], random_seed=None):
+    """
+    Fill the database with a generated marketplace, returns the number of rows per record type.
+    """
+    rng = random.Random(random_seed)
+    counts = Importer().run(generate_records(users, categories, listings, bids, comments, rng))
+
+    # Watchers go straight into the many to many table
+    Watcher = AuctionListing.watchers.through
+    user_ids = list(User.objects.values_list("id", flat=True))
+    rows = []
+    for listing_id in range(1, listings + 1):
+        for user_id in rng.sample(user_ids, min(rng.randint(0, watchers * 2), len(user_ids))):
+            rows.append(Watcher(auctionlisting_id=listing_id, user_id=user_id))
+        if len(rows) >= 1000:
+            Watcher.objects.bulk_create(rows)
+            rows = []
+    Watcher.objects.bulk_create(rows)
+    refresh_watcher_counts()
+    counts["watcher"] = Watcher.objects.count()
+    return counts
@@ -0,0 +1,68 @@
+import time
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from auctions.models import AuctionListing, User
+from auctions.profiling import percentile
+
+DATABASE = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+    "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+}
+CACHED = {
+    "SESSION_ENGINE": "auctions.sessions",
+    "AUTHENTICATION_BACKENDS": ["auctions.auth.CachedModelBackend"],
+}
+SIGNED_COOKIES = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.signed_cookies",
+    "AUTHENTICATION_BACKENDS": ["auctions.auth.CachedModelBackend"],
+}
+SETUPS = {"database sessions": DATABASE, "cached sessions": CACHED, "signed cookies": SIGNED_COOKIES}
+
+
+def _kind(sql):
+    if '"django_session"' in sql:
+        return "session"
+    if 'FROM "auctions_user" WHERE' in sql:
+        return "user"
+    return "other"
+
+
+def _measure(client, urls):
+    counts = {"session": 0, "user": 0, "other": 0}
+    latencies = []
+    for url in urls:
+        with CaptureQueriesContext(connection) as context:
+            begin = time.perf_counter()
+            client.get(url)
+            latencies.append((time.perf_counter() - begin) * 1000)
+        for query in context.captured_queries:
+            counts[_kind(query["sql"])] += 1
+    latencies.sort()
+    return {
+        **{kind: count / len(urls) for kind, count in counts.items()},
+        "p50": percentile(latencies, 50),
+    }
+
+
+def compare_sessions(requests=200, save_every_request=False):
+    """
+    Database round-trips per request of a logged in user on the index and a listing page with each
+    session and user setup, split into session, user and other queries. save_every_request makes
+    every request save its session (sliding expiry), which the write-behind absorbs.
+    """
+    listing_id = AuctionListing.objects.values_list("id", flat=True).first()
+    urls = [reverse("index"), reverse("listings", args=[listing_id])] * (requests // 2)
+    user, _ = User.objects.get_or_create(username="session-bench")
+    results = {}
+    for name, setup in SETUPS.items():
+        with override_settings(**setup, SESSION_SAVE_EVERY_REQUEST=save_every_request):
+            # A new client loads the middleware, and the session engine with it
+            client = Client(HTTP_HOST="localhost")
+            client.force_login(user)
+            client.get(urls[0])
+            results[name] = _measure(client, urls)
+    return results
@@ -0,0 +1,153 @@
+import random
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from .models import AuctionListing, Bid, ProxyBid
+from .proxy import resolve_proxies
+
+# How many times a bid is retried when the database is locked by another writer
+MAX_RETRIES = 5
+# First back-off delay in seconds, doubled (with jitter) on every retry
+BACKOFF = 0.01
+
+# Bid results
+PLACED = "placed"
+TOO_LOW = "too_low"
+OUTBID = "outbid"
+CLOSED = "closed"
+BUSY = "busy"
+# Placed, but a proxy maximum of another user bid over it right away
+PROXY_OUTBID = "proxy_outbid"
+
+
+@dataclass
+class BidResult:
+    status: str
+    # Price of the listing after the attempt
+    current_price: Decimal = None
+    bid: Bid = None
+
+    @property
+    def placed(self):
+        return self.status == PLACED
+
+    @property
+    def message(self):
+        return {
+            PLACED: "Your bid was placed.",
+            TOO_LOW: "Your bid must be greater than the current price.",
+            OUTBID: "Someone outbid you while you were bidding.",
+            CLOSED: "This auction has already ended.",
+            BUSY: "Too many bids at the same time, please try again.",
+            PROXY_OUTBID: "Your bid was placed, but another bidder's maximum bid is higher.",
+        }[self.status]
+
+
+class _Outbid(Exception):
+    pass
+
+
+def _is_lock_error(error):
+    message = str(error).lower()
+    return any(text in message for text in ("locked", "could not obtain lock", "deadlock", "could not serialize"))
+
+
+def _locked_listing(listing_id):
+    listings = AuctionListing.objects.only("id", "end_datetime", "initial_price", "current_price", "highest_bid")
+    # SQLite locks the whole database on write instead, the check in place_bid covers it
+    if connection.features.has_select_for_update:
+        listings = listings.select_for_update()
+    return listings.get(pk=listing_id)
+
+
+def _retrying(write, max_retries, backoff):
+    for attempt in range(max_retries + 1):
+        try:
+            return write()
+        except OperationalError as error:
+            if not _is_lock_error(error):
+                raise
+            if attempt == max_retries:
+                return BidResult(BUSY)
+            # Back off exponentially with jitter so the competing writers spread out
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def _is_closed(listing):
+    return listing.end_datetime is not None and listing.end_datetime <= timezone.now()
+
+
+def place_bid(listing_id, user, amount, seen_price=None, max_retries=MAX_RETRIES, backoff=BACKOFF):
+    """
+    Insert a bid only if it is still higher than the listing price when it is written.
+
+    seen_price is the price the bidder was looking at, if the listing has moved above it
+    the result is OUTBID instead of TOO_LOW. Proxy maximums above the bid answer it in the
+    same transaction (PROXY_OUTBID).
+    """
+    amount = Decimal(amount)
+
+    def write():
+        try:
+            with transaction.atomic():
+                listing = _locked_listing(listing_id)
+
+                if _is_closed(listing):
+                    return BidResult(CLOSED, listing.current_price)
+                if amount <= listing.current_price:
+                    if seen_price is not None and Decimal(seen_price) < listing.current_price:
+                        return BidResult(OUTBID, listing.current_price)
+                    return BidResult(TOO_LOW, listing.current_price)
+
+                bid = Bid.objects.create(user=user, auction=listing, amount=amount)
+
+                # Compare-and-swap: the bid signal only moves the price up if the bid still beats it,
+                # when another bid won the race roll the insert back
+                if not AuctionListing.objects.filter(pk=listing_id, highest_bid=bid).exists():
+                    raise _Outbid()
+
+                answer = resolve_proxies(listing_id, amount, user.id)
+                if answer is None:
+                    return BidResult(PLACED, amount, bid)
+                return BidResult(PLACED if answer.user_id == user.id else PROXY_OUTBID, answer.amount, bid)
+
+        except _Outbid:
+            return BidResult(OUTBID, AuctionListing.objects.values_list("current_price", flat=True).get(pk=listing_id))
+
+    return _retrying(write, max_retries, backoff)
+
+
+def set_max_bid(listing_id, user, max_amount, max_retries=MAX_RETRIES, backoff=BACKOFF):
+    """
+    Register (or change) the most the user will pay, the proxy engine bids for them up to it.
+
+    PLACED when the user leads afterwards (bid is their new bid, if the price moved), PROXY_OUTBID
+    when another user's maximum is higher.
+    """
+    max_amount = Decimal(max_amount)
+
+    def write():
+        with transaction.atomic():
+            listing = _locked_listing(listing_id)
+            if _is_closed(listing):
+                return BidResult(CLOSED, listing.current_price)
+            if max_amount <= listing.current_price:
+                return BidResult(TOO_LOW, listing.current_price)
+
+            holder_id = Bid.objects.filter(pk=listing.highest_bid_id).values_list("user_id", flat=True).first()
+            ProxyBid.objects.update_or_create(
+                auction_id=listing_id, user=user, defaults={"max_amount": max_amount, "updated_at": timezone.now()}
+            )
+            bid = resolve_proxies(listing_id, listing.current_price, holder_id)
+            if bid is None:
+                status = PLACED if holder_id == user.id else PROXY_OUTBID
+                return BidResult(status, listing.current_price)
+            if bid.user_id != user.id:
+                return BidResult(PROXY_OUTBID, bid.amount)
+            return BidResult(PLACED, bid.amount, bid)
+
+    return _retrying(write, max_retries, backoff)
@@ -0,0 +1,172 @@
+"""
+Category catalog: every category with its slug, open listing count and starting price range.
+
+The stats live on the Category rows and are updated incrementally when listings are created,
+closed, moved to another category or deleted, so the catalog is built from the categories table
+alone. The built catalog is cached under a version that every change bumps.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import AuctionListing, Category, category_stats_expressions
+
+# Django cache holding the catalog and its version, shared by the processes (checks.py)
+CACHE_ALIAS = getattr(settings, "AUCTIONS_CATALOG_CACHE", "shared")
+TIMEOUT = getattr(settings, "AUCTIONS_CATALOG_TIMEOUT", 60 * 60)
+VERSION_KEY = "auctions:catalog-version"
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    id: int
+    name: str
+    slug: str
+    active_count: int
+    min_price: Decimal = None
+    max_price: Decimal = None
+
+
+class Catalog:
+    def __init__(self, version, entries):
+        self.version = version
+        self.entries = entries
+        self.by_slug = {entry.slug: entry for entry in entries}
+        self.by_name = {entry.name: entry for entry in entries}
+        self.by_id = {entry.id: entry for entry in entries}
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def find(self, slug_or_name):
+        # Category URLs used to carry the name, old links keep working
+        return self.by_slug.get(slug_or_name) or self.by_name.get(slug_or_name)
+
+    def choices(self):
+        return [(entry.id, entry.name) for entry in self.entries]
+
+
+def catalog_version():
+    cache = caches[CACHE_ALIAS]
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Starts above every version handed out before, like the listing versions (fragments.py)
+        cache.add(VERSION_KEY, time.time_ns() // 1000, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump():
+    # Not incr(), it isn't atomic on the file based cache (see fragments.py)
+    cache = caches[CACHE_ALIAS]
+    cache.set(VERSION_KEY, max(time.time_ns() // 1000, (cache.get(VERSION_KEY) or 0) + 1), None)
+
+
+def bump_catalog_version():
+    _bump()
+    # Again after the commit, a catalog built from the old rows in the meantime isn't kept
+    transaction.on_commit(_bump)
+
+
+# Catalog of the current version, kept in this process on top of the Django cache
+_local = threading.local()
+
+
+def _build(version):
+    fields = ["id", "name", "slug", *Category.STATS_FIELDS]
+    rows = Category.objects.order_by("name").values_list(*fields)
+    return Catalog(version, [CatalogEntry(*row) for row in rows])
+
+
+def get_catalog():
+    """
+    The current catalog: one cache lookup, plus one query on the categories table after a change.
+    """
+    version = catalog_version()
+    catalog = getattr(_local, "catalog", None)
+    if catalog is not None and catalog.version == version:
+        return catalog
+    cache = caches[CACHE_ALIAS]
+    key = f"auctions:catalog:{version}"
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = _build(version)
+        cache.set(key, catalog, TIMEOUT)
+    _local.catalog = catalog
+    return catalog
+
+
+def category_choices(empty_label):
+    # Callable choices for a form field, read from the catalog when the form is rendered
+    return lambda: [("", empty_label), *get_catalog().choices()]
+
+
+def add_listings(category_id, count, low, high):
+    # count open listings with starting prices between low and high joined the category
+    Category.objects.filter(pk=category_id).update(
+        active_count=F("active_count") + count,
+        min_price=Least(Coalesce(F("min_price"), low), low),
+        max_price=Greatest(Coalesce(F("max_price"), high), high),
+    )
+    bump_catalog_version()
+
+
+def remove_listings(category_id, count, low, high):
+    categories = Category.objects.filter(pk=category_id)
+    categories.update(active_count=Greatest(F("active_count") - count, 0))
+    # The range only has to be recalculated when a listing at one of its ends left
+    stats = category_stats_expressions()
+    categories.filter(Q(min_price__gte=low) | Q(max_price__lte=high)).update(
+        min_price=stats["min_price"],
+        max_price=stats["max_price"],
+    )
+    bump_catalog_version()
+
+
+def listing_saved(listing, created):
+    before = None if created else getattr(listing, "_catalog_state", False)
+    after = listing.catalog_state()
+    if before is False:
+        # Not loaded with the catalog fields, nothing to compare against
+        if after:
+            refresh_categories([after[0]])
+    elif before != after:
+        if before:
+            remove_listings(before[0], 1, before[1], before[1])
+        if after:
+            add_listings(after[0], 1, after[1], after[1])
+    listing.remember_catalog_state()
+
+
+def listing_deleted(listing):
+    state = listing.catalog_state()
+    if state:
+        remove_listings(state[0], 1, state[1], state[1])
+
+
+def listings_closed(listing_ids, closed_at):
+    # Categories of the listings close_auctions() just closed, one query for the whole batch
+    closed = AuctionListing.objects.filter(
+        pk__in=listing_ids, closed_at=closed_at, category__isnull=False
+    ).values("category").annotate(count=Count("id"), low=Min("initial_price"), high=Max("initial_price"))
+    for row in closed.order_by():
+        remove_listings(row["category"], row["count"], row["low"], row["high"])
+
+
+def refresh_categories(category_ids=None):
+    # Recalculate the stats from the listings table (after bulk imports, or to repair drift)
+    if category_ids is None:
+        category_ids = Category.objects.values("pk")
+    updated = Category.refresh_stats_of(category_ids)
+    bump_catalog_version()
+    return updated
@@ -0,0 +1,69 @@
+"""
+System checks of the cache setup: what the processes have to agree on (listing versions, the catalog,
+sessions, cached users) can't live in a cache local to each of them.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error, register
+
+# Backends whose entries are only seen by the process that wrote them
+PROCESS_LOCAL = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+def process_local(alias):
+    backend = caches[alias]
+    return f"{type(backend).__module__}.{type(backend).__name__}" in PROCESS_LOCAL
+
+
+@register()
+def fragment_cache_check(app_configs, **kwargs):
+    from .fragments import CACHE_ALIAS
+
+    if not process_local(CACHE_ALIAS):
+        return []
+    return [Error(
+        f"AUCTIONS_FRAGMENT_CACHE ({CACHE_ALIAS!r}) is local to each process.",
+        hint="A listing version bumped by one process would leave the others serving stale fragments and "
+             "API responses, use a file based or a shared cache (Memcached, Redis).",
+        obj=settings.CACHES[CACHE_ALIAS]["BACKEND"],
+        id="auctions.E001",
+    )]
+
+
+@register()
+def catalog_cache_check(app_configs, **kwargs):
+    from .catalog import CACHE_ALIAS
+
+    if not process_local(CACHE_ALIAS):
+        return []
+    return [Error(
+        f"AUCTIONS_CATALOG_CACHE ({CACHE_ALIAS!r}) is local to each process.",
+        hint="A category change in one process would leave the others serving the old catalog until it "
+             "expires, use a file based or a shared cache (Memcached, Redis).",
+        obj=settings.CACHES[CACHE_ALIAS]["BACKEND"],
+        id="auctions.E004",
+    )]
+
+
+@register()
+def session_cache_check(app_configs, **kwargs):
+    from .auth import CACHE_ALIAS
+
+    errors = []
+    if settings.SESSION_ENGINE == "auctions.sessions" and process_local(settings.SESSION_CACHE_ALIAS):
+        errors.append(Error(
+            f"SESSION_ENGINE is auctions.sessions but SESSION_CACHE_ALIAS ({settings.SESSION_CACHE_ALIAS!r}) "
+            "is local to each process.",
+            hint="A session written behind in one process is missing or stale in the others, use a shared "
+                 "cache (Memcached, Redis) or django.contrib.sessions.backends.db.",
+            id="auctions.E002",
+        ))
+    if "auctions.auth.CachedModelBackend" in settings.AUTHENTICATION_BACKENDS and process_local(CACHE_ALIAS):
+        errors.append(Error(
+            f"auctions.auth.CachedModelBackend is used but AUCTIONS_USER_CACHE ({CACHE_ALIAS!r}) is local to "
+            "each process.",
+            hint="A user saved in one process stays cached in the others, a changed password wouldn't log "
+                 "them out. Use a shared cache (Memcached, Redis) or ModelBackend.",
+            id="auctions.E003",
+        ))
+    return errors
@@ -0,0 +1,183 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+# Cookie that keeps a user's reads on the primary for a while after they wrote something
+STICKY_COOKIE = "auctions_primary"
+
+_current = ContextVar("auctions_database_state", default=None)
+
+
+class RequestState:
+    def __init__(self):
+        # Replica alias the reads of this request go to, None reads from the primary
+        self.replica = None
+        self.wrote = False
+
+
+def _set_pragmas(connection, **kwargs):
+    # Runs on the raw connection so the PRAGMAs aren't counted as queries of the request
+    if connection.vendor != "sqlite":
+        return
+    raw = connection.connection
+    for name, value in getattr(settings, "AUCTIONS_SQLITE_PRAGMAS", {}).items():
+        raw.execute(f"PRAGMA {name} = {value}")
+    # Reading the journal mode doesn't change the file. synchronous=NORMAL is only safe with WAL.
+    if raw.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+        raw.execute("PRAGMA synchronous = normal")
+
+
+connection_created.connect(_set_pragmas)
+
+
+def set_journal_mode(connection, wal=True):
+    """
+    Switches the SQLite database to WAL, or back to a rollback journal. It's stored in the database
+    file, so it's done once (manage.py sqlite_wal) and not on every connection. Returns the mode.
+    """
+    if connection.vendor != "sqlite":
+        raise ValueError(f"{connection.alias} isn't an SQLite database")
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA journal_mode = {'wal' if wal else 'delete'}")
+        return cursor.fetchone()[0]
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of the views ReplicaMiddleware picked to a replica, everything else to the primary.
+
+    Once a request wrote something its remaining reads go to the primary, and so do reads inside
+    a transaction (e.g. the select_for_update of a bid).
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or state.replica is None or state.wrote:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        # Instances read from a replica are saved to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, "AUCTIONS_DATABASE_REPLICAS", [])}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get the schema from the primary
+        if db in getattr(settings, "AUCTIONS_DATABASE_REPLICAS", []):
+            return False
+        return None
+
+
+# Models of the archive (archive.py), by model name as allow_migrate() gets it
+ARCHIVE_MODELS = {"archivedlisting", "archivedbid", "archivedcomment"}
+
+
+def archive_database():
+    return getattr(settings, "AUCTIONS_ARCHIVE_DATABASE", DEFAULT_DB_ALIAS)
+
+
+class ArchiveRouter:
+    """
+    Keeps the archived auctions in AUCTIONS_ARCHIVE_DATABASE, and only them when it isn't the primary.
+
+    Comes before ReplicaRouter, which answers for every other model.
+    """
+
+    def _is_archive(self, model):
+        # A model or one of its instances
+        return model._meta.app_label == "auctions" and model._meta.model_name in ARCHIVE_MODELS
+
+    def db_for_read(self, model, **hints):
+        if self._is_archive(model):
+            return archive_database()
+        # The users and categories of an archived row, Django would look in the row's database
+        instance = hints.get("instance")
+        if instance is not None and self._is_archive(instance):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return archive_database() if self._is_archive(model) else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Archived rows point at users and categories of the primary by id
+        if self._is_archive(obj1) or self._is_archive(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        archive = archive_database()
+        if app_label == "auctions" and model_name in ARCHIVE_MODELS:
+            return db == archive
+        # Nothing else goes into a separate archive database, RunPython operations included
+        if db == archive and archive != DEFAULT_DB_ALIAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Lets GET and HEAD requests of the views in AUCTIONS_REPLICA_VIEWS read from a random replica.
+
+    A request that writes sets a cookie that sends the user's reads to the primary for the next
+    AUCTIONS_REPLICA_STICKY_SECONDS, so the page after a bid shows the bid even when the replica lags.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.replicas = getattr(settings, "AUCTIONS_DATABASE_REPLICAS", [])
+        self.views = set(getattr(settings, "AUCTIONS_REPLICA_VIEWS", []))
+        self.sticky_seconds = getattr(settings, "AUCTIONS_REPLICA_STICKY_SECONDS", 10)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestState()
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = RequestState()
+        token = _current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _current.get()
+        if state is None or not self.replicas or request.method not in ("GET", "HEAD"):
+            return None
+        if STICKY_COOKIE in request.COOKIES or request.resolver_match.view_name not in self.views:
+            return None
+        state.replica = random.choice(self.replicas)
+        return None
+
+    def finish(self, response, state):
+        if state.wrote and self.replicas:
+            response.set_cookie(STICKY_COOKIE, "1", max_age=self.sticky_seconds, httponly=True, samesite="Lax")
+        return response
@@ -0,0 +1,213 @@
+"""
+Ranked feeds of open auctions: ending soon, trending (most bids lately) and most watched.
+
+Trending ranks by a time-decayed count of bids, each bid weighing half as much every
+AUCTIONS_TRENDING_HALF_LIFE. The decay is stored forward (TrendScore): a bid at time t adds
+e^(t * ln 2 / half-life) to the sum, kept as its log, so a bid is one UPDATE of one row and the order
+of the rows stays right as time passes. The watcher counts are kept by analytics.py.
+
+The feeds are built from the indexes as the top AUCTIONS_FEED_SIZE listings, cached for
+AUCTIONS_FEED_TTL seconds and kept in this process in between, so reading one doesn't query anything.
+compact() drops the scores of closed and cold listings, rebuild() makes them again from the ledger.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, FloatField, OuterRef, Q, Value
+from django.db.models.functions import Exp, Greatest, Least, Ln
+from django.utils import timezone
+
+from .models import AuctionListing, LedgerEvent, TrendScore
+
+CACHE_ALIAS = getattr(settings, "AUCTIONS_FEED_CACHE", "default")
+HALF_LIFE = getattr(settings, "AUCTIONS_TRENDING_HALF_LIFE", 60 * 60)
+SIZE = getattr(settings, "AUCTIONS_FEED_SIZE", 50)
+TTL = getattr(settings, "AUCTIONS_FEED_TTL", 5)
+# Half-lives after which a bid hardly counts, listings with nothing newer drop out of trending
+HORIZON = 10
+
+ENDING = "ending"
+TRENDING = "trending"
+WATCHED = "watched"
+FEEDS = {
+    ENDING: "Ending soon",
+    TRENDING: "Trending",
+    WATCHED: "Most watched",
+}
+
+# e-folds per second of the decay
+RATE = math.log(2) / HALF_LIFE
+
+
+@dataclass(frozen=True)
+class FeedEntry:
+    # What the listing cards show, plus how the feed ranked it
+    id: int
+    title: str
+    image_url: str
+    current_price: Decimal
+    bid_count: int
+    watcher_count: int
+    datetime_listed: datetime
+    end_datetime: datetime
+    heat: float = None
+
+
+@dataclass(frozen=True)
+class Feed:
+    name: str
+    built_at: float
+    entries: tuple
+
+    def top(self, limit=SIZE, now=None):
+        # Listings that ended since it was built are left out
+        now = now or timezone.now()
+        return [entry for entry in self.entries if entry.end_datetime > now][:limit]
+
+
+def point(moment):
+    # A bid at this moment, in the units of the scores
+    return moment.timestamp() * RATE
+
+
+def heat(score, now):
+    # Decayed number of bids the score stands for at the given time
+    return math.exp(score - point(now))
+
+
+def add_points(a, b):
+    # log(e^a + e^b) without overflowing, what the UPDATE of bid_placed() computes
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def bid_placed(listing_id, placed_at):
+    # A new bid was placed on the listing at the time of its ledger event, edits don't count
+    value = Value(point(placed_at), output_field=FloatField())
+    high, low = Greatest(F("score"), value), Least(F("score"), value)
+    rows = TrendScore.objects.filter(listing_id=listing_id)
+    added = {"score": high + Ln(Value(1.0) + Exp(low - high)), "updated_at": placed_at}
+    if rows.update(**added):
+        return
+    try:
+        with transaction.atomic():
+            TrendScore.objects.create(listing_id=listing_id, score=point(placed_at), updated_at=placed_at)
+    except IntegrityError:
+        # Another bid created it in the meantime
+        rows.update(**added)
+
+
+def listings_closed(listing_ids):
+    # Closed auctions leave the trending feed
+    TrendScore.objects.filter(listing_id__in=listing_ids).delete()
+
+
+def _open(now):
+    return AuctionListing.objects.filter(end_datetime__gt=now, closed_at__isnull=True)
+
+
+def _floor(now):
+    # Score of a single bid HORIZON half-lives ago
+    return point(now) - HORIZON * math.log(2)
+
+
+def compact(now=None):
+    """
+    Deletes the scores of listings that are closed, ended or too cold to be trending, which would
+    otherwise pile up in the table and its index. Returns how many were deleted.
+    """
+    now = now or timezone.now()
+    return TrendScore.objects.filter(
+        Q(score__lt=_floor(now)) | Q(listing__closed_at__isnull=False) | Q(listing__end_datetime__lte=now)
+    ).delete()[0]
+
+
+def rebuild(now=None):
+    """
+    Computes the scores of the open listings again from the placed events of the ledger, replacing
+    the stored ones. Only bids recent enough to still count are read. Returns how many there are.
+    """
+    now = now or timezone.now()
+    since = now - timedelta(seconds=HORIZON * HALF_LIFE)
+    # An edited bid is placed again, only its first placed event counts
+    placed_before = LedgerEvent.objects.filter(
+        auction_id=OuterRef("auction_id"), bid_id=OuterRef("bid_id"), kind=LedgerEvent.PLACED, id__lt=OuterRef("id")
+    )
+    events = LedgerEvent.objects.filter(
+        kind=LedgerEvent.PLACED, recorded_at__gte=since, auction_id__in=_open(now).values("pk")
+    ).exclude(Exists(placed_before)).order_by("id")
+    scores = {}
+    for listing_id, recorded_at in events.values_list("auction_id", "recorded_at").iterator():
+        value = point(recorded_at)
+        scores[listing_id] = (add_points(scores[listing_id][0], value) if listing_id in scores else value, recorded_at)
+    with transaction.atomic():
+        TrendScore.objects.all().delete()
+        TrendScore.objects.bulk_create([
+            TrendScore(listing_id=listing_id, score=score, updated_at=updated_at)
+            for listing_id, (score, updated_at) in scores.items()
+        ], batch_size=1000)
+    return len(scores)
+
+
+ENTRY_FIELDS = ("id", "title", "image_url", "current_price", "bid_count", "watcher_count", "datetime_listed", "end_datetime")
+
+
+def build_feed(name, size=SIZE, now=None):
+    # One query, each feed reads its index from the top
+    now = now or timezone.now()
+    listings = _open(now)
+    if name == ENDING:
+        rows = listings.order_by("end_datetime", "pk").values_list(*ENTRY_FIELDS)[:size]
+        entries = [FeedEntry(*row) for row in rows]
+    elif name == TRENDING:
+        rows = (
+            listings.filter(trend__score__gte=_floor(now)).order_by("-trend__score", "pk")
+            .values_list(*ENTRY_FIELDS, "trend__score")[:size]
+        )
+        entries = [FeedEntry(*row[:-1], heat=heat(row[-1], now)) for row in rows]
+    elif name == WATCHED:
+        rows = listings.filter(watcher_count__gt=0).order_by("-watcher_count", "pk").values_list(*ENTRY_FIELDS)[:size]
+        entries = [FeedEntry(*row, heat=row[5]) for row in rows]
+    else:
+        raise KeyError(name)
+    return Feed(name, time.time(), tuple(entries))
+
+
+# Feeds built less than TTL seconds ago, kept in this process on top of the Django cache
+_local = threading.local()
+
+
+def get_feed(name):
+    """
+    The feed, at most TTL seconds old: from this process's memory, else from the Django cache, else
+    built with one query.
+    """
+    if name not in FEEDS:
+        raise KeyError(name)
+    feeds = getattr(_local, "feeds", None)
+    if feeds is None:
+        feeds = _local.feeds = {}
+    feed = feeds.get(name)
+    if feed is not None and time.time() - feed.built_at < TTL:
+        return feed
+    cache = caches[CACHE_ALIAS]
+    key = f"auctions:feed:{name}"
+    feed = cache.get(key)
+    if feed is None or time.time() - feed.built_at >= TTL:
+        feed = build_feed(name)
+        cache.set(key, feed, TTL)
+    feeds[name] = feed
+    return feed
+
+
+def clear():
+    # Forget the built feeds, the next reads build them again
+    _local.feeds = {}
+    caches[CACHE_ALIAS].delete_many([f"auctions:feed:{name}" for name in FEEDS])
@@ -0,0 +1,150 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Django cache holding the listing versions and rendered fragments, shared by the processes (checks.py)
+CACHE_ALIAS = getattr(settings, "AUCTIONS_FRAGMENT_CACHE", "shared")
+# Fragments kept in this process on top of the Django cache
+LRU_SIZE = getattr(settings, "AUCTIONS_FRAGMENT_LRU_SIZE", 1000)
+TIMEOUT = getattr(settings, "AUCTIONS_FRAGMENT_TIMEOUT", 60 * 60)
+
+
+def _version_key(listing_id):
+    return f"auctions:listing-version:{listing_id}"
+
+
+def _first_version():
+    # A lost counter (evicted, cache restarted) starts again above every version it handed out before,
+    # so a version never names two different states of a listing
+    return time.time_ns() // 1000
+
+
+def listing_version(listing_id):
+    cache = caches[CACHE_ALIAS]
+    key = _version_key(listing_id)
+    version = cache.get(key)
+    if version is None:
+        # add() so two processes starting the counter don't reset each other
+        cache.add(key, _first_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def listing_versions(listing_ids):
+    # {listing id: version} in one cache round trip
+    keys = {_version_key(listing_id): listing_id for listing_id in listing_ids}
+    versions = {keys[key]: version for key, version in caches[CACHE_ALIAS].get_many(keys).items()}
+    for listing_id in listing_ids:
+        if listing_id not in versions:
+            versions[listing_id] = listing_version(listing_id)
+    return versions
+
+
+def _bump(listing_id):
+    # Not incr(): on the file based cache it's a read then a write, two processes bumping at once
+    # would both hand out the same version. One from the clock is new to each of them.
+    cache = caches[CACHE_ALIAS]
+    key = _version_key(listing_id)
+    version = max(_first_version(), (cache.get(key) or 0) + 1)
+    cache.set(key, version, None)
+    return version
+
+
+def bump_listing_versions(listing_ids, using=None):
+    # Every fragment of the listing is keyed by the version, so bumping it invalidates them all
+    listing_ids = list(listing_ids)
+    for listing_id in listing_ids:
+        _bump(listing_id)
+    # Again after the commit: a fragment rendered from the old rows in the meantime was stored
+    # under the first new version
+    transaction.on_commit(lambda: [_bump(listing_id) for listing_id in listing_ids], using=using)
+
+
+def bump_listing_version(listing_id):
+    bump_listing_versions([listing_id])
+
+
+def card_version(listing):
+    # Names what a listing card shows: cards are cached under it, so one rendered from rows read
+    # before a change (a page, a feed) is never served for the changed listing
+    shown = (listing.id, listing.title, listing.image_url, listing.current_price, listing.datetime_listed)
+    return hashlib.sha1(repr(shown).encode()).hexdigest()[:20]
+
+
+class FragmentCache:
+    """
+    Rendered template fragments per listing version: an in-process LRU in front of the Django cache.
+    """
+
+    def __init__(self, size=LRU_SIZE, timeout=TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.lru = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, name, listing_id, version=None):
+        if version is None:
+            version = listing_version(listing_id)
+        return f"auctions:fragment:{name}:{listing_id}:{version}"
+
+    def get(self, key):
+        with self.lock:
+            if key in self.lru:
+                self.lru.move_to_end(key)
+                self.hits += 1
+                return self.lru[key]
+        value = caches[CACHE_ALIAS].get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        caches[CACHE_ALIAS].set(key, value, self.timeout)
+        with self.lock:
+            self._remember(key, value)
+
+    def _remember(self, key, value):
+        self.lru[key] = value
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.size:
+            self.lru.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_render(self, name, listing_id, render, version=None):
+        key = self.key(name, listing_id, version)
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.lru),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.lru.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+fragments = FragmentCache()
@@ -0,0 +1,387 @@
+"""
+Image proxy for the listing images: each image URL is fetched once, resized to the fixed RENDITIONS
+in a background worker pool and kept on local disk under content-addressed names.
+
+Pages link to /images/<rendition>/<signed url> (the `image` filter of the images template library),
+the files never change so they are served with a one year, immutable Cache-Control. Resizing needs
+Pillow, without it (or with AUCTIONS_IMAGE_PROXY = False) pages link to the original URLs.
+
+The fetcher only connects to public addresses, checked on every connection including redirects,
+so a listing can't make the server request something of its own network.
+"""
+import hashlib
+import http.client
+import io
+import ipaddress
+import json
+import os
+import random
+import socket
+import struct
+import threading
+import time
+import urllib.parse
+import urllib.request
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.core import signing
+from django.utils.module_loading import import_string
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Pages link to the proxy, on when Pillow is installed: without it the proxy would serve the same bytes
+ENABLED = getattr(settings, "AUCTIONS_IMAGE_PROXY", None)
+if ENABLED is None:
+    ENABLED = Image is not None
+# Name: (max width, max height), the image is scaled down to fit and keeps its aspect ratio
+RENDITIONS = {
+    "thumb": (200, 200),
+    "detail": (800, 800),
+}
+ROOT = getattr(settings, "AUCTIONS_IMAGE_ROOT", os.path.join(settings.BASE_DIR, "image_cache"))
+WORKERS = getattr(settings, "AUCTIONS_IMAGE_WORKERS", 4)
+# Originals larger than this are refused
+MAX_BYTES = getattr(settings, "AUCTIONS_IMAGE_MAX_BYTES", 10 * 1024 * 1024)
+FETCH_TIMEOUT = getattr(settings, "AUCTIONS_IMAGE_FETCH_TIMEOUT", 10)
+# How long a request waits for an image that isn't ready before it's sent to the original, by default
+# it's sent there right away while a worker fetches the image
+WAIT = getattr(settings, "AUCTIONS_IMAGE_WAIT", 0)
+# A failed fetch is retried after this many seconds
+RETRY_AFTER = getattr(settings, "AUCTIONS_IMAGE_RETRY_AFTER", 60 * 60)
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CONTENT_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "gif": "image/gif", "webp": "image/webp"}
+
+_signer = signing.Signer(salt="auctions.images")
+
+
+class FetchError(Exception):
+    pass
+
+
+def sniff(data):
+    # Image format from the first bytes, None when it isn't one we serve
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def sign_url(url):
+    # Deterministic, so a card links to the same image URL every time it's rendered
+    return _signer.sign_object(url, compress=True)
+
+
+def unsign_url(token):
+    try:
+        return _signer.unsign_object(token)
+    except signing.BadSignature:
+        return None
+
+
+def public_addresses(host, port):
+    """
+    getaddrinfo() of the host, FetchError when any of its addresses isn't on the public internet
+    (loopback, private, link-local, reserved...).
+    """
+    try:
+        found = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError) as error:
+        raise FetchError(f"Can't resolve {host}: {error}") from error
+    for *_, sockaddr in found:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        address = getattr(address, "ipv4_mapped", None) or address
+        if not address.is_global:
+            raise FetchError(f"{host} resolves to {address}, which isn't a public address")
+    return found
+
+
+def _public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    # Connects to the very addresses that were checked, a second lookup can't swap in another one
+    host, port = address
+    error = None
+    for family, kind, proto, _, sockaddr in public_addresses(host, port):
+        sock = socket.socket(family, kind, proto)
+        try:
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as failed:
+            error = failed
+            sock.close()
+    raise error or OSError(f"Can't connect to {host}")
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, request):
+        return self.do_open(_PublicHTTPConnection, request)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, request):
+        return self.do_open(_PublicHTTPSConnection, request, context=self._context)
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    max_redirections = 5
+
+    def redirect_request(self, request, fp, code, msg, headers, url):
+        # urllib would follow ftp:// too
+        if urllib.parse.urlsplit(url).scheme not in ("http", "https"):
+            raise FetchError(f"Redirected to {url!r}, not an http(s) URL")
+        return super().redirect_request(request, fp, code, msg, headers, url)
+
+
+class HTTPFetcher:
+    def __init__(self, timeout=FETCH_TIMEOUT, max_bytes=MAX_BYTES):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        # No proxies from the environment, the addresses checked are the ones connected to
+        self.opener = urllib.request.build_opener(
+            urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler, _RedirectHandler,
+        )
+
+    def __call__(self, url):
+        if urllib.parse.urlsplit(url).scheme not in ("http", "https"):
+            raise FetchError(f"Unsupported image URL {url!r}")
+        request = urllib.request.Request(url, headers={"User-Agent": "auctions-image-proxy"})
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                data = response.read(self.max_bytes + 1)
+        except (OSError, ValueError, http.client.HTTPException) as error:
+            raise FetchError(f"Fetching {url} failed: {error}") from error
+        if len(data) > self.max_bytes:
+            raise FetchError(f"{url} is larger than {self.max_bytes} bytes")
+        return data
+
+
+def placeholder_png(width, height, seed=0):
+    # Noisy RGB PNG written by hand, so the stub works without Pillow
+    rng = random.Random(seed)
+    raw = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind, body):
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+class StubFetcher:
+    """
+    Offline fetcher for tests and benchmarks: known URLs return their bytes, any other URL a
+    generated placeholder of the given size. Counts the fetches per URL.
+    """
+
+    def __init__(self, images=None, size=(1200, 900)):
+        self.images = images or {}
+        self.size = size
+        self.fetches = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, url):
+        with self.lock:
+            self.fetches[url] = self.fetches.get(url, 0) + 1
+        if url in self.images:
+            data = self.images[url]
+            if isinstance(data, Exception):
+                raise data
+            return data
+        return placeholder_png(*self.size, seed=zlib.crc32(url.encode()))
+
+
+def render(data, size):
+    """
+    The image scaled down to fit size as a JPEG, (bytes, format). The original bytes without Pillow.
+    """
+    if Image is None:
+        return data, sniff(data)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(size, Image.LANCZOS)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            out = io.BytesIO()
+            image.save(out, "JPEG", quality=85, optimize=True, progressive=True)
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        raise FetchError(f"Can't read the image: {error}") from error
+    return out.getvalue(), "jpeg"
+
+
+class ImageStore:
+    """
+    Files under root:
+
+        originals/ab/<sha256>          fetched bytes
+        <rendition>/ab/<sha256>.<ext>  renditions, named by their own content
+        urls/<sha1 of the url>.json    what the URL resolved to (or why it failed)
+    """
+
+    def __init__(self, root=ROOT):
+        self.root = root
+
+    def path(self, relative):
+        return os.path.join(self.root, relative)
+
+    def _entry_path(self, url):
+        return self.path(os.path.join("urls", hashlib.sha1(url.encode()).hexdigest() + ".json"))
+
+    def _write(self, relative, data):
+        path = self.path(relative)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside then renamed, a reader never sees half a file
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+    def entry(self, url):
+        try:
+            with open(self._entry_path(url)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def save_entry(self, url, entry):
+        path = self._entry_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(entry, file)
+        os.replace(temporary, path)
+        return entry
+
+    def original(self, digest):
+        with open(self.path(os.path.join("originals", digest[:2], digest)), "rb") as file:
+            return file.read()
+
+    def add_original(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        self._write(os.path.join("originals", digest[:2], digest), data)
+        return digest
+
+    def add_rendition(self, name, data, kind):
+        digest = hashlib.sha256(data).hexdigest()
+        relative = os.path.join(name, digest[:2], f"{digest}.{kind}")
+        self._write(relative, data)
+        return {"path": relative, "type": CONTENT_TYPES[kind], "etag": digest[:20], "size": len(data)}
+
+
+class ImagePipeline:
+    """
+    Fetches and resizes images on a thread pool, one job per URL at a time. Finished entries are
+    kept in an in-process LRU in front of the store.
+    """
+
+    def __init__(self, store=None, fetcher=None, workers=WORKERS, lru_size=10000, wait=WAIT):
+        self.store = store or ImageStore()
+        self.fetcher = fetcher or import_string(getattr(settings, "AUCTIONS_IMAGE_FETCHER", "auctions.images.HTTPFetcher"))()
+        self.workers = workers
+        self.wait = wait
+        self.lru_size = lru_size
+        self.lock = threading.Lock()
+        self.executor = None
+        self.jobs = {}
+        self.entries = OrderedDict()
+
+    def submit(self, url):
+        with self.lock:
+            job = self.jobs.get(url)
+            if job is None:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="auctions-images")
+                job = self.jobs[url] = self.executor.submit(self.process, url)
+                job.add_done_callback(lambda _: self._forget(url))
+            return job
+
+    def _forget(self, url):
+        with self.lock:
+            self.jobs.pop(url, None)
+
+    def process(self, url):
+        entry = self.store.entry(url)
+        if entry and not entry.get("error") and entry["renditions"].keys() >= RENDITIONS.keys():
+            return entry
+        try:
+            if entry and not entry.get("error"):
+                # A rendition was added since, made from the stored original without fetching again
+                digest = entry["original"]
+                data = self.store.original(digest)
+            else:
+                data = self.fetcher(url)
+                if sniff(data) is None:
+                    raise FetchError(f"{url} is not a PNG, JPEG, GIF or WebP image")
+                digest = self.store.add_original(data)
+            renditions = {name: self.store.add_rendition(name, *render(data, size)) for name, size in RENDITIONS.items()}
+        except (FetchError, OSError) as error:
+            return self.store.save_entry(url, {"url": url, "error": str(error), "at": time.time()})
+        return self.store.save_entry(url, {"url": url, "original": digest, "renditions": renditions, "at": time.time()})
+
+    def _cached(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                self.entries.move_to_end(url)
+            return entry
+
+    def _remember(self, url, entry):
+        with self.lock:
+            self.entries[url] = entry
+            while len(self.entries) > self.lru_size:
+                self.entries.popitem(last=False)
+
+    def rendition(self, url, name, wait=None):
+        """
+        {path, type, etag, size} of the rendition, None when it isn't ready within wait seconds
+        (the pipeline's wait by default) or the image can't be fetched.
+        """
+        wait = self.wait if wait is None else wait
+        entry = self._cached(url) or self.store.entry(url)
+        failed_recently = entry and entry.get("error") and time.time() - entry["at"] < RETRY_AFTER
+        if not failed_recently and (entry is None or entry.get("error") or name not in entry["renditions"]):
+            try:
+                entry = self.submit(url).result(timeout=wait)
+            except TimeoutError:
+                return None
+        if entry.get("error"):
+            return None
+        self._remember(url, entry)
+        return entry["renditions"].get(name)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+pipeline = ImagePipeline()
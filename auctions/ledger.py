@@ -0,0 +1,235 @@
+"""
+Append-only ledger of what happened to every auction: bids placed and retracted, the auction closing
+and its winner being set. The bid signals and close_auctions() write it, nothing edits it.
+
+The state of an auction (standing bids, leader, price, closing) is a fold over its events. Snapshots
+of the folded state are saved every SNAPSHOT_EVERY events, so rebuilding it reads the latest snapshot
+and the events after it instead of every bid.
+"""
+import bisect
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import AuctionListing, LedgerEvent, LedgerSnapshot
+
+PLACED = LedgerEvent.PLACED
+RETRACTED = LedgerEvent.RETRACTED
+CLOSED = LedgerEvent.CLOSED
+WINNER_SET = LedgerEvent.WINNER_SET
+
+# A snapshot is saved once this many events follow the latest one
+SNAPSHOT_EVERY = getattr(settings, "AUCTIONS_LEDGER_SNAPSHOT_EVERY", 1000)
+# Standing bids kept in a snapshot, enough to know the next leader after retractions
+TOP_SIZE = 16
+# Older snapshots of an auction are deleted
+SNAPSHOTS_KEPT = 2
+
+EVENT_FIELDS = ("id", "kind", "bid_id", "user_id", "amount", "recorded_at")
+
+_clock_lock = threading.Lock()
+_last_time = None
+
+
+def now():
+    # Wall clock time that never goes backwards in this process, even when the system clock does
+    global _last_time
+    with _clock_lock:
+        current = timezone.now()
+        if _last_time is not None and current <= _last_time:
+            current = _last_time + timedelta(microseconds=1)
+        _last_time = current
+        return current
+
+
+def record(listing_id, kind, bid_id=None, user_id=None, amount=None):
+    return LedgerEvent.objects.create(
+        auction_id=listing_id, kind=kind, bid_id=bid_id, user_id=user_id, amount=amount, recorded_at=now()
+    )
+
+
+def record_many(events):
+    # (listing id, kind, bid id, user id, amount) tuples in one INSERT, timestamps in the given order
+    return LedgerEvent.objects.bulk_create([
+        LedgerEvent(auction_id=listing_id, kind=kind, bid_id=bid_id, user_id=user_id, amount=amount, recorded_at=now())
+        for listing_id, kind, bid_id, user_id, amount in events
+    ])
+
+
+def record_closed(listing_ids, closed_at):
+    # Closing (and winner) events of the listings close_auctions() just closed
+    closed = AuctionListing.objects.filter(pk__in=listing_ids, closed_at=closed_at).order_by("pk")
+    events = []
+    for listing_id, winner_id in closed.values_list("pk", "winner_id"):
+        events.append((listing_id, CLOSED, None, None, None))
+        if winner_id is not None:
+            events.append((listing_id, WINNER_SET, None, winner_id, None))
+    return record_many(events)
+
+
+def _key(bid):
+    # Highest amount first, the earlier bid wins a tie (like highest_bid)
+    return (-bid[0], bid[1])
+
+
+@dataclass
+class AuctionState:
+    last_event_id: int = 0
+    # Standing (not retracted) bids
+    bid_count: int = 0
+    # Highest standing bids as (amount, bid id, user id), best first, at most top_size of them
+    top: list = field(default_factory=list)
+    # When the current leader took the lead
+    leader_since: datetime = None
+    closed_at: datetime = None
+    winner_id: int = None
+    # Best standing bid cut from top, when some are: a bid placed below it may rank below the
+    # others cut too, so it isn't kept in top either
+    floor: tuple = None
+    top_size: int = field(default=TOP_SIZE, compare=False)
+
+    @property
+    def leader(self):
+        return self.top[0] if self.top else None
+
+    @property
+    def price(self):
+        # None without bids, the listing price is its initial price then
+        return self.top[0][0] if self.top else None
+
+    @property
+    def needs_replay(self):
+        # Every kept bid was retracted but others still stand, the snapshot can't tell which leads
+        return self.bid_count > 0 and not self.top
+
+    def apply(self, event_id, kind, bid_id, user_id, amount, recorded_at):
+        leader = self.leader
+        if kind == PLACED:
+            bid = (amount, bid_id, user_id)
+            if self.floor is None or _key(bid) < _key(self.floor):
+                bisect.insort(self.top, bid, key=_key)
+                if self.top_size is not None and len(self.top) > self.top_size:
+                    # Every bid in top ranks above the floor, so the best one cut is the new floor
+                    self.floor = self.top[self.top_size]
+                    del self.top[self.top_size:]
+            self.bid_count += 1
+        elif kind == RETRACTED:
+            for index, bid in enumerate(self.top):
+                if bid[1] == bid_id:
+                    del self.top[index]
+                    break
+            self.bid_count = max(self.bid_count - 1, 0)
+            if self.bid_count <= len(self.top):
+                # The bids cut were all retracted
+                self.floor = None
+        elif kind == CLOSED:
+            self.closed_at = recorded_at
+        elif kind == WINNER_SET:
+            self.winner_id = user_id
+        if self.leader != leader:
+            self.leader_since = recorded_at if self.top else None
+        self.last_event_id = event_id
+
+    def to_json(self):
+        # A replayed state keeps every bid, cut to TOP_SIZE here
+        floor = self.top[TOP_SIZE] if len(self.top) > TOP_SIZE else self.floor
+        return {
+            "last_event_id": self.last_event_id,
+            "bid_count": self.bid_count,
+            "top": [[str(amount), bid_id, user_id] for amount, bid_id, user_id in self.top[:TOP_SIZE]],
+            "floor": [str(floor[0]), floor[1], floor[2]] if floor else None,
+            "leader_since": self.leader_since.isoformat() if self.leader_since else None,
+            "closed_at": self.closed_at.isoformat() if self.closed_at else None,
+            "winner_id": self.winner_id,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        top = [(Decimal(amount), bid_id, user_id) for amount, bid_id, user_id in data["top"]]
+        floor = None
+        if data["floor"]:
+            amount, bid_id, user_id = data["floor"]
+            floor = (Decimal(amount), bid_id, user_id)
+        return cls(
+            last_event_id=data["last_event_id"],
+            bid_count=data["bid_count"],
+            top=top,
+            floor=floor,
+            leader_since=datetime.fromisoformat(data["leader_since"]) if data["leader_since"] else None,
+            closed_at=datetime.fromisoformat(data["closed_at"]) if data["closed_at"] else None,
+            winner_id=data["winner_id"],
+        )
+
+
+def fold(listing_id, state, chunk_size=2000):
+    # Apply the events after state.last_event_id, returns how many there were
+    events = LedgerEvent.objects.filter(auction_id=listing_id, id__gt=state.last_event_id).order_by("id")
+    applied = 0
+    for event in events.values_list(*EVENT_FIELDS).iterator(chunk_size=chunk_size):
+        state.apply(*event)
+        applied += 1
+    return applied
+
+
+def replay(listing_id):
+    # The state from the first event, ignoring snapshots (slow, for checks and benchmarks)
+    state = AuctionState(top_size=None)
+    fold(listing_id, state)
+    return state
+
+
+def latest_snapshot(listing_id):
+    data = (
+        LedgerSnapshot.objects.filter(auction_id=listing_id)
+        .order_by("-last_event_id").values_list("state", flat=True).first()
+    )
+    return AuctionState.from_json(data) if data else None
+
+
+def save_snapshot(listing_id, state):
+    try:
+        with transaction.atomic():
+            LedgerSnapshot.objects.create(auction_id=listing_id, last_event_id=state.last_event_id, state=state.to_json())
+    except IntegrityError:
+        # Another process saved the same snapshot
+        return
+    stale = LedgerSnapshot.objects.filter(auction_id=listing_id).order_by("-last_event_id")[SNAPSHOTS_KEPT:]
+    LedgerSnapshot.objects.filter(pk__in=list(stale.values_list("pk", flat=True))).delete()
+
+
+def auction_state(listing_id, snapshot_every=SNAPSHOT_EVERY):
+    """
+    The current state of the auction: the latest snapshot plus the events after it. Saves a new
+    snapshot when the tail has grown to snapshot_every events.
+    """
+    state = latest_snapshot(listing_id) or AuctionState()
+    tail = fold(listing_id, state)
+    if state.needs_replay:
+        state = replay(listing_id)
+    if tail >= snapshot_every:
+        save_snapshot(listing_id, state)
+    return state
+
+
+def snapshots_due(min_events=SNAPSHOT_EVERY):
+    # Ids of the auctions with at least min_events events after their latest snapshot
+    latest = LedgerSnapshot.objects.filter(auction=OuterRef("auction")).order_by("-last_event_id").values("last_event_id")[:1]
+    return list(
+        LedgerEvent.objects.filter(id__gt=Coalesce(Subquery(latest), 0))
+        .values("auction").annotate(events=Count("id")).filter(events__gte=min_events)
+        .order_by().values_list("auction", flat=True)
+    )
+
+
+def history(listing_id, after=0, chunk_size=500):
+    # The events of an auction after the given event id, oldest first, as dicts
+    events = LedgerEvent.objects.filter(auction_id=listing_id, id__gt=after).order_by("id")
+    fields = ("id", "kind", "bid_id", "amount", "recorded_at", "user__username")
+    yield from events.values(*fields).iterator(chunk_size=chunk_size)
@@ -0,0 +1,245 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import AuctionListing
+
+# Events a subscriber can fall behind by before the oldest ones are dropped
+MAX_PENDING = getattr(settings, "AUCTIONS_LIVE_MAX_PENDING", 100)
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE = getattr(settings, "AUCTIONS_LIVE_KEEPALIVE", 15)
+# Streams are ended after this many seconds and the browser reconnects, so connections of clients
+# that went away without the server noticing don't pile up
+MAX_AGE = getattr(settings, "AUCTIONS_LIVE_MAX_AGE", 10 * 60)
+
+# Event types
+PRICE = "price"
+ENDED = "ended"
+
+
+def listing_topic(listing_id):
+    return f"listing:{listing_id}"
+
+
+def user_topic(user_id):
+    return f"user:{user_id}"
+
+
+@dataclass
+class Event:
+    id: int
+    type: str
+    listing: int
+    data: dict
+    # Wall clock time of the publish, lets clients (and bench_live) measure the delivery delay
+    time: float = field(default_factory=time.time)
+
+    def encode(self):
+        # Server-Sent Events format
+        data = json.dumps({"listing": self.listing, "time": self.time, **self.data})
+        return f"id: {self.id}\nevent: {self.type}\ndata: {data}\n\n".encode()
+
+
+class Subscription:
+    """
+    The events waiting to be sent on one connection.
+
+    Events are state updates, so a newer event of a listing replaces the one still waiting. When the
+    connection falls behind on more than max_pending listings the oldest event is dropped.
+    """
+
+    def __init__(self, hub, topics, loop, max_pending=MAX_PENDING):
+        self.hub = hub
+        self.topics = topics
+        self.loop = loop
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.ready = asyncio.Event()
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    # Only called on the subscriber's event loop
+    def put(self, event):
+        key = (event.type, event.listing)
+        if key in self.pending:
+            del self.pending[key]
+            self.coalesced += 1
+        elif len(self.pending) >= self.max_pending:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+        self.pending[key] = event
+        self.ready.set()
+
+    async def get(self, timeout=None):
+        """
+        Wait for the pending events and take them all, an empty list when the timeout passed first.
+        """
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        events = list(self.pending.values())
+        self.pending.clear()
+        self.ready.clear()
+        self.delivered += len(events)
+        return events
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    """
+    In-process pub/sub: connections subscribe to listing and user topics, publish() can be called from
+    any thread and hands the event to each subscriber's event loop.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self.topics = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, topics, max_pending=None):
+        subscription = Subscription(
+            self, tuple(topics), asyncio.get_running_loop(), max_pending or self.max_pending
+        )
+        with self.lock:
+            for topic in subscription.topics:
+                self.topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for topic in subscription.topics:
+                subscribers = self.topics.get(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.topics[topic]
+
+    def has_subscribers(self, topic):
+        return topic in self.topics
+
+    def subscribed_users(self):
+        with self.lock:
+            return [int(topic.split(":")[1]) for topic in self.topics if topic.startswith("user:")]
+
+    def publish(self, event_type, listing_id, data, user_ids=()):
+        """
+        Send the event to the subscribers of the listing and of the given users, each connection gets it
+        once. Returns how many connections it was sent to.
+        """
+        topics = [listing_topic(listing_id), *(user_topic(user_id) for user_id in user_ids)]
+        with self.lock:
+            subscribers = set().union(*(self.topics.get(topic, ()) for topic in topics))
+        if not subscribers:
+            return 0
+        event = Event(next(self.ids), event_type, listing_id, data)
+        self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The loop of a dropped connection is already closed
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def stats(self):
+        with self.lock:
+            subscriptions = set().union(*self.topics.values()) if self.topics else set()
+        return {
+            "topics": len(self.topics),
+            "subscriptions": len(subscriptions),
+            "published": self.published,
+        }
+
+
+hub = Hub()
+
+
+async def stream(subscription, first=(), keepalive=KEEPALIVE, max_age=MAX_AGE):
+    """
+    Server-Sent Events body of a subscription: the first events, then everything published until
+    max_age has passed. The subscription is closed when the stream ends or the client goes away.
+    """
+    deadline = time.monotonic() + max_age
+    try:
+        # Ask the browser to reconnect right away when the stream ends
+        yield b"retry: 1000\n\n"
+        for event in first:
+            yield event.encode()
+        while time.monotonic() < deadline:
+            events = await subscription.get(min(keepalive, max(deadline - time.monotonic(), 0)))
+            if not events:
+                yield b": keepalive\n\n"
+            for event in events:
+                yield event.encode()
+    finally:
+        subscription.close()
+
+
+# Fields of the listing sent with every event
+STATE_FIELDS = ("pk", "current_price", "bid_count", "highest_bid__user_id", "winner_id", "closed_at")
+
+
+def listing_states(listing_ids):
+    # {listing id: event data} of the listings
+    return {
+        row["pk"]: {
+            "current_price": str(row["current_price"]),
+            "bid_count": row["bid_count"],
+            "highest_bidder": row["highest_bid__user_id"],
+            "winner": row["winner_id"],
+            "closed": row["closed_at"] is not None,
+        }
+        for row in AuctionListing.objects.filter(pk__in=listing_ids).values(*STATE_FIELDS)
+    }
+
+
+def publish_listings(event_type, listing_ids, publisher=hub):
+    """
+    Publish the current state of the listings to their subscribers and to their subscribed watchers.
+
+    Nothing is read from the database when nobody is listening.
+    """
+    users = set(publisher.subscribed_users())
+    listing_ids = [
+        listing_id for listing_id in listing_ids
+        if users or publisher.has_subscribers(listing_topic(listing_id))
+    ]
+    if not listing_ids:
+        return 0
+
+    watchers = {}
+    if users:
+        Watch = AuctionListing.watchers.through
+        for listing_id, user_id in Watch.objects.filter(
+            auctionlisting_id__in=listing_ids, user_id__in=users
+        ).values_list("auctionlisting_id", "user_id"):
+            watchers.setdefault(listing_id, []).append(user_id)
+
+    sent = 0
+    for listing_id, state in listing_states(listing_ids).items():
+        if event_type == ENDED and not state["closed"]:
+            continue
+        sent += publisher.publish(event_type, listing_id, state, watchers.get(listing_id, ()))
+    return sent
+
+
+def notify(event_type, listing_ids):
+    # Publish once the change is committed, the subscribers read the new state
+    if not hub.topics:
+        return
+    listing_ids = list(listing_ids)
+    transaction.on_commit(lambda: publish_listings(event_type, listing_ids))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from auctions import archive
+
+
+class Command(BaseCommand):
+    help = "Move closed auctions older than AUCTIONS_ARCHIVE_AFTER_DAYS to the archive, run it again to resume"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=archive.AFTER_DAYS, help="Archive auctions closed more than this many days ago")
+        parser.add_argument("--batch-size", type=int, default=archive.BATCH_SIZE, help="Auctions moved per transaction")
+        parser.add_argument("--limit", type=int, default=None, help="Stop after archiving this many auctions")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the auctions that would be archived")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            count = archive.archivable(archive.cutoff(options["days"])).count()
+            self.stdout.write(f"{count} auction(s) closed more than {options['days']} days ago")
+            return
+        archived = archive.archive_auctions(
+            after_days=options["days"],
+            batch_size=options["batch_size"],
+            limit=options["limit"],
+            report=lambda count: self.stderr.write(f"{count} auction(s) archived"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} auction(s)"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from auctions import analytics
+
+
+class Command(BaseCommand):
+    help = "Build the analytics rollups and watcher counts again from the ledger, the closed listings and the watchers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=analytics.BATCH_SIZE, help="Rows read per query")
+
+    def handle(self, *args, **options):
+        counts = analytics.backfill(
+            batch_size=options["batch_size"],
+            report=lambda name, count: self.stderr.write(f"{count} {name} rolled up"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {counts['bids']} bid(s) and {counts['closed']} closed auction(s), "
+            f"counted the watchers of {counts['listings']} listing(s)"
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarks import scratch_database
+from auctions.benchmarks.analytics import run_analytics
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Analytics report from the rollups against the same numbers from full table scans, on a scratch database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=5000)
+        parser.add_argument("--bids", type=int, default=500000, help="Placed bid events in the history")
+        parser.add_argument("--watchers", type=int, default=20000)
+        parser.add_argument("--days", type=int, default=90, help="Days of history")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            results = run_analytics(
+                User.objects.create_user("seller"), options["listings"], options["bids"], options["watchers"], options["days"]
+            )
+        self.stdout.write(
+            f"{results['bids']} bids over {results['days']} days on {results['listings']} listings, "
+            f"{results['watchers']} watchers"
+        )
+        self.stdout.write(
+            f"Backfill: {results['backfill_seconds']:.1f}s ({results['backfill_rows_per_second']:.0f} rows/s)"
+        )
+        for name in ("rollups", "full_scan"):
+            self.stdout.write(f"Report from {name.replace('_', ' ')}: p50 {results[name]['p50']:.2f} ms p99 {results[name]['p99']:.2f} ms")
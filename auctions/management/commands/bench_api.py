@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from auctions.benchmarks import scratch_database
+from auctions.benchmarks.api import compare_api
+from auctions.benchmarks.seed import SCALE, seed
+
+
+class Command(BaseCommand):
+    help = "Payload size and latency of the JSON API against the HTML views, on a seeded scratch database"
+
+    def add_arguments(self, parser):
+        for name, default in SCALE.items():
+            parser.add_argument(f"--{name}", type=int, default=default, help=f"Seeded {name} (default {default})")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed(**{name: options[name] for name in SCALE}, random_seed=options["seed"])
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=["localhost"]):
+                results = compare_api(options["requests"], options["seed"])
+
+        self.stdout.write(f"{'endpoint':<16} {'p50 ms':>8} {'p95 ms':>8} {'bytes':>9} {'gzipped':>9}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<16} {result['p50']:>8.2f} {result['p95']:>8.2f} {result['bytes']:>9.0f} {result['gzip_bytes']:>9.0f}"
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarks import scratch_database
+from auctions.benchmarks.archive import run_archive
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Latency of the live queries before and after archiving the closed auctions, on a scratch database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=100000)
+        parser.add_argument("--bids", type=int, default=10, help="Bids per listing")
+        parser.add_argument("--closed", type=float, default=0.9, help="Share of the listings closed long enough to be archived")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            results = run_archive(
+                User.objects.create_user("seller"), options["listings"], options["bids"], options["closed"], options["batch_size"]
+            )
+        self.stdout.write(
+            f"Archived {results['archived']} of {results['listings']} listings in {results['archive_seconds']:.1f}s "
+            f"({results['archived_per_second']:.0f} listings/s), {results['live']} left live"
+        )
+        for name, before in results["before"].items():
+            after = results["after"][name]
+            self.stdout.write(
+                f"{name:<10} p50 {before['p50']:8.2f} ms -> {after['p50']:8.2f} ms   "
+                f"p99 {before['p99']:8.2f} ms -> {after['p99']:8.2f} ms"
+            )
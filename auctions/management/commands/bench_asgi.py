@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from auctions.benchmarks import Timer, scratch_database
+from auctions.benchmarks.concurrency import run_asgi, run_wsgi
+from auctions.benchmarks.report import build_report, format_report
+from auctions.benchmarks.seed import SCALE, seed
+
+
+class Command(BaseCommand):
+    help = "Serve the same read traffic from many concurrent clients through the sync (WSGI) and async (ASGI) views"
+
+    def add_arguments(self, parser):
+        for name, default in SCALE.items():
+            parser.add_argument(f"--{name}", type=int, default=default, help=f"Seeded {name} (default {default})")
+        parser.add_argument("--clients", type=int, default=1000, help="Concurrent simulated clients")
+        parser.add_argument("--requests", type=int, default=5, help="Requests per client")
+        parser.add_argument("--threads", type=int, default=8, help="Worker threads of the WSGI server")
+        parser.add_argument("--anonymous", type=float, default=0.5, help="Share of anonymous clients")
+        parser.add_argument("--seed", type=int, default=None, help="Random seed")
+
+    def handle(self, *args, **options):
+        load = {name: options[name] for name in ("clients", "requests", "anonymous")}
+        load["random_seed"] = options["seed"]
+
+        with scratch_database():
+            with Timer() as timer:
+                seed(**{name: options[name] for name in SCALE}, random_seed=options["seed"])
+            self.stdout.write(f"Seeded the marketplace in {timer.elapsed:.1f}s")
+
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=["localhost", "testserver"]):
+                with override_settings(ROOT_URLCONF="auctions.urls"):
+                    wsgi = build_report(*run_wsgi(threads=options["threads"], **load))
+                with override_settings(ROOT_URLCONF="auctions.async_urls"):
+                    asgi = build_report(*run_asgi(**load))
+
+        self.stdout.write(f"WSGI, {options['threads']} worker threads:")
+        self.stdout.write(format_report(wsgi))
+        self.stdout.write("\nASGI, one event loop:")
+        # The WSGI run is the baseline of the comparison
+        self.stdout.write(format_report(asgi, wsgi))
@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from auctions import bidding
+from auctions.benchmarks import scratch_database
+from auctions.benchmarks.bids import run_bid_stress
+from auctions.models import AuctionListing, Bid, User
+
+
+class Command(BaseCommand):
+    help = "Concurrent bidding stress benchmark, runs on a scratch database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--bids", type=int, default=100, help="Bids attempted per thread")
+        parser.add_argument("--readers", type=int, default=0, help="Threads reading the listing while the bids run")
+        parser.add_argument(
+            "--journal-mode", choices=["wal", "delete"],
+            help="SQLite journal mode of the scratch database (default delete, the mode of a new database)"
+        )
+
+    def handle(self, *args, **options):
+        pragmas = dict(getattr(settings, "AUCTIONS_SQLITE_PRAGMAS", {}))
+        if options["journal_mode"]:
+            pragmas["journal_mode"] = options["journal_mode"]
+        with override_settings(AUCTIONS_SQLITE_PRAGMAS=pragmas), scratch_database():
+            seller = User.objects.create_user("seller")
+            users = [User.objects.create_user(f"bidder{i}") for i in range(options["threads"])]
+            listing = AuctionListing.objects.create(
+                title="Benchmark", description="Benchmark", listed_by=seller,
+                initial_price=Decimal("1.00"), image_url="https://example.com/image.png"
+            )
+
+            results = run_bid_stress(listing, users, options["threads"], options["bids"], readers=options["readers"])
+
+            # Accepted bids must be strictly increasing in insert order
+            amounts = list(Bid.objects.filter(auction=listing).order_by("id").values_list("amount", flat=True))
+            increasing = all(a < b for a, b in zip(amounts, amounts[1:]))
+
+        for status in (bidding.PLACED, bidding.TOO_LOW, bidding.OUTBID, bidding.BUSY):
+            self.stdout.write(f"{status:>8}: {results[status]}")
+        self.stdout.write(f"Elapsed: {results['elapsed']:.2f}s, {results['bids_per_second']:.1f} accepted bids/s")
+        if options["readers"]:
+            self.stdout.write(
+                f"Reads: {results['reads']} ({results['reads_per_second']:.0f}/s, {results['failed_reads']} failed), "
+                f"p50 {results['read_p50']:.2f}ms p99 {results['read_p99']:.2f}ms"
+            )
+        if increasing:
+            self.stdout.write(self.style.SUCCESS("No lower bid was accepted"))
+        else:
+            self.stdout.write(self.style.ERROR("A lower bid was accepted after a higher one"))
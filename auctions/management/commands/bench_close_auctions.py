@@ -0,0 +1,59 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from auctions.benchmarks import Timer, scratch_database
+from auctions.models import AuctionListing, Bid, User
+from auctions.scheduler import BATCH_SIZE, AuctionScheduler
+
+
+class Command(BaseCommand):
+    help = "Benchmark closing a large number of ended auctions, runs on a scratch database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000, help="Number of ended auctions")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        with scratch_database():
+            self.stdout.write(f"Seeding {count} ended auctions...")
+            self.seed(count)
+
+            scheduler = AuctionScheduler(batch_size=options["batch_size"])
+            with Timer() as load_timer:
+                scheduler.refresh()
+            with Timer() as close_timer:
+                closed = scheduler.run_pending()
+            winners = AuctionListing.objects.filter(winner__isnull=False).count()
+
+        self.stdout.write(f"Queued {count} auctions in {load_timer.elapsed:.2f}s")
+        self.stdout.write(
+            f"Closed {closed} auctions ({winners} with a winner) in {close_timer.elapsed:.2f}s, "
+            f"{close_timer.rate(closed):.0f} auctions/s"
+        )
+
+    def seed(self, count):
+        seller = User.objects.create_user("seller")
+        bidders = User.objects.bulk_create([User(username=f"bidder{i}") for i in range(100)])
+        ended = timezone.now() - timedelta(hours=1)
+        AuctionListing.objects.bulk_create((
+            AuctionListing(
+                title=f"Auction {i}", description="Benchmark", listed_by=seller,
+                end_datetime=ended - timedelta(seconds=i), initial_price=Decimal("1.00"),
+                current_price=Decimal("1.00"), image_url="https://example.com/image.png"
+            ) for i in range(count)
+        ), batch_size=1000)
+
+        # Every other auction gets a bid
+        listing_ids = AuctionListing.objects.values_list("id", flat=True)[::2]
+        Bid.objects.bulk_create((
+            Bid(auction_id=listing_id, user=bidders[i % len(bidders)], amount=Decimal("2.00"))
+            for i, listing_id in enumerate(listing_ids)
+        ), batch_size=1000)
+        AuctionListing.objects.update(
+            highest_bid=Subquery(Bid.objects.filter(auction=OuterRef("pk")).values("id")[:1])
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarks import scratch_database
+from auctions.benchmarks.feeds import run_feeds
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Trending feed read from memory, the cache and the index against a count of the last hour's bids, on a scratch database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=20000)
+        parser.add_argument("--bids", type=int, default=200000, help="Placed bid events over the last day")
+        parser.add_argument("--updates", type=int, default=5000, help="Bids scored incrementally")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            results = run_feeds(User.objects.create_user("seller"), options["listings"], options["bids"], options["updates"])
+        self.stdout.write(
+            f"{results['bids']} bids on {results['listings']} listings, rebuilt {results['scored']} scores "
+            f"in {results['rebuild_seconds']:.1f}s, {results['updates_per_second']:.0f} incremental updates/s"
+        )
+        for name in ("memory", "cache", "build", "brute_force"):
+            self.stdout.write(f"{name.replace('_', ' '):<12} p50 {results[name]['p50']:9.3f} ms p99 {results[name]['p99']:9.3f} ms")
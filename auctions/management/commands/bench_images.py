@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from auctions.benchmarks.images import run_images
+
+
+class Command(BaseCommand):
+    help = "Image pipeline throughput and serving latency on generated images, offline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--width", type=int, default=1200)
+        parser.add_argument("--height", type=int, default=900)
+
+    def handle(self, *args, **options):
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=["testserver"]):
+            results = run_images(options["images"], (options["width"], options["height"]), options["workers"])
+        if not results["resized"]:
+            self.stdout.write(self.style.WARNING("Pillow isn't installed, renditions are the original images"))
+        self.stdout.write(
+            f"Processed {results['images']} images: {results['processed_per_second']:.1f} images/s "
+            f"with {options['workers']} workers, {results['failed']} failed"
+        )
+        self.stdout.write(f"Serving a thumbnail: p50 {results['serve']['p50']:.2f}ms p99 {results['serve']['p99']:.2f}ms")
+        sizes = ", ".join(f"{name} {size / 1024:.0f} KiB" for name, size in results["rendition_bytes"].items())
+        self.stdout.write(f"Original {results['original_bytes'] / 1024:.0f} KiB, {sizes}")
@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import resource
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auctions.benchmarks import Timer, scratch_database
+from auctions.models import AuctionListing
+from auctions.transfer import Importer
+
+
+class Command(BaseCommand):
+    help = "Import a generated JSONL file with many bids and report rows/s and peak memory, on a scratch database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bids", type=int, default=1000000)
+        parser.add_argument("--auctions", type=int, default=1000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "auctions.jsonl")
+            self.generate(path, options)
+            self.stdout.write(f"Generated {os.path.getsize(path) / 2 ** 20:.1f} MiB of JSONL")
+
+            with scratch_database():
+                with Timer() as timer, open(path) as file:
+                    counts = Importer(batch_size=options["batch_size"]).run(json.loads(line) for line in file)
+                bid_count = sum(AuctionListing.objects.values_list("bid_count", flat=True))
+
+        rows = sum(counts.values())
+        self.stdout.write(f"Imported {rows} rows in {timer.elapsed:.1f}s, {timer.rate(rows):.0f} rows/s")
+        # ru_maxrss is in KiB on Linux
+        self.stdout.write(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+        self.stdout.write(f"Bid stats total: {bid_count} bids")
+
+    def generate(self, path, options):
+        end = (timezone.now() + timedelta(days=7)).isoformat()
+        with open(path, "w") as file:
+            for i in range(1, options["auctions"] + 1):
+                file.write(json.dumps({
+                    "type": "auction", "id": i, "title": f"Auction {i}", "description": "Generated",
+                    "listed_by": f"user{i % options['users']}", "end_datetime": end,
+                    "initial_price": "1.00", "image_url": "https://example.com/image.png",
+                    "category": f"Category {i % 20}",
+                }) + "\n")
+            for i in range(options["bids"]):
+                file.write(json.dumps({
+                    "type": "bid", "auction": i % options["auctions"] + 1,
+                    "user": f"user{i % options['users']}", "amount": f"{2 + i / 100:.2f}",
+                }) + "\n")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarks import Timer, scratch_database
+from auctions.benchmarks.ledger import run_ledger
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Auction state rebuild time from the full ledger and from a snapshot plus tail, on a scratch database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bids", type=int, default=100000, help="Bids on the auction before the snapshot")
+        parser.add_argument("--tail", type=int, default=500, help="Bids after the snapshot")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--users", type=int, default=50)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            owner = User.objects.create_user("seller")
+            users = [User.objects.create_user(f"bidder{number}") for number in range(options["users"])]
+            with Timer() as timer:
+                results = run_ledger(owner, users, options["bids"], options["tail"], options["repeat"])
+        self.stdout.write(f"Recorded {results['events']} events in {timer.elapsed:.1f}s")
+        self.stdout.write(f"First snapshot (full fold): {results['first_snapshot_seconds'] * 1000:.0f} ms")
+        for name in ("replay", "snapshot_and_tail"):
+            timing = results[name]
+            self.stdout.write(f"{name:<18} p50 {timing['p50']:>9.2f} ms  p99 {timing['p99']:>9.2f} ms")
+        if not results["same_state"]:
+            self.stdout.write(self.style.ERROR("The snapshot state differs from the replayed state"))
@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from auctions.benchmarks import scratch_database
+from auctions.benchmarks.live import run_live
+from auctions.models import AuctionListing, User
+
+
+class Command(BaseCommand):
+    help = "Hold many live event streams open in one process and measure the bid event delivery latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=1000, help="Anonymous listing streams")
+        parser.add_argument("--watchers", type=int, default=100, help="Watchlist streams of logged in watchers")
+        parser.add_argument("--bids", type=int, default=50)
+        parser.add_argument("--interval", type=float, default=0.01, help="Seconds between bids")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seller = User.objects.create_user("seller")
+            bidder = User.objects.create_user("bidder")
+            listing = AuctionListing.objects.create(
+                title="Benchmark", description="Benchmark", listed_by=seller,
+                initial_price=Decimal("1.00"), image_url="https://example.com/image.png"
+            )
+            watchers = [User.objects.create_user(f"watcher{i}") for i in range(options["watchers"])]
+            listing.watchers.add(*watchers)
+
+            with override_settings(ROOT_URLCONF="auctions.async_urls", ALLOWED_HOSTS=["testserver"]):
+                results = run_live(
+                    listing, bidder, watchers, options["subscribers"], options["bids"], options["interval"]
+                )
+
+        self.stdout.write(
+            f"{results['connections']} connections opened in {results['connect_time']:.2f}s, "
+            f"~{results['memory_per_connection'] / 1024:.1f} KiB each"
+        )
+        self.stdout.write(
+            f"{results['events']} bids, {results['delivered']}/{results['expected']} events delivered "
+            f"in {results['elapsed']:.2f}s"
+        )
+        self.stdout.write(
+            f"Delivery latency ms: p50 {results['p50']:.2f} p95 {results['p95']:.2f} "
+            f"p99 {results['p99']:.2f} max {results['max']:.2f}"
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarks import scratch_database
+from auctions.benchmarks.notifications import run_fanout
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Notification fan-out to the watchers of one listing, on a scratch database with the locmem email backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watchers", type=int, default=100000)
+        parser.add_argument("--bids", type=int, default=20, help="Bids placed within one window")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            results = run_fanout(User.objects.create_user("seller"), options["watchers"], options["bids"])
+        self.stdout.write(f"Created {results['watchers']} watchers in {results['setup_seconds']:.1f}s")
+        self.stdout.write(
+            f"Placed {options['bids']} bids, {results['bid_ms']:.2f} ms each with the outbox write, "
+            f"queue depth {results['queue_depth']}"
+        )
+        self.stdout.write(
+            f"Fan-out of {results['events']} events: {results['emails']} emails in {results['fanout_seconds']:.2f}s "
+            f"({results['emails_per_second']:.0f}/s), one email per bid would have been {results['emails_without_batching']}"
+        )
+        self.stdout.write(
+            f"  {results['backend_seconds']:.2f}s of it in the email backend rendering the messages, "
+            f"{results['fanout_seconds'] - results['backend_seconds']:.2f}s collecting and building them"
+        )
+        if results["pending_after"]:
+            self.stdout.write(self.style.ERROR(f"{results['pending_after']} events are still pending"))
@@ -0,0 +1,68 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import reset_queries
+from django.utils import timezone
+
+from auctions.benchmarks import Timer, scratch_database
+from auctions.models import AuctionListing, User
+from auctions.pagination import SORTS, encode_cursor, paginate
+
+
+class Command(BaseCommand):
+    help = "Compare keyset and OFFSET pagination latency across deep pages, runs on a scratch database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=1000000, help="Number of seeded listings")
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per page")
+
+    def handle(self, *args, **options):
+        count, page_size = options["count"], options["page_size"]
+        with scratch_database():
+            self.stdout.write(f"Seeding {count} listings...")
+            self.seed(count)
+            listings = AuctionListing.objects.filter(end_datetime__gt=timezone.now())
+
+            pages = [1, 10, 100, 1000, 10000, count // page_size // 2, count // page_size - 1]
+            pages = sorted({page for page in pages if 0 < page < count // page_size})
+            for sort in SORTS:
+                self.stdout.write(f"\nSort: {sort}")
+                self.stdout.write(f"{'page':>10} {'keyset ms':>12} {'offset ms':>12}")
+                name, descending = SORTS[sort]
+                order = "-" if descending else ""
+                ordered = listings.order_by(f"{order}{name}", f"{order}pk")
+                for page in pages:
+                    # Cursor of the last row of the previous page (not timed)
+                    cursor = None
+                    if page > 1:
+                        cursor = encode_cursor(ordered[(page - 1) * page_size - 1], sort)
+                    keyset = self.time(lambda: paginate(listings, sort, cursor, page_size), options["repeat"])
+                    offset_rows = ordered[(page - 1) * page_size:page * page_size]
+                    offset = self.time(lambda: list(offset_rows.all()), options["repeat"])
+                    self.stdout.write(f"{page:>10} {keyset:>12.2f} {offset:>12.2f}")
+
+    def time(self, function, repeat):
+        timings = []
+        for _ in range(repeat):
+            with Timer() as timer:
+                function()
+            timings.append(timer.elapsed * 1000)
+        reset_queries()
+        # Median run
+        return sorted(timings)[len(timings) // 2]
+
+    def seed(self, count):
+        seller = User.objects.create_user("seller")
+        now = timezone.now()
+        batch_size = 5000
+        for start in range(0, count, batch_size):
+            AuctionListing.objects.bulk_create([
+                AuctionListing(
+                    title=f"Auction {i}", description="Benchmark", listed_by=seller,
+                    end_datetime=now + timedelta(days=1, seconds=(i * 7919) % count),
+                    initial_price=Decimal(i % 1000) + 1, current_price=Decimal(i % 1000) + 1,
+                    image_url="https://example.com/image.png"
+                ) for i in range(start, min(start + batch_size, count))
+            ])
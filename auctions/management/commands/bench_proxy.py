@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarks import scratch_database
+from auctions.benchmarks.proxy import run_database, run_engine
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Proxy bidding resolution throughput with thousands of competing maximums"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--proxies", type=int, default=5000, help="Competing maximums on the auction")
+        parser.add_argument("--calls", type=int, default=200, help="set_max_bid() calls timed on the database")
+
+    def handle(self, *args, **options):
+        engine = run_engine(options["proxies"])
+        self.stdout.write(
+            f"In memory: {engine['arrivals_per_second']:.0f} arrivals/s resolved one by one, "
+            f"{engine['rebuild_ms']:.2f} ms to resolve all {engine['proxies']} from scratch"
+        )
+        self.stdout.write(
+            f"Final price {engine['final_price']}, bidding one increment at a time would have written "
+            f"{engine['increment_bids']} bids"
+        )
+        with scratch_database():
+            results = run_database(User.objects.create_user("seller"), options["proxies"], options["calls"])
+        timing = results["resolve_all"]
+        self.stdout.write(
+            f"Resolving all {options['proxies']} maximums from the database: p50 {timing['p50']:.2f} ms p99 {timing['p99']:.2f} ms"
+        )
+        timing = results["set_max_bid"]
+        statuses = ", ".join(f"{status} {count}" for status, count in sorted(results["statuses"].items()))
+        self.stdout.write(
+            f"Bidding war, set_max_bid: p50 {timing['p50']:.2f} ms p99 {timing['p99']:.2f} ms "
+            f"({statuses}), {results['bids']} bids written"
+        )
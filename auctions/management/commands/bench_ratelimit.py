@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarks.ratelimit import run_decisions, run_flood
+from auctions.ratelimit import BID, COMMENT, WATCH, WRITE_CAPACITY
+
+
+class Command(BaseCommand):
+    help = "Rate limiter decisions per second, and what it sheds when a listing is flooded"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--decisions", type=int, default=200000)
+        parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+        parser.add_argument("--bot-rate", type=int, default=500, help="Comments and watch toggles per second of the flood")
+
+    def handle(self, *args, **options):
+        for backend in ("local", "cache"):
+            for threads in options["threads"]:
+                result = run_decisions(threads, options["decisions"], backend)
+                self.stdout.write(f"{backend:<6} {threads:>3} threads: {result['per_second']:>10.0f} decisions/s")
+
+        self.stdout.write(f"\nFlood of {options['bot_rate']} requests/s, shared capacity {WRITE_CAPACITY[0]}/s:")
+        for reserve in (0.5, 0.0):
+            results = run_flood(bot_rate=options["bot_rate"], reserve=reserve)
+            lanes = ", ".join(
+                f"{lane} {results[lane]['accepted']} in / {results[lane]['shed']} shed ({results[lane]['shed_ratio']:.0%})"
+                for lane in (BID, COMMENT, WATCH)
+            )
+            self.stdout.write(f"  reserve {reserve:.0%}: {lanes}, {results['writes_per_second']:.1f} writes/s")
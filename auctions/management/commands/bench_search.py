@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from auctions import search
+from auctions.benchmarks import Timer, scratch_database
+from auctions.benchmarks.search import insert_listings, time_queries
+from auctions.models import AuctionListing, User
+
+
+class Command(BaseCommand):
+    help = "Index build time and search latency on a scratch database of generated listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=100000)
+        parser.add_argument("--words", type=int, default=20000, help="Vocabulary size")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs of each query")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            user = User.objects.create_user("seller")
+            with Timer() as timer:
+                vocab, categories = insert_listings(user, options["listings"], options["words"], random_seed=options["seed"])
+            self.stdout.write(
+                f"Inserted and indexed {options['listings']} listings in {timer.elapsed:.1f}s "
+                f"({timer.rate(options['listings']):.0f} listings/s)"
+            )
+            with Timer() as timer:
+                search.rebuild_index()
+            self.stdout.write(f"Full index rebuild: {timer.elapsed:.1f}s")
+
+            common, medium, rare = vocab[0], vocab[100], vocab[len(vocab) // 2]
+            queries = [
+                ("common", f"{common} "),
+                ("medium", f"{medium} "),
+                ("rare", f"{rare} "),
+                ("two words", f"{common} {medium} "),
+                ("prefix", medium[:3]),
+            ]
+            for title, filters in (
+                ("active only", {}),
+                ("all listings", {"active_only": False}),
+                ("one category", {"category": categories[0].id}),
+            ):
+                self.stdout.write(f"\n{title}:")
+                self.write_timings(time_queries(queries, options["repeat"], **filters))
+
+            # What the search would cost without the index, a word no listing has scans the whole table
+            begin = time.perf_counter()
+            len(AuctionListing.objects.filter(description__icontains="nomatch")[:21])
+            self.stdout.write(f"\nicontains scan without a match: {(time.perf_counter() - begin) * 1000:.1f} ms")
+            if connection.vendor != "sqlite":
+                self.stdout.write("(not SQLite, every query above used the icontains fallback)")
+
+    def write_timings(self, timings):
+        for name, timing in timings.items():
+            self.stdout.write(
+                f"  {name:<10} p50 {timing['p50']:>8.2f} ms  p95 {timing['p95']:>8.2f} ms  {timing['results']} results"
+            )
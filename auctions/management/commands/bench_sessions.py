@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from auctions.benchmarks import scratch_database
+from auctions.benchmarks.seed import seed
+from auctions.benchmarks.sessions import compare_sessions
+
+
+class Command(BaseCommand):
+    help = "Database round-trips per request with database, cached and signed cookie sessions, on a scratch database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--listings", type=int, default=200, help="Seeded listings")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed(users=50, categories=5, listings=options["listings"], bids=options["listings"] * 5, comments=options["listings"])
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=["localhost"]):
+                for save_every_request in (False, True):
+                    results = compare_sessions(options["requests"], save_every_request)
+                    title = "session saved on every request" if save_every_request else "session only read"
+                    self.stdout.write(f"\n{title}:")
+                    self.stdout.write(f"  {'setup':<18} {'session':>8} {'user':>6} {'other':>6} {'p50 ms':>8}")
+                    for name, result in results.items():
+                        self.stdout.write(
+                            f"  {name:<18} {result['session']:>8.2f} {result['user']:>6.2f} "
+                            f"{result['other']:>6.2f} {result['p50']:>8.2f}"
+                        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from auctions.benchmarks import Timer
+from auctions.scheduler import BATCH_SIZE, AuctionScheduler
+
+
+class Command(BaseCommand):
+    help = "Close ended auctions and set their winners, once or as a long running worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--worker", action="store_true", help="Keep running and close auctions as they end")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--poll-interval", type=float, default=30, help="Seconds between checks for new auctions")
+
+    def handle(self, *args, **options):
+        scheduler = AuctionScheduler(batch_size=options["batch_size"])
+
+        if options["worker"]:
+            self.stdout.write("Auction scheduler running, press CTRL-C to stop")
+            try:
+                scheduler.run_forever(
+                    poll_interval=options["poll_interval"],
+                    on_closed=lambda closed: self.stdout.write(f"Closed {closed} auction(s)")
+                )
+            except KeyboardInterrupt:
+                return
+
+        with Timer() as timer:
+            scheduler.refresh()
+            closed = scheduler.run_pending()
+        self.stdout.write(self.style.SUCCESS(f"Closed {closed} auction(s) in {timer.elapsed:.2f}s"))
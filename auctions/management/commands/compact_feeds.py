@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from auctions import feeds
+
+
+class Command(BaseCommand):
+    help = "Drop the trend scores of closed and cold listings, or compute them again from the ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="Replace every score with one computed from the ledger")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            count = feeds.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt the trend scores of {count} listing(s)"))
+            return
+        deleted = feeds.compact()
+        self.stdout.write(self.style.SUCCESS(f"Dropped {deleted} trend score(s)"))
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.transfer import BATCH_SIZE, TYPES, export_records, progress, write_csv, write_jsonl
+
+
+class Command(BaseCommand):
+    help = "Stream auctions, bids and comments to a JSONL or CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output file, - for stdout")
+        parser.add_argument("--format", choices=("jsonl", "csv"), help="Defaults to the file extension, or jsonl")
+        parser.add_argument(
+            "--type", choices=TYPES, action="append", dest="types",
+            help="What to export, can be repeated (CSV takes exactly one)"
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows fetched per query")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or ("csv" if path.endswith(".csv") else "jsonl")
+        types = [TYPES[name] for name in options["types"] or TYPES]
+        if file_format == "csv" and len(types) != 1:
+            raise CommandError("CSV export needs exactly one --type")
+
+        records = progress(
+            export_records(types, chunk_size=options["batch_size"]),
+            lambda count, rate: self.stderr.write(f"Exported {count} rows ({rate:.0f} rows/s)")
+        )
+        file = sys.stdout if path == "-" else open(path, "w", newline="")
+        try:
+            if file_format == "csv":
+                write_csv(records, file, types[0])
+            else:
+                write_jsonl(records, file)
+        finally:
+            if file is not sys.stdout:
+                file.close()
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.transfer import BATCH_SIZE, TYPES, Importer, progress, read_csv, read_jsonl
+
+
+class Command(BaseCommand):
+    help = "Stream auctions, bids and comments from a JSONL or CSV file into the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, - for stdin")
+        parser.add_argument("--format", choices=("jsonl", "csv"), help="Defaults to the file extension, or jsonl")
+        parser.add_argument("--type", choices=TYPES, help="What the CSV file holds")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per bulk insert")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or ("csv" if path.endswith(".csv") else "jsonl")
+        if file_format == "csv" and not options["type"]:
+            raise CommandError("CSV import needs --type")
+
+        file = sys.stdin if path == "-" else open(path, newline="")
+        try:
+            records = read_csv(file, TYPES[options["type"]]) if file_format == "csv" else read_jsonl(file)
+            records = progress(
+                records,
+                lambda count, rate: self.stderr.write(f"Read {count} rows ({rate:.0f} rows/s)")
+            )
+            counts = Importer(batch_size=options["batch_size"]).run(records)
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        summary = ", ".join(f"{counts[record_type]} {name}" for name, record_type in TYPES.items())
+        self.stdout.write(self.style.SUCCESS(f"Imported {summary}"))
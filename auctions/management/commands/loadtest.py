@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from auctions.benchmarks import Timer, scratch_database
+from auctions.benchmarks.load import MIX, parse_mix, run_load
+from auctions.benchmarks.report import build_report, format_report, load_report, save_report
+from auctions.benchmarks.seed import SCALE, seed
+
+
+class Command(BaseCommand):
+    help = "Seed a scratch database and replay a weighted mix of requests from concurrent workers"
+
+    def add_arguments(self, parser):
+        for name, default in SCALE.items():
+            parser.add_argument(f"--{name}", type=int, default=default, help=f"Seeded {name} (default {default})")
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=200, help="Requests per worker")
+        parser.add_argument(
+            "--mix", default=",".join(f"{name}={weight}" for name, weight in MIX.items()),
+            help="Scenario weights, e.g. index=30,listing=40,bid=10"
+        )
+        parser.add_argument("--anonymous", type=float, default=0.5, help="Share of anonymous workers")
+        parser.add_argument("--seed", type=int, default=None, help="Random seed")
+        parser.add_argument("--output", help="Save the report as JSON")
+        parser.add_argument("--compare", help="JSON report of an earlier run to compare with")
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options["mix"])
+        except ValueError as error:
+            raise CommandError(error)
+        baseline = load_report(options["compare"]) if options["compare"] else None
+
+        with scratch_database():
+            with Timer() as timer:
+                counts = seed(**{name: options[name] for name in SCALE}, random_seed=options["seed"])
+            self.stdout.write(
+                f"Seeded {', '.join(f'{count} {name}s' for name, count in counts.items())} in {timer.elapsed:.1f}s"
+            )
+            # Run like production: no query log, and the test client's host allowed
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=["localhost"]):
+                samples, elapsed = run_load(
+                    options["workers"], options["requests"], mix, options["seed"], options["anonymous"]
+                )
+
+        report_options = {name: options[name] for name in (*SCALE, "workers", "requests", "anonymous", "seed")}
+        report_options["mix"] = mix
+        report = build_report(samples, elapsed, report_options)
+        self.stdout.write(format_report(report, baseline))
+        if options["output"]:
+            save_report(report, options["output"])
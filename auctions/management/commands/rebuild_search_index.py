@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Re-index every listing for search and merge the index segments"
+
+    def handle(self, *args, **options):
+        begin = time.perf_counter()
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search index in {time.perf_counter() - begin:.1f}s"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from auctions.catalog import refresh_categories
+from auctions.models import Category, category_stats_expressions
+
+
+class Command(BaseCommand):
+    help = "Find categories whose catalog stats drifted from the listings table and fix them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report the drifted categories")
+
+    def handle(self, *args, **options):
+        real_stats = {f"real_{name}": expression for name, expression in category_stats_expressions().items()}
+
+        # Stored and real stats side by side in a single query, there are few categories
+        rows = Category.objects.annotate(**real_stats).values("pk", "name", *Category.STATS_FIELDS, *real_stats)
+        drifted = [
+            (row["pk"], row["name"]) for row in rows
+            if any(row[name] != row[f"real_{name}"] for name in Category.STATS_FIELDS)
+        ]
+
+        for category_id, name in drifted:
+            self.stdout.write(f"Category {name} ({category_id}) has drifted stats")
+        if options["dry_run"]:
+            self.stdout.write(f"{len(drifted)} category(ies) need repairing")
+        else:
+            if drifted:
+                refresh_categories([category_id for category_id, _ in drifted])
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drifted)} category(ies)"))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from auctions.fragments import bump_listing_versions
+from auctions.models import AuctionListing, bid_stats_expressions
+
+# Listings repaired per UPDATE
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Find listings whose stored bid stats drifted from the bids table and fix them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report the drifted listings")
+
+    def handle(self, *args, **options):
+        real_stats = {f"real_{name}": expression for name, expression in bid_stats_expressions().items()}
+
+        # Compare the stored stats against the real ones in a single query
+        drifted = AuctionListing.objects.annotate(**real_stats).filter(
+            ~Q(bid_count=F("real_bid_count"))
+            | ~Q(current_price=F("real_current_price"))
+            | ~Q(highest_bid=F("real_highest_bid"))
+            | Q(highest_bid__isnull=True, real_highest_bid__isnull=False)
+            | Q(highest_bid__isnull=False, real_highest_bid__isnull=True)
+        ).values_list("pk", flat=True)
+
+        drifted = list(drifted)
+        for listing_id in drifted:
+            self.stdout.write(f"Listing {listing_id} has drifted bid stats")
+        if not options["dry_run"]:
+            for start in range(0, len(drifted), BATCH_SIZE):
+                batch = drifted[start:start + BATCH_SIZE]
+                AuctionListing.refresh_bid_stats_of(batch)
+                bump_listing_versions(batch)
+        repaired = len(drifted)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{repaired} listing(s) need repairing")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} listing(s)"))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auctions import notifications
+
+
+class Command(BaseCommand):
+    help = "Send the pending watcher notifications, once or as a long running worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--worker", action="store_true", help="Keep running and send every window as it ends")
+        parser.add_argument("--window", type=int, default=notifications.WINDOW, help="Seconds a user's updates are merged over")
+        parser.add_argument("--stats", action="store_true", help="Only print the queue metrics")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.write_metrics()
+            return
+        if not options["worker"]:
+            self.send(options["window"])
+            return
+        self.stdout.write("Notification worker running, press CTRL-C to stop")
+        try:
+            while True:
+                if self.send(options["window"]):
+                    self.write_metrics()
+                notifications.prune()
+                # Wake up just after the current window ends
+                now = timezone.now()
+                next_window = notifications.window_start(now, options["window"]).timestamp() + options["window"]
+                time.sleep(max(next_window - now.timestamp(), 0) + 0.1)
+        except KeyboardInterrupt:
+            return
+
+    def send(self, window):
+        result = notifications.process_outbox(window=window)
+        if result["events"]:
+            self.stdout.write(
+                f"Sent {result['messages']} email(s) for {result['events']} event(s), "
+                f"{result['skipped']} user(s) without an email address"
+            )
+        return result["events"]
+
+    def write_metrics(self):
+        metrics = notifications.outbox_metrics()
+        oldest = "-" if metrics["oldest_pending"] is None else f"{metrics['oldest_pending']:.1f}s"
+        lag = "-" if metrics["lag_p50"] is None else f"p50 {metrics['lag_p50']:.1f}s p99 {metrics['lag_p99']:.1f}s"
+        self.stdout.write(f"Queue depth {metrics['depth']}, oldest pending {oldest}, delivery lag {lag}")
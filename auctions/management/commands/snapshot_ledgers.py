@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from auctions import ledger
+
+
+class Command(BaseCommand):
+    help = "Save a ledger snapshot of every auction with many events since its latest one"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-events", type=int, default=ledger.SNAPSHOT_EVERY,
+            help="Events after the latest snapshot that make a new one due"
+        )
+
+    def handle(self, *args, **options):
+        due = ledger.snapshots_due(options["min_events"])
+        for listing_id in due:
+            ledger.auction_state(listing_id, snapshot_every=0)
+        self.stdout.write(self.style.SUCCESS(f"Saved snapshots of {len(due)} auction(s)"))
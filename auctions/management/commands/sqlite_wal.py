@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from auctions.db import set_journal_mode
+
+
+class Command(BaseCommand):
+    help = "Switch an SQLite database to WAL, it stays in that mode"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="Database alias")
+        parser.add_argument("--off", action="store_true", help="Switch back to a rollback journal")
+
+    def handle(self, *args, **options):
+        try:
+            mode = set_journal_mode(connections[options["database"]], wal=not options["off"])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(f"Journal mode of {options['database']}: {mode}"))
@@ -0,0 +1,47 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Fill the new bid stats columns from the existing bids
+def backfill_bid_stats(apps, schema_editor):
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+    Bid = apps.get_model("auctions", "Bid")
+    for listing in AuctionListing.objects.all().iterator():
+        bids = Bid.objects.filter(auction=listing)
+        highest_bid = bids.order_by("-amount", "id").first()
+        AuctionListing.objects.filter(pk=listing.pk).update(
+            current_price=highest_bid.amount if highest_bid else listing.initial_price,
+            highest_bid=highest_bid,
+            bid_count=bids.count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='current_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='highest_bid',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='auctions.bid'),
+        ),
+        migrations.RunPython(backfill_bid_stats, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='auctionlisting',
+            name='current_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10),
+        ),
+    ]
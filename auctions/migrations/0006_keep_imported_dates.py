@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0005_listing_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auctionlisting',
+            name='datetime_listed',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='datetime_commented',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
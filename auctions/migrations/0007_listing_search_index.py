@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# SQLite FTS5 index over the listing titles and descriptions, the listings table holds the text
+# (external content) and the triggers keep the index in step with every insert, edit and delete
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE auctions_listing_fts USING fts5(
+        title, description,
+        content='auctions_auctionlisting', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER auctions_listing_fts_insert AFTER INSERT ON auctions_auctionlisting BEGIN
+        INSERT INTO auctions_listing_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER auctions_listing_fts_delete AFTER DELETE ON auctions_auctionlisting BEGIN
+        INSERT INTO auctions_listing_fts(auctions_listing_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER auctions_listing_fts_update AFTER UPDATE OF title, description ON auctions_auctionlisting
+    WHEN old.title IS NOT new.title OR old.description IS NOT new.description BEGIN
+        INSERT INTO auctions_listing_fts(auctions_listing_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO auctions_listing_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    # Index the listings that already exist
+    "INSERT INTO auctions_listing_fts(auctions_listing_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_insert",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_delete",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_update",
+    "DROP TABLE IF EXISTS auctions_listing_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # Other databases search with the LIKE fallback of auctions/search.py
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0006_keep_imported_dates'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
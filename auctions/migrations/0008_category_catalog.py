@@ -0,0 +1,70 @@
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+from django.utils.text import slugify
+
+
+# Give every category a unique slug and fill the catalog stats from the open listings
+def backfill_catalog(apps, schema_editor):
+    Category = apps.get_model("auctions", "Category")
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+    stats = {
+        row["category"]: row
+        for row in AuctionListing.objects.filter(category__isnull=False, closed_at__isnull=True)
+        .values("category").annotate(count=Count("id"), low=Min("initial_price"), high=Max("initial_price"))
+        .order_by()
+    }
+    taken = set()
+    for category in Category.objects.order_by("id").iterator():
+        base = slugify(category.name)[:240] or "category"
+        slug, number = base, 1
+        while slug in taken:
+            number += 1
+            slug = f"{base}-{number}"
+        taken.add(slug)
+        row = stats.get(category.id, {})
+        Category.objects.filter(pk=category.pk).update(
+            slug=slug,
+            active_count=row.get("count", 0),
+            min_price=row.get("low"),
+            max_price=row.get("high"),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0007_listing_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='category',
+            options={'verbose_name_plural': 'categories'},
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='active_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_catalog, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=255, unique=True),
+        ),
+    ]
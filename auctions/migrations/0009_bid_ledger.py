@@ -0,0 +1,73 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+BATCH_SIZE = 2000
+
+
+# Existing bids become placed events in id order, closed auctions get their closing events after them
+def backfill_ledger(apps, schema_editor):
+    Bid = apps.get_model("auctions", "Bid")
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+    LedgerEvent = apps.get_model("auctions", "LedgerEvent")
+    events = []
+
+    def add(**fields):
+        events.append(LedgerEvent(**fields))
+        if len(events) >= BATCH_SIZE:
+            LedgerEvent.objects.bulk_create(events)
+            events.clear()
+
+    bids = Bid.objects.order_by("id").values_list("id", "auction_id", "user_id", "amount")
+    for bid_id, auction_id, user_id, amount in bids.iterator(chunk_size=BATCH_SIZE):
+        add(auction_id=auction_id, kind="placed", bid_id=bid_id, user_id=user_id, amount=amount)
+    closed = AuctionListing.objects.filter(closed_at__isnull=False).order_by("closed_at", "id")
+    for auction_id, closed_at, winner_id in closed.values_list("id", "closed_at", "winner_id").iterator(chunk_size=BATCH_SIZE):
+        add(auction_id=auction_id, kind="closed", recorded_at=closed_at)
+        if winner_id is not None:
+            add(auction_id=auction_id, kind="winner_set", user_id=winner_id, recorded_at=closed_at)
+    LedgerEvent.objects.bulk_create(events)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0008_category_catalog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_event_id', models.IntegerField()),
+                ('state', models.JSONField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('auction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_snapshots', to='auctions.auctionlisting')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('placed', 'Bid placed'), ('retracted', 'Bid retracted'), ('closed', 'Auction closed'), ('winner_set', 'Winner set')], max_length=16)),
+                ('bid_id', models.IntegerField(blank=True, null=True)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('recorded_at', models.DateTimeField(blank=True, null=True)),
+                ('auction', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger', to='auctions.auctionlisting')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ledgersnapshot',
+            constraint=models.UniqueConstraint(fields=('auction', 'last_event_id'), name='ledger_snapshot_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerevent',
+            index=models.Index(fields=['auction', 'id'], name='ledger_auction_idx'),
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+from importlib import import_module
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+search_index = import_module("auctions.migrations.0007_listing_search_index")
+
+# Adding a NOT NULL column makes SQLite rebuild the listings table, which drops the triggers of the
+# search index (0007), they're created again after it (and after removing the column when reversed)
+SEARCH_TRIGGERS = [
+    *(statement for statement in search_index.DROP_SQL if "TRIGGER" in statement),
+    *(statement for statement in search_index.CREATE_SQL if "CREATE TRIGGER" in statement),
+]
+
+
+# Count the watchers of the existing listings, the rollups are built by backfill_analytics
+def backfill_watcher_counts(apps, schema_editor):
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+    Watch = AuctionListing.watchers.through
+    watchers = Watch.objects.filter(auctionlisting=OuterRef("pk")).order_by().values("auctionlisting").annotate(count=Count("id")).values("count")
+    AuctionListing.objects.update(watcher_count=Coalesce(Subquery(watchers, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0011_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, search_index.run(SEARCH_TRIGGERS)),
+        migrations.CreateModel(
+            name='BidRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('bids', models.PositiveIntegerField(default=0)),
+                ('volume', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('closed', models.PositiveIntegerField(default=0)),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='watcher_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(search_index.run(SEARCH_TRIGGERS), migrations.RunPython.noop),
+        migrations.RunPython(backfill_watcher_counts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='auctionlisting',
+            index=models.Index(fields=['-watcher_count'], name='listing_watchers_idx'),
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='category',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='auctions.category'),
+        ),
+        migrations.AddField(
+            model_name='bidrollup',
+            name='category',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='auctions.category'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('hour', 'category'), name='sales_rollup_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('hour',), name='sales_rollup_uncategorized_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='bidrollup',
+            constraint=models.UniqueConstraint(fields=('hour', 'category'), name='bid_rollup_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='bidrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('hour',), name='bid_rollup_uncategorized_unique'),
+        ),
+    ]
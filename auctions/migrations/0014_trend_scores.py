@@ -0,0 +1,24 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0013_auction_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendScore',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='auctions.auctionlisting')),
+                ('score', models.FloatField()),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score'], name='trend_score_idx')],
+            },
+        ),
+    ]
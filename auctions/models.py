@@ -1,5 +1,9 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, IntegerField, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.text import slugify
 from datetime import timedelta, datetime
 import pytz
 
@@ -15,7 +19,8 @@ class AuctionListing(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     listed_by = models.ForeignKey("User", on_delete=models.CASCADE)
-    datetime_listed = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add so bulk imports can keep the original date
+    datetime_listed = models.DateTimeField(default=timezone.now, editable=False)
     # Auction end date is one week later by default 
     end_datetime = models.DateTimeField(default=get_default_end_datetime, blank=True, null=True)
     initial_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -23,40 +28,123 @@ class AuctionListing(models.Model):
     category = models.ForeignKey("Category", on_delete=models.SET_NULL, null=True, blank=True)
     watchers = models.ManyToManyField("User", related_name="watchlist", blank=True)
     winner = models.ForeignKey("User", on_delete=models.SET_NULL, null=True, blank=True, related_name="won_auctions")
+    # Set when the scheduler resolved the winner of the ended auction
+    closed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Bid stats kept in sync by the Bid signals in signals.py, so pages never have to query the bids
+    current_price = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
+    highest_bid = models.ForeignKey("Bid", on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name="+")
+    bid_count = models.PositiveIntegerField(default=0, editable=False)
+    # Kept up to date by analytics.py when watchers are added or removed
+    watcher_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Fields only written by record_bid() / refresh_bid_stats(), a normal save() must not overwrite them
+    BID_STATS_FIELDS = ("current_price", "highest_bid", "bid_count")
+    # Same for the watcher count (analytics.refresh_watcher_counts())
+    WATCH_STATS_FIELDS = ("watcher_count",)
+    # Fields the category catalog stats depend on (catalog.py)
+    CATALOG_FIELDS = ("category_id", "initial_price", "closed_at")
+
+    class Meta:
+        indexes = [
+            # Active listings (index, scheduler) and active listings of a category
+            models.Index(fields=["end_datetime"], name="listing_end_idx"),
+            models.Index(fields=["category", "end_datetime"], name="listing_category_end_idx"),
+            # Sort orders of the paginated listing feeds
+            models.Index(fields=["datetime_listed"], name="listing_listed_idx"),
+            models.Index(fields=["current_price"], name="listing_price_idx"),
+            # Most watched listings (analytics report)
+            models.Index(fields=["-watcher_count"], name="listing_watchers_idx"),
+        ]
 
     def __str__(self):
         return self.title
+
+    # Remember what the catalog counted this listing as, so a save can tell what changed
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_catalog_state()
+        return instance
+
+    def remember_catalog_state(self):
+        # False when loaded without them (.only()), the previous state is unknown then
+        if self.get_deferred_fields().intersection(self.CATALOG_FIELDS):
+            self._catalog_state = False
+        else:
+            self._catalog_state = self.catalog_state()
+
+    def catalog_state(self):
+        # (category, initial price) while the listing is counted as open, None once closed
+        if self.category_id is None or self.closed_at is not None:
+            return None
+        return (self.category_id, self.initial_price)
     
     # When looking at auction details check this function to show the winner if not active
     @property
     def is_active(self):
         return self.end_datetime > datetime.now(pytz.UTC)
     
-    @property
-    def current_price(self):
-        if self.current_highest_bid is None:
-            return self.initial_price
-        else:
-            return self.current_highest_bid.amount
-    
     @property
     def current_highest_bid(self):
-        return self.bids.order_by("-amount").first()
+        return self.highest_bid
+
+    # Called when a new bid is inserted, only takes the lead if it beats the stored price
+    def record_bid(self, bid):
+        listing = AuctionListing.objects.filter(pk=self.pk)
+        with transaction.atomic():
+            listing.update(bid_count=F("bid_count") + 1)
+            listing.filter(Q(highest_bid__isnull=True) | Q(current_price__lt=bid.amount)).update(
+                current_price=bid.amount,
+                highest_bid=bid
+            )
+
+    # Recalculate the stats from the bids table (after a bid is edited or deleted)
+    def refresh_bid_stats(self):
+        with transaction.atomic():
+            highest_bid = self.bids.order_by("-amount", "id").first()
+            AuctionListing.objects.filter(pk=self.pk).update(
+                current_price=highest_bid.amount if highest_bid else self.initial_price,
+                highest_bid=highest_bid,
+                bid_count=self.bids.count()
+            )
 
-    # If auction time ends save the highest bid user as winner
-    def determine_winner(self):
-        if not self.is_active:
-            highest_bid = self.current_highest_bid
-            if highest_bid:
-                self.winner = highest_bid.user
-                self.save()
+    # Same as refresh_bid_stats() for many listings at once, in a single UPDATE
+    @classmethod
+    def refresh_bid_stats_of(cls, listing_ids):
+        return cls.objects.filter(pk__in=listing_ids).update(**bid_stats_expressions())
 
-    # I can call this function manually after ending the auction to determine the winner 
     def save(self, *args, **kwargs):
+        if self.current_price is None:
+            self.current_price = self.initial_price
+        # Leave the bid stats alone when updating an existing listing
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.BID_STATS_FIELDS + self.WATCH_STATS_FIELDS
+            ]
+        # Winners are set by the closing scheduler (scheduler.py), not here
         super().save(*args, **kwargs)
-        #  Checking that the auction finished and there is no existing winner already
-        if not self.winner and not self.is_active:
-            self.determine_winner()
+
+
+# Bid stats of the listing in the outer query, computed from the bids table
+def bid_stats_expressions():
+    bids = Bid.objects.filter(auction=OuterRef("pk"))
+    highest_bids = bids.order_by("-amount", "id")
+    bid_count = bids.order_by().values("auction").annotate(count=Count("id")).values("count")
+    return {
+        "current_price": Coalesce(Subquery(highest_bids.values("amount")[:1]), F("initial_price")),
+        "highest_bid": Subquery(highest_bids.values("id")[:1]),
+        "bid_count": Coalesce(Subquery(bid_count, output_field=IntegerField()), 0),
+    }
+
+
+# Watcher count of the listing in the outer query, computed from the watchers table
+def watch_stats_expressions():
+    Watch = AuctionListing.watchers.through
+    watchers = Watch.objects.filter(auctionlisting=OuterRef("pk")).order_by().values("auctionlisting").annotate(count=Count("id"))
+    return {
+        "watcher_count": Coalesce(Subquery(watchers.values("count"), output_field=IntegerField()), 0),
+    }
 
 
 # User bids on auctions
@@ -65,17 +153,50 @@ class Bid(models.Model):
     auction = models.ForeignKey("AuctionListing", on_delete=models.CASCADE, related_name='bids')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Highest bid of an auction
+            models.Index(fields=["auction", "-amount"], name="bid_auction_amount_idx"),
+        ]
+
     def __str__(self):
         return f"Bid by {self.user.username} on {self.auction.title}"
 
 
+# Most a user will pay on an auction, the proxy engine (proxy.py) bids for them up to it
+class ProxyBid(models.Model):
+    user = models.ForeignKey("User", on_delete=models.CASCADE, related_name="proxy_bids")
+    auction = models.ForeignKey("AuctionListing", on_delete=models.CASCADE, related_name="proxy_bids")
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Set again when the maximum changes, of two equal maximums the earlier one wins
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["auction", "user"], name="proxy_bid_unique"),
+        ]
+        indexes = [
+            # Maximums of an auction still above its price
+            models.Index(fields=["auction", "max_amount"], name="proxy_auction_max_idx"),
+        ]
+
+    def __str__(self):
+        return f"Maximum bid of {self.max_amount} on auction {self.auction_id}"
+
+
 # User / Auction Comment
 class Comment(models.Model):
     commented_by = models.ForeignKey("User", on_delete=models.CASCADE, related_name='comments')
     auction = models.ForeignKey("AuctionListing", on_delete=models.CASCADE, related_name='comments')
-    datetime_commented = models.DateTimeField(auto_now_add=True)
+    datetime_commented = models.DateTimeField(default=timezone.now, editable=False)
     comment_text = models.TextField()
 
+    class Meta:
+        indexes = [
+            # Newest comments of an auction
+            models.Index(fields=["auction", "-datetime_commented"], name="comment_auction_date_idx"),
+        ]
+
     def __str__(self):
         return f"Comment by {self.commented_by.username} on {self.auction.title}"
 
@@ -83,7 +204,259 @@ class Comment(models.Model):
 # Auction Category
 class Category(models.Model):
     name = models.CharField(max_length=250)
+    slug = models.SlugField(max_length=255, unique=True, blank=True)
+    # Open listings of the category and the range of their starting prices, kept up to date by
+    # catalog.py when listings are created, closed, moved or deleted
+    active_count = models.PositiveIntegerField(default=0, editable=False)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+
+    STATS_FIELDS = ("active_count", "min_price", "max_price")
+
+    class Meta:
+        verbose_name_plural = "categories"
 
     def __str__(self):
         return self.name
-    
\ No newline at end of file
+
+    @staticmethod
+    def slug_base(name):
+        return slugify(name)[:240] or "category"
+
+    @classmethod
+    def unique_slug(cls, name, taken):
+        # slugify(name), or with -2, -3... when another category already has it
+        base = cls.slug_base(name)
+        slug, number = base, 1
+        while slug in taken:
+            number += 1
+            slug = f"{base}-{number}"
+        return slug
+
+    # Recalculate the stats of the categories from the listings table
+    @classmethod
+    def refresh_stats_of(cls, category_ids):
+        return cls.objects.filter(pk__in=category_ids).update(**category_stats_expressions())
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            taken = Category.objects.filter(slug__startswith=self.slug_base(self.name)).exclude(pk=self.pk)
+            taken = set(taken.values_list("slug", flat=True))
+            self.slug = self.unique_slug(self.name, taken)
+        # Leave the stats alone when updating an existing category
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STATS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+# Stats of the category in the outer query, computed from the open listings
+def category_stats_expressions():
+    listings = AuctionListing.objects.filter(category=OuterRef("pk"), closed_at__isnull=True).order_by().values("category")
+    return {
+        "active_count": Coalesce(Subquery(listings.annotate(count=Count("id")).values("count"), output_field=IntegerField()), 0),
+        "min_price": Subquery(listings.annotate(price=Min("initial_price")).values("price")),
+        "max_price": Subquery(listings.annotate(price=Max("initial_price")).values("price")),
+    }
+    
+
+# Append-only history of every auction (ledger.py), the id orders the events. It's kept when the
+# auction or the user is deleted, so the foreign keys have no database constraint.
+class LedgerEvent(models.Model):
+    PLACED = "placed"
+    RETRACTED = "retracted"
+    CLOSED = "closed"
+    WINNER_SET = "winner_set"
+    KINDS = [
+        (PLACED, "Bid placed"),
+        (RETRACTED, "Bid retracted"),
+        (CLOSED, "Auction closed"),
+        (WINNER_SET, "Winner set"),
+    ]
+
+    auction = models.ForeignKey("AuctionListing", on_delete=models.DO_NOTHING, db_constraint=False, related_name="ledger")
+    kind = models.CharField(max_length=16, choices=KINDS)
+    # The bid is referenced by id only, its events outlive it
+    bid_id = models.IntegerField(null=True, blank=True)
+    user = models.ForeignKey(
+        "User", on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="+"
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Never goes backwards, None for the bids recorded before the ledger existed
+    recorded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Events of an auction in order, and the tail after a snapshot
+            models.Index(fields=["auction", "id"], name="ledger_auction_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} on auction {self.auction_id}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger events can't be changed")
+        super().save(*args, **kwargs)
+
+
+# State of an auction folded from its ledger up to last_event_id (ledger.AuctionState)
+class LedgerSnapshot(models.Model):
+    auction = models.ForeignKey("AuctionListing", on_delete=models.CASCADE, related_name="ledger_snapshots")
+    last_event_id = models.IntegerField()
+    state = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["auction", "last_event_id"], name="ledger_snapshot_unique"),
+        ]
+
+    def __str__(self):
+        return f"Snapshot of auction {self.auction_id} at event {self.last_event_id}"
+
+
+# Change the watchers and bidders of a listing are told about, written in the transaction of the
+# change and sent by notifications.process_outbox()
+class OutboxEvent(models.Model):
+    BID = "bid"
+    UNLISTED = "unlisted"
+    ENDED = "ended"
+    KINDS = [
+        (BID, "New bid"),
+        (UNLISTED, "Unlisted by the seller"),
+        (ENDED, "Auction ended"),
+    ]
+
+    listing = models.ForeignKey("AuctionListing", on_delete=models.CASCADE, related_name="outbox_events")
+    kind = models.CharField(max_length=16, choices=KINDS)
+    # Who made the change (the bidder, the seller), isn't told about it
+    actor = models.ForeignKey("User", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Set by the worker sending it, so the others skip it until the claim times out
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The queue: events not sent yet, oldest first
+            models.Index(fields=["created_at"], condition=Q(processed_at__isnull=True), name="outbox_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} on auction {self.listing_id}"
+
+
+# Hourly rollups of the analytics report (analytics.py), one row per hour and category with
+# uncategorized listings under a NULL category. Kept when the category is deleted, like the ledger.
+class BidRollup(models.Model):
+    hour = models.DateTimeField()
+    category = models.ForeignKey("Category", on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="+")
+    # Bids placed in the hour and the sum of their amounts
+    bids = models.PositiveIntegerField(default=0)
+    volume = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["hour", "category"], name="bid_rollup_unique"),
+            # NULLs aren't equal in a unique index
+            models.UniqueConstraint(fields=["hour"], condition=Q(category__isnull=True), name="bid_rollup_uncategorized_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.bids} bids at {self.hour:%Y-%m-%d %H:00} in category {self.category_id}"
+
+
+class SalesRollup(models.Model):
+    hour = models.DateTimeField()
+    category = models.ForeignKey("Category", on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="+")
+    # Auctions that closed in the hour, the ones with a winner and the sum of their final prices
+    closed = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["hour", "category"], name="sales_rollup_unique"),
+            models.UniqueConstraint(fields=["hour"], condition=Q(category__isnull=True), name="sales_rollup_uncategorized_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.sold}/{self.closed} sold at {self.hour:%Y-%m-%d %H:00} in category {self.category_id}"
+
+
+# Time-decayed bid activity of an open listing (feeds.py): the log of the sum of e^(t * ln 2 / half-life)
+# over the times t of its bids. It never decays, a newer bid just adds more, so listings compare
+# by it as they would by their decayed counts without every row being rewritten as time passes.
+class TrendScore(models.Model):
+    listing = models.OneToOneField("AuctionListing", on_delete=models.CASCADE, primary_key=True, related_name="trend")
+    score = models.FloatField()
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Trending feed, hottest first
+            models.Index(fields=["-score"], name="trend_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"Trend score of auction {self.listing_id}"
+
+# Closed auctions moved out of the live tables by archive.py, with their original ids. They live in
+# AUCTIONS_ARCHIVE_DATABASE (db.ArchiveRouter), which may be another database than the users and
+# categories, so those references have no constraint.
+class ArchivedListing(models.Model):
+    id = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    listed_by = models.ForeignKey("User", on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    datetime_listed = models.DateTimeField()
+    end_datetime = models.DateTimeField(null=True, blank=True)
+    initial_price = models.DecimalField(max_digits=10, decimal_places=2)
+    image_url = models.URLField()
+    category = models.ForeignKey("Category", on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="+")
+    winner = models.ForeignKey("User", on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="+")
+    closed_at = models.DateTimeField()
+    current_price = models.DecimalField(max_digits=10, decimal_places=2)
+    highest_bid_id = models.IntegerField(null=True, blank=True)
+    bid_count = models.PositiveIntegerField(default=0)
+    watcher_count = models.PositiveIntegerField(default=0)
+    # Ids of the users who watched it when it was archived
+    watcher_ids = models.JSONField(default=list, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    # Templates and the dashboard read archived listings like closed live ones
+    is_active = False
+    is_archived = True
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedBid(models.Model):
+    id = models.IntegerField(primary_key=True)
+    auction = models.ForeignKey("ArchivedListing", on_delete=models.CASCADE, related_name="bids")
+    user = models.ForeignKey("User", on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"Archived bid of {self.amount} on auction {self.auction_id}"
+
+
+class ArchivedComment(models.Model):
+    id = models.IntegerField(primary_key=True)
+    auction = models.ForeignKey("ArchivedListing", on_delete=models.CASCADE, related_name="comments")
+    commented_by = models.ForeignKey("User", on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    datetime_commented = models.DateTimeField()
+    comment_text = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["auction", "-datetime_commented"], name="archived_comment_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived comment on auction {self.auction_id}"
@@ -0,0 +1,243 @@
+"""
+Notifications to the watchers and earlier bidders of a listing, through a transactional outbox.
+
+A bid, an auction unlisted by its seller or ended writes an OutboxEvent in the transaction of the
+change, so there is an event exactly when the change was committed. process_outbox() sends them
+later: the events of each WINDOW seconds are fanned out to the users following their listings and
+merged into one email per user and window, however many bids there were. Emails go through a
+Django email backend (AUCTIONS_NOTIFICATION_EMAIL_BACKEND, EMAIL_BACKEND by default).
+"""
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AuctionListing, Bid, OutboxEvent, User
+from .profiling import percentile
+
+BID = OutboxEvent.BID
+UNLISTED = OutboxEvent.UNLISTED
+ENDED = OutboxEvent.ENDED
+
+# A user gets at most one email per window of this many seconds
+WINDOW = getattr(settings, "AUCTIONS_NOTIFICATION_WINDOW", 60)
+EMAIL_BACKEND = getattr(settings, "AUCTIONS_NOTIFICATION_EMAIL_BACKEND", None)
+FROM_EMAIL = getattr(settings, "AUCTIONS_NOTIFICATION_FROM_EMAIL", None)
+# Sent events are deleted after this many days
+KEEP_DAYS = getattr(settings, "AUCTIONS_NOTIFICATION_KEEP_DAYS", 7)
+# Events claimed and sent at a time, seconds before the claim of a stopped worker runs out
+CLAIM_SIZE = getattr(settings, "AUCTIONS_NOTIFICATION_CLAIM_SIZE", 10000)
+CLAIM_TIMEOUT = getattr(settings, "AUCTIONS_NOTIFICATION_CLAIM_TIMEOUT", 10 * 60)
+# Emails per send_messages() call, users per query
+BATCH_SIZE = 1000
+
+
+def record(listing_id, kind, actor_id=None, amount=None):
+    return OutboxEvent.objects.create(listing_id=listing_id, kind=kind, actor_id=actor_id, amount=amount)
+
+
+def record_closed(listing_ids, closed_at, unlisted=False):
+    # Events of the listings close_auctions() just closed, the seller unlisting one doesn't hear of it
+    closed = AuctionListing.objects.filter(pk__in=listing_ids, closed_at=closed_at).order_by("pk")
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(
+            listing_id=listing_id, kind=UNLISTED if unlisted else ENDED,
+            actor_id=seller_id if unlisted else None, created_at=closed_at,
+        )
+        for listing_id, seller_id in closed.values_list("pk", "listed_by_id")
+    ])
+
+
+def window_start(moment, window=WINDOW):
+    seconds = moment.timestamp()
+    return moment - timedelta(seconds=seconds % window)
+
+
+def followers(listing_ids):
+    # {listing id: user ids} of the watchers and bidders of the listings, two queries
+    users = {listing_id: set() for listing_id in listing_ids}
+    Watch = AuctionListing.watchers.through
+    watches = Watch.objects.filter(auctionlisting_id__in=listing_ids).values_list("auctionlisting_id", "user_id")
+    bids = Bid.objects.filter(auction_id__in=listing_ids).values_list("auction_id", "user_id").distinct()
+    for rows in (watches, bids):
+        for listing_id, user_id in rows.iterator(chunk_size=10000):
+            users[listing_id].add(user_id)
+    return users
+
+
+@dataclass
+class Update:
+    listing_id: int
+    # The latest event of the listing in the window
+    kind: str
+    amount: object
+    bids: int
+
+
+def collect(events, followers_of):
+    """
+    {user id: [Update]} for one window of events (dicts, oldest first): every follower of a listing
+    gets its latest event, except whoever caused it, who already knows the listing's state.
+    """
+    latest = {}
+    bids = {}
+    for event in events:
+        latest[event["listing_id"]] = event
+        if event["kind"] == BID:
+            bids[event["listing_id"]] = bids.get(event["listing_id"], 0) + 1
+    updates = {}
+    for listing_id, event in latest.items():
+        update = Update(listing_id, event["kind"], event["amount"], bids.get(listing_id, 0))
+        for user_id in followers_of.get(listing_id, ()):
+            if user_id != event["actor_id"]:
+                updates.setdefault(user_id, []).append(update)
+    return updates
+
+
+def _line(update, listing, user_id):
+    title, winner_id = listing
+    if update.kind == BID:
+        count = f"{update.bids} new bids" if update.bids > 1 else "a new bid"
+        return f"{title}: {count}, the price is now ${update.amount}"
+    ending = "the seller closed the auction" if update.kind == UNLISTED else "the auction ended"
+    if winner_id == user_id:
+        ending += ", you won!"
+    return f"{title}: {ending}"
+
+
+def build_messages(updates, listings):
+    """
+    One EmailMessage per user with an email address, listings is {id: (title, winner id)}.
+    Returns the messages and how many users were skipped.
+    """
+    messages = []
+    skipped = 0
+    user_ids = list(updates)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        users = User.objects.filter(pk__in=user_ids[start:start + BATCH_SIZE]).values_list("pk", "username", "email")
+        for user_id, username, email in users:
+            if not email:
+                skipped += 1
+                continue
+            lines = [_line(update, listings[update.listing_id], user_id) for update in updates[user_id]]
+            if len(lines) == 1:
+                subject = lines[0]
+            else:
+                subject = f"Updates on {len(lines)} auctions you follow"
+            body = f"Hi {username},\n\n" + "\n".join(lines) + "\n"
+            messages.append(EmailMessage(subject, body, FROM_EMAIL, [email]))
+    return messages, skipped
+
+
+def claim(now=None, window=WINDOW, limit=CLAIM_SIZE):
+    """
+    Claims up to limit pending events of the finished windows, oldest first, in a transaction of its
+    own (skipping the rows another worker locked, where the database can). Returns them as dicts.
+
+    A window cut by the limit is left to the next claim, so its users still get one email, unless
+    it's the only one: a window of more than limit events is sent in several batches.
+    """
+    now = now or timezone.now()
+    claimed_at = timezone.now()
+    with transaction.atomic():
+        claimable = OutboxEvent.objects.filter(
+            Q(claimed_at__isnull=True) | Q(claimed_at__lt=claimed_at - timedelta(seconds=CLAIM_TIMEOUT)),
+            processed_at__isnull=True,
+            created_at__lt=window_start(now, window),
+        )
+        pending = claimable
+        if db_connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        events = list(pending.order_by("created_at", "id").values(
+            "id", "listing_id", "kind", "actor_id", "amount", "created_at"
+        )[:limit])
+        if len(events) == limit:
+            last = window_start(events[-1]["created_at"], window)
+            if window_start(events[0]["created_at"], window) != last:
+                events = [event for event in events if window_start(event["created_at"], window) != last]
+        ids = [event["id"] for event in events]
+        # Only the rows no other worker claimed in the meantime, where nothing was locked
+        claimable.filter(pk__in=ids).update(claimed_at=claimed_at)
+        mine = set(OutboxEvent.objects.filter(pk__in=ids, claimed_at=claimed_at).values_list("pk", flat=True))
+    return [event for event in events if event["id"] in mine]
+
+
+def process_outbox(now=None, window=WINDOW, connection=None, limit=CLAIM_SIZE):
+    """
+    Send the pending events of every finished window, marks them processed. The events are claimed
+    limit at a time and sent outside of any transaction; an email that fails releases the batch,
+    which is sent again on the next run.
+    """
+    now = now or timezone.now()
+    result = {"events": 0, "messages": 0, "skipped": 0, "lag": [], "send_seconds": 0.0}
+    mail = connection or get_connection(EMAIL_BACKEND)
+    while True:
+        events = claim(now, window, limit)
+        if not events:
+            break
+        ids = [event["id"] for event in events]
+        try:
+            _send(events, window, mail, result)
+        except Exception:
+            OutboxEvent.objects.filter(pk__in=ids).update(claimed_at=None)
+            raise
+        for start in range(0, len(ids), BATCH_SIZE):
+            OutboxEvent.objects.filter(pk__in=ids[start:start + BATCH_SIZE]).update(processed_at=now)
+        result["events"] += len(events)
+        result["lag"].extend((now - event["created_at"]).total_seconds() for event in events)
+    result["lag"].sort()
+    return result
+
+
+def _send(events, window, mail, result):
+    # The emails of a claimed batch, one per user and window
+    windows = {}
+    for event in events:
+        windows.setdefault(window_start(event["created_at"], window), []).append(event)
+    listing_ids = {event["listing_id"] for event in events}
+    followers_of = followers(listing_ids)
+    listings = {
+        pk: (title, winner_id)
+        for pk, title, winner_id in AuctionListing.objects.filter(pk__in=listing_ids).values_list("pk", "title", "winner_id")
+    }
+    for window_events in windows.values():
+        messages, skipped = build_messages(collect(window_events, followers_of), listings)
+        begin = time.perf_counter()
+        for start in range(0, len(messages), BATCH_SIZE):
+            mail.send_messages(messages[start:start + BATCH_SIZE])
+        # Spent in the email backend, the rest is the fan-out
+        result["send_seconds"] += time.perf_counter() - begin
+        result["messages"] += len(messages)
+        result["skipped"] += skipped
+
+
+def outbox_metrics(now=None, recent=10000):
+    """
+    Queue depth, age of the oldest pending event and the delivery lag (seconds from the change to
+    the email) of the most recently sent events.
+    """
+    now = now or timezone.now()
+    pending = OutboxEvent.objects.filter(processed_at__isnull=True)
+    oldest = pending.order_by("created_at").values_list("created_at", flat=True).first()
+    sent = OutboxEvent.objects.filter(processed_at__isnull=False).order_by("-processed_at")
+    lags = sorted(
+        (processed_at - created_at).total_seconds()
+        for created_at, processed_at in sent.values_list("created_at", "processed_at")[:recent]
+    )
+    return {
+        "depth": pending.count(),
+        "oldest_pending": (now - oldest).total_seconds() if oldest else None,
+        "lag_p50": percentile(lags, 50),
+        "lag_p99": percentile(lags, 99),
+    }
+
+
+def prune(now=None, keep_days=KEEP_DAYS):
+    now = now or timezone.now()
+    deleted, _ = OutboxEvent.objects.filter(processed_at__lt=now - timedelta(days=keep_days)).delete()
+    return deleted
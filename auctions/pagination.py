@@ -0,0 +1,121 @@
+import base64
+import json
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .models import AuctionListing
+
+PAGE_SIZE = getattr(settings, "AUCTIONS_PAGE_SIZE", 20)
+MAX_PAGE_SIZE = getattr(settings, "AUCTIONS_MAX_PAGE_SIZE", 100)
+
+# Sort name: (field, descending), ties are broken by id in the same direction
+SORTS = {
+    "ending": ("end_datetime", False),
+    "newest": ("datetime_listed", True),
+    "price": ("current_price", False),
+    "price_desc": ("current_price", True),
+}
+DEFAULT_SORT = "ending"
+
+
+@dataclass
+class Page:
+    items: list
+    sort: str
+    page_size: int
+    next_cursor: str = None
+    has_next: bool = False
+    is_first: bool = True
+
+
+def encode_cursor(listing, sort):
+    name, _ = SORTS[sort]
+    value = AuctionListing._meta.get_field(name).value_to_string(listing)
+    return base64.urlsafe_b64encode(json.dumps([value, listing.pk]).encode()).decode()
+
+
+def decode_cursor(cursor, sort):
+    name, _ = SORTS[sort]
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return AuctionListing._meta.get_field(name).to_python(value), int(pk)
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def page_size_from(value):
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+
+
+def _page_queryset(queryset, sort, cursor, page_size):
+    if sort not in SORTS:
+        sort = DEFAULT_SORT
+    name, descending = SORTS[sort]
+
+    position = decode_cursor(cursor, sort) if cursor else None
+    if position is None:
+        # Rows without a sort value can't be paged past (the cursor range already skips them)
+        if AuctionListing._meta.get_field(name).null:
+            queryset = queryset.filter(**{f"{name}__isnull": False})
+    else:
+        value, pk = position
+        after = "lt" if descending else "gt"
+        # The plain range lets the database seek the index, the OR breaks ties on the id
+        queryset = queryset.filter(
+            Q(**{f"{name}__{after}e": value})
+            & (Q(**{f"{name}__{after}": value}) | Q(**{name: value, f"pk__{after}": pk}))
+        )
+
+    order = "-" if descending else ""
+    # One extra row tells whether there is a next page
+    queryset = queryset.order_by(f"{order}{name}", f"{order}pk")[:page_size + 1]
+    return queryset, sort, position is None
+
+
+def _make_page(items, sort, page_size, is_first):
+    has_next = len(items) > page_size
+    items = items[:page_size]
+    return Page(
+        items=items,
+        sort=sort,
+        page_size=page_size,
+        next_cursor=encode_cursor(items[-1], sort) if has_next else None,
+        has_next=has_next,
+        is_first=is_first,
+    )
+
+
+def paginate(queryset, sort=None, cursor=None, page_size=PAGE_SIZE):
+    """
+    Keyset pagination: the next page starts right after the (sort value, id) of the last row,
+    so deep pages are read through the index like the first one instead of skipping rows with OFFSET.
+    """
+    queryset, sort, is_first = _page_queryset(queryset, sort, cursor, page_size)
+    return _make_page(list(queryset), sort, page_size, is_first)
+
+
+async def apaginate(queryset, sort=None, cursor=None, page_size=PAGE_SIZE):
+    queryset, sort, is_first = _page_queryset(queryset, sort, cursor, page_size)
+    return _make_page([item async for item in queryset], sort, page_size, is_first)
+
+
+def _page_arguments(request, default_sort):
+    return {
+        "sort": request.GET.get("sort", default_sort),
+        "cursor": request.GET.get("cursor"),
+        "page_size": page_size_from(request.GET.get("size")),
+    }
+
+
+def paginate_request(request, queryset, default_sort=DEFAULT_SORT):
+    return paginate(queryset, **_page_arguments(request, default_sort))
+
+
+async def apaginate_request(request, queryset, default_sort=DEFAULT_SORT):
+    return await apaginate(queryset, **_page_arguments(request, default_sort))
@@ -0,0 +1,220 @@
+import atexit
+import json
+import math
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+# Samples kept per URL name for the rolling percentiles
+WINDOW = getattr(settings, "AUCTIONS_PROFILE_WINDOW", 1000)
+
+_current = ContextVar("auctions_request_profile", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self.peak_memory = None
+        self.started = None
+
+    def server_timing(self):
+        metrics = [
+            f'db;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries"',
+            f"tpl;dur={self.template_time * 1000:.2f}",
+            f"total;dur={self.total_time * 1000:.2f}",
+        ]
+        if self.peak_memory is not None:
+            metrics.append(f'mem;desc="{self.peak_memory // 1024} KiB peak"')
+        return ", ".join(metrics)
+
+
+# Execute wrapper installed on every database connection, records into the profile of the current request.
+# The profile is found through a context variable so queries run by sync_to_async threads are counted too.
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.sql_time += time.perf_counter() - start
+        profile.queries += 1
+
+
+def _instrument(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_instrument)
+
+
+def percentile(values, percent):
+    # Nearest rank on an already sorted list
+    if not values:
+        return None
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+class ProfileStore:
+    """
+    Rolling window of request profiles per URL name.
+    """
+
+    METRICS = ("queries", "sql_time", "template_time", "total_time", "peak_memory")
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def add(self, url_name, profile):
+        with self.lock:
+            self.samples[url_name].append(tuple(getattr(profile, metric) for metric in self.METRICS))
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def summary(self):
+        with self.lock:
+            samples = {url_name: list(rows) for url_name, rows in self.samples.items()}
+        summary = {}
+        for url_name, rows in samples.items():
+            summary[url_name] = {"count": len(rows)}
+            for index, metric in enumerate(self.METRICS):
+                values = sorted(row[index] for row in rows if row[index] is not None)
+                if values:
+                    summary[url_name][metric] = {
+                        "p50": percentile(values, 50),
+                        "p95": percentile(values, 95),
+                        "p99": percentile(values, 99),
+                    }
+        return summary
+
+    def dump(self, path):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2, sort_keys=True)
+
+
+profiles = ProfileStore()
+
+
+class ProfilingTemplates(DjangoTemplates):
+    """
+    Django template backend that adds the render time of each template to the current request profile.
+    """
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name).template, self)
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - start
+
+
+class ProfilingMiddleware:
+    """
+    Records query count, SQL time, template time, total time and (optionally) peak memory for each request.
+
+    The numbers are sent back in a Server-Timing header and added to the rolling per URL name profiles.
+    Views listed in AUCTIONS_QUERY_BUDGETS ({url name: max queries}) raise QueryBudgetExceeded when
+    AUCTIONS_QUERY_BUDGET_RAISE is set, otherwise the overrun is only reported in the header.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "AUCTIONS_PROFILING", True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.budgets = getattr(settings, "AUCTIONS_QUERY_BUDGETS", {})
+        self.raise_on_budget = getattr(settings, "AUCTIONS_QUERY_BUDGET_RAISE", False)
+        self.trace_memory = getattr(settings, "AUCTIONS_PROFILE_MEMORY", False)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        dump_path = getattr(settings, "AUCTIONS_PROFILE_DUMP", None)
+        if dump_path:
+            atexit.register(profiles.dump, dump_path)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    def start(self):
+        # Connections of this thread that were opened before the middleware was loaded
+        for alias in connections:
+            _instrument(connections[alias])
+        profile = RequestProfile()
+        profile.started = time.perf_counter()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        return profile, _current.set(profile)
+
+    def finish(self, request, response, profile):
+        profile.total_time = time.perf_counter() - profile.started
+        if self.trace_memory:
+            profile.peak_memory = tracemalloc.get_traced_memory()[1]
+
+        response["Server-Timing"] = profile.server_timing()
+        match = request.resolver_match
+        url_name = match.view_name if match else "unresolved"
+        profiles.add(url_name, profile)
+        self.check_budget(url_name, profile, response)
+        return response
+
+    def check_budget(self, url_name, profile, response):
+        budget = self.budgets.get(url_name)
+        if budget is None or profile.queries <= budget:
+            return
+        message = f"{url_name} ran {profile.queries} queries, the budget is {budget}"
+        if self.raise_on_budget:
+            raise QueryBudgetExceeded(message)
+        response["Server-Timing"] += f', budget;desc="{message}"'
+
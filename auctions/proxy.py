@@ -0,0 +1,127 @@
+"""
+Proxy bidding: users set the most they will pay and the engine bids for them, eBay style.
+
+When maximums compete the leader is the highest one (the earliest of equal ones) and the price is
+the second highest maximum plus one increment, capped at the leader's maximum. All the maximums of
+an auction are resolved at once from a heap, only the leader's bid at the resulting price is
+written instead of one bid per increment.
+"""
+import bisect
+import heapq
+from decimal import Decimal
+
+from .models import Bid, ProxyBid
+
+# (prices below, increment), an eBay like table
+INCREMENTS = [
+    (Decimal("1.00"), Decimal("0.05")),
+    (Decimal("5.00"), Decimal("0.25")),
+    (Decimal("25.00"), Decimal("0.50")),
+    (Decimal("100.00"), Decimal("1.00")),
+    (Decimal("250.00"), Decimal("2.50")),
+    (Decimal("500.00"), Decimal("5.00")),
+    (Decimal("1000.00"), Decimal("10.00")),
+    (Decimal("2500.00"), Decimal("25.00")),
+    (Decimal("5000.00"), Decimal("50.00")),
+]
+TOP_INCREMENT = Decimal("100.00")
+
+_limits = [limit for limit, _ in INCREMENTS]
+
+
+def increment(price):
+    # Smallest raise over price
+    index = bisect.bisect_right(_limits, price)
+    return INCREMENTS[index][1] if index < len(INCREMENTS) else TOP_INCREMENT
+
+
+class ProxyBook:
+    """
+    The maximums of one auction in a heap, best first: the highest amount, then the lowest order.
+
+    A user has one maximum, setting it again leaves the old entry in the heap to be skipped when it
+    comes up, so changing a maximum is O(log n) and finding the two best is amortised O(log n).
+    """
+
+    def __init__(self, maximums=()):
+        # user id: (-max amount, order, user id)
+        self.entries = {user_id: (-amount, order, user_id) for user_id, amount, order in maximums}
+        self.heap = list(self.entries.values())
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def set(self, user_id, max_amount, order):
+        entry = (-max_amount, order, user_id)
+        self.entries[user_id] = entry
+        heapq.heappush(self.heap, entry)
+
+    def discard(self, user_id):
+        self.entries.pop(user_id, None)
+
+    def _best(self):
+        heap = self.heap
+        while heap and self.entries.get(heap[0][2]) is not heap[0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def top_two(self):
+        first = self._best()
+        if first is None:
+            return None, None
+        heapq.heappop(self.heap)
+        second = self._best()
+        heapq.heappush(self.heap, first)
+        return first, second
+
+    def resolve(self, current_price, holder_id=None):
+        """
+        (user id, price) of the leader once every maximum has bid against the others, None when the
+        holder of the current highest bid keeps it at the current price.
+        """
+        first, second = self.top_two()
+        if first is None:
+            return None
+        leader_max, leader_id = -first[0], first[2]
+        if leader_id == holder_id:
+            if second is None:
+                return None
+            # Only pushed up as far as the runner-up can go
+            base = -second[0]
+        else:
+            base = max(-second[0], current_price) if second else current_price
+        price = min(leader_max, base + increment(base))
+        if price <= current_price:
+            return None
+        return leader_id, price
+
+
+# A plain bid counts as a maximum at its amount, placed before any maximum equal to it
+HOLDER_ORDER = (0,)
+
+
+def load_book(listing_id, current_price, holder_id=None):
+    """
+    The maximums of the auction still above its price, in one query, plus the holder of the
+    current highest bid.
+    """
+    maximums = []
+    if holder_id is not None:
+        maximums.append((holder_id, current_price, HOLDER_ORDER))
+    rows = ProxyBid.objects.filter(auction_id=listing_id, max_amount__gt=current_price)
+    for user_id, max_amount, updated_at, pk in rows.values_list("user_id", "max_amount", "updated_at", "pk"):
+        maximums.append((user_id, max_amount, (1, updated_at, pk)))
+    return ProxyBook(maximums)
+
+
+def resolve_proxies(listing_id, current_price, holder_id=None):
+    """
+    Let the maximums of the auction bid against its current price, in the transaction that locked
+    the listing. Returns the leader's new bid, None when nothing changed.
+    """
+    resolution = load_book(listing_id, current_price, holder_id).resolve(current_price, holder_id)
+    if resolution is None:
+        return None
+    user_id, price = resolution
+    return Bid.objects.create(auction_id=listing_id, user_id=user_id, amount=price)
@@ -0,0 +1,270 @@
+"""
+Admission control for the write endpoints: bids, comments and watch toggles are rate limited per session
+(or address) and listing, and all of them share one bucket sized to what the SQLite writer can take.
+
+Bids may empty the shared bucket, comments and watches stop once less than AUCTIONS_RATE_LIMIT_RESERVE
+of it is left, so a flood of them can't keep bids out. A refused request gets a 429 from
+RateLimitMiddleware before the view runs, without touching the database.
+
+The buckets are GCRA token buckets: each key stores the single time at which it will be full again.
+LocalBuckets keeps them in a dict of this process without locking (threads racing on the same key
+may let a request too many in), CacheBuckets in a Django cache shared by several processes.
+"""
+import atexit
+import json
+import threading
+import time
+import weakref
+from collections import Counter
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, JsonResponse
+from django.utils.module_loading import import_string
+
+BID = "bid"
+COMMENT = "comment"
+WATCH = "watch"
+LANES = (BID, COMMENT, WATCH)
+# Only these may use the reserved part of the shared bucket
+PRIORITY_LANES = {BID}
+
+# Lane: (requests per second, burst) for one user on one listing
+LIMITS = getattr(settings, "AUCTIONS_RATE_LIMITS", {BID: (2, 10), COMMENT: (0.2, 3), WATCH: (0.5, 5)})
+# (requests per second, burst) of all the limited requests together
+WRITE_CAPACITY = getattr(settings, "AUCTIONS_WRITE_CAPACITY", (50, 100))
+RESERVE = getattr(settings, "AUCTIONS_RATE_LIMIT_RESERVE", 0.5)
+BACKEND = getattr(settings, "AUCTIONS_RATE_LIMIT_BACKEND", "auctions.ratelimit.LocalBuckets")
+CACHE_ALIAS = getattr(settings, "AUCTIONS_RATE_LIMIT_CACHE", "default")
+
+WRITES_KEY = "writes"
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    lane: str
+    # Seconds until the request would be let in, 0 when it was
+    retry_after: float = 0.0
+
+
+class LocalBuckets:
+    """
+    Buckets of this process. A read, a calculation and a dict assignment per decision, no lock.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, max_keys=100000):
+        self.full_at = {}
+        self.prune_at = max_keys
+        self.counts = Counter()
+        self.counts_lock = threading.Lock()
+
+    def take(self, key, rate, burst, reserve=0.0):
+        """
+        Takes a token from the bucket of key, refused when fewer than reserve * burst would be left.
+        Returns the seconds to wait, 0 when the token was taken.
+        """
+        now = self.clock()
+        interval = 1 / rate
+        full_at = max(self.full_at.get(key, now), now) + interval
+        wait = full_at - now - burst * (1 - reserve) * interval
+        if wait > 1e-9:
+            return wait
+        if len(self.full_at) >= self.prune_at:
+            self.prune(now)
+        self.full_at[key] = full_at
+        return 0.0
+
+    def give_back(self, key, rate):
+        full_at = self.full_at.get(key)
+        if full_at is not None:
+            self.full_at[key] = full_at - 1 / rate
+
+    def prune(self, now):
+        # Full buckets are the same as missing ones
+        for key, full_at in list(self.full_at.items()):
+            if full_at <= now:
+                self.full_at.pop(key, None)
+        # Not every time a key is added when most buckets are in use
+        self.prune_at = max(self.prune_at, 2 * len(self.full_at))
+
+    def count(self, name):
+        with self.counts_lock:
+            self.counts[name] += 1
+
+    def counters(self):
+        with self.counts_lock:
+            return dict(self.counts)
+
+    def reset(self):
+        self.full_at.clear()
+        with self.counts_lock:
+            self.counts.clear()
+
+
+class CacheBuckets:
+    """
+    Buckets in a Django cache, for several processes behind one site. A get and a set per decision, so
+    requests racing on the same key may all get in; the shared bucket is only as exact as the cache.
+    """
+
+    clock = staticmethod(time.time)
+    prefix = "auctions:ratelimit:"
+
+    def __init__(self, alias=CACHE_ALIAS):
+        self.alias = alias
+        self.cache = caches[alias]
+
+    def take(self, key, rate, burst, reserve=0.0):
+        now = self.clock()
+        interval = 1 / rate
+        full_at = max(self.cache.get(self.prefix + key, now), now) + interval
+        wait = full_at - now - burst * (1 - reserve) * interval
+        if wait > 1e-9:
+            return wait
+        self.cache.set(self.prefix + key, full_at, max(int(full_at - now) + 1, 1))
+        return 0.0
+
+    def give_back(self, key, rate):
+        full_at = self.cache.get(self.prefix + key)
+        if full_at is not None:
+            self.cache.set(self.prefix + key, full_at - 1 / rate, max(int(full_at - self.clock()) + 1, 1))
+
+    def count(self, name):
+        key = f"{self.prefix}count:{name}"
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, None):
+                self.cache.incr(key)
+
+    def counters(self):
+        names = [f"{lane}.{outcome}" for lane in LANES for outcome in ("accepted", "shed")]
+        values = self.cache.get_many([f"{self.prefix}count:{name}" for name in names])
+        return {name: values[f"{self.prefix}count:{name}"] for name in names if f"{self.prefix}count:{name}" in values}
+
+    def reset(self):
+        self.cache.delete_many([
+            f"{self.prefix}count:{lane}.{outcome}" for lane in LANES for outcome in ("accepted", "shed")
+        ])
+
+
+# Limiters of this process, for counters()
+_limiters = weakref.WeakSet()
+
+
+class Limiter:
+    def __init__(self, buckets=None, limits=None, capacity=WRITE_CAPACITY, reserve=RESERVE):
+        self.buckets = buckets or import_string(BACKEND)()
+        self.limits = {**LIMITS, **(limits or {})}
+        self.capacity = capacity
+        self.reserve = reserve
+        _limiters.add(self)
+
+    def admit(self, lane, client, listing_id):
+        """
+        Whether a lane request of client (a session key or address) on the listing may go on.
+        """
+        rate, burst = self.limits[lane]
+        key = f"{lane}:{client}:{listing_id}"
+        wait = self.buckets.take(key, rate, burst)
+        if not wait:
+            reserve = 0.0 if lane in PRIORITY_LANES else self.reserve
+            wait = self.buckets.take(WRITES_KEY, *self.capacity, reserve=reserve)
+            if wait:
+                # Shed by the shared bucket, the user's own token isn't spent
+                self.buckets.give_back(key, rate)
+        self.buckets.count(f"{lane}.{'shed' if wait else 'accepted'}")
+        return Decision(not wait, lane, wait)
+
+    def counters(self):
+        return self.buckets.counters()
+
+
+def counters():
+    # Accepted and shed requests per lane, of every limiter in this process (of the cache with CacheBuckets)
+    totals = Counter()
+    seen = set()
+    for limiter in list(_limiters):
+        # Limiters on the same cache share their counters
+        identity = getattr(limiter.buckets, "alias", id(limiter.buckets))
+        if identity not in seen:
+            seen.add(identity)
+            totals.update(limiter.counters())
+    return dict(totals)
+
+
+def dump(path):
+    with open(path, "w") as file:
+        json.dump(counters(), file, indent=2, sort_keys=True)
+
+
+def classify(request, view_name):
+    # The lane of a request, None for the ones that aren't limited
+    if view_name == "bid":
+        return BID if request.method == "POST" else None
+    if view_name != "listings":
+        return None
+    if request.method == "POST":
+        if request.POST.get("amount"):
+            return BID
+        if request.POST.get("comment_text"):
+            return COMMENT
+    elif request.GET.get("watch") in ("true", "false"):
+        return WATCH
+    return None
+
+
+class RateLimitMiddleware:
+    """
+    Answers 429 with a Retry-After header to the bids, comments and watch toggles the Limiter refuses.
+
+    Clients are told apart by their session cookie, or their address without one. Neither the session
+    nor the user is loaded: with database sessions that would be two queries per refused request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "AUCTIONS_RATE_LIMIT", True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.limiter = Limiter()
+        dump_path = getattr(settings, "AUCTIONS_RATE_LIMIT_DUMP", None)
+        if dump_path:
+            atexit.register(dump, dump_path)
+
+    def __call__(self, request):
+        # A coroutine when the chain is async, the work is done in process_view
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name if request.resolver_match else None
+        lane = classify(request, view_name)
+        if lane is None:
+            return None
+        # Made up cookies still go through the shared bucket, and the views turn them away
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        client = f"s{session_key}" if session_key else request.META.get("REMOTE_ADDR", "")
+        decision = self.limiter.admit(lane, client, view_kwargs.get("id"))
+        if decision.allowed:
+            return None
+        return too_many_requests(view_name, decision)
+
+
+def too_many_requests(view_name, decision):
+    message = f"Too many {decision.lane} requests, try again in a moment"
+    if view_name == "bid":
+        response = JsonResponse({"status": "rate_limited", "message": message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type="text/plain; charset=utf-8")
+    response["Retry-After"] = str(max(int(decision.retry_after + 0.999), 1))
+    return response
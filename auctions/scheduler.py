@@ -0,0 +1,110 @@
+import heapq
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import analytics, feeds, ledger, notifications
+from .catalog import listings_closed
+from .fragments import bump_listing_versions
+from .live import ENDED, notify
+from .models import AuctionListing, Bid
+
+# How many auctions are closed with one UPDATE
+BATCH_SIZE = 500
+# How far ahead the worker loads auctions into its queue
+HORIZON = timedelta(minutes=5)
+
+
+def close_auctions(listing_ids, now=None, unlisted=False):
+    """
+    Close the given ended auctions in one UPDATE, the winner is the user of the stored highest bid.
+
+    Auctions that are already closed or have not ended yet are left alone, returns how many were closed.
+    The ledger and notification events and the analytics rollups are written in the same transaction,
+    unlisted tells the watchers the seller closed the auction.
+    """
+    now = now or timezone.now()
+    highest_bidder = Bid.objects.filter(pk=OuterRef("highest_bid_id")).values("user_id")[:1]
+    with transaction.atomic():
+        closed = AuctionListing.objects.filter(
+            pk__in=listing_ids,
+            closed_at__isnull=True,
+            end_datetime__lte=now
+        ).update(
+            winner_id=Coalesce(F("winner_id"), Subquery(highest_bidder)),
+            closed_at=now
+        )
+        if closed:
+            bump_listing_versions(listing_ids)
+            listings_closed(listing_ids, now)
+            analytics.listings_closed(listing_ids, now)
+            feeds.listings_closed(listing_ids)
+            ledger.record_closed(listing_ids, now)
+            notifications.record_closed(listing_ids, now, unlisted)
+            notify(ENDED, listing_ids)
+    return closed
+
+
+class AuctionScheduler:
+    """
+    Keeps the open auctions in a priority queue ordered by end_datetime and closes them in batches when they end.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, horizon=HORIZON, clock=timezone.now):
+        self.batch_size = batch_size
+        self.horizon = horizon
+        self.clock = clock
+        self.queue = []
+        self.queued = set()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def schedule(self, listing_id, end_datetime):
+        if end_datetime is None or listing_id in self.queued:
+            return
+        heapq.heappush(self.queue, (end_datetime, listing_id))
+        self.queued.add(listing_id)
+
+    # Load the open auctions ending before the horizon (listings are created by other processes)
+    def refresh(self):
+        pending = AuctionListing.objects.filter(
+            closed_at__isnull=True,
+            end_datetime__lte=self.clock() + self.horizon
+        ).order_by("end_datetime").values_list("id", "end_datetime")
+        for listing_id, end_datetime in pending.iterator(chunk_size=self.batch_size):
+            self.schedule(listing_id, end_datetime)
+
+    def pop_due(self, now):
+        due = []
+        while self.queue and self.queue[0][0] <= now:
+            _, listing_id = heapq.heappop(self.queue)
+            self.queued.discard(listing_id)
+            due.append(listing_id)
+        return due
+
+    def run_pending(self):
+        now = self.clock()
+        due = self.pop_due(now)
+        closed = 0
+        for start in range(0, len(due), self.batch_size):
+            closed += close_auctions(due[start:start + self.batch_size], now)
+        return closed
+
+    def seconds_until_next(self):
+        if not self.queue:
+            return None
+        return max((self.queue[0][0] - self.clock()).total_seconds(), 0)
+
+    def run_forever(self, poll_interval=30, on_closed=None):
+        while True:
+            self.refresh()
+            closed = self.run_pending()
+            if closed and on_closed:
+                on_closed(closed)
+            wait = self.seconds_until_next()
+            time.sleep(poll_interval if wait is None else min(wait, poll_interval))
@@ -0,0 +1,127 @@
+import re
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AuctionListing
+
+# FTS5 index of the listing titles and descriptions (migration 0007), kept up to date by triggers
+FTS_TABLE = "auctions_listing_fts"
+# bm25 weights, a word in the title counts more than one in the description
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+PAGE_SIZE = getattr(settings, "AUCTIONS_SEARCH_PAGE_SIZE", 20)
+# Words of a query past this are ignored
+MAX_TERMS = 8
+# Shorter words are not prefix matched, "a*" would match most of the index
+MIN_PREFIX = 2
+# Queries matching more listings than this are shown newest first: bm25 costs about a microsecond
+# per match, and a word that is in most listings says next to nothing about relevance anyway
+RANK_LIMIT = getattr(settings, "AUCTIONS_SEARCH_RANK_LIMIT", 20000)
+
+WORD = re.compile(r"\w+\*?")
+
+
+@dataclass
+class SearchResults:
+    items: list
+    query: str
+    page: int
+    page_size: int
+    has_next: bool = False
+
+
+def parse_query(text):
+    """
+    Words of the query, "word*" is a prefix. The last word is a prefix too (search as you type)
+    unless the query ends with a space.
+    """
+    terms = WORD.findall(text.lower())[:MAX_TERMS]
+    if terms and not text.endswith(" ") and not terms[-1].endswith("*"):
+        terms[-1] += "*"
+    return [term if len(term.rstrip("*")) >= MIN_PREFIX else term.rstrip("*") for term in terms]
+
+
+def match_expression(terms):
+    # Quoted, so FTS5 syntax in the input (AND, NEAR, column:) is searched as plain words
+    return " ".join(f'"{term.rstrip("*")}"' + ("*" if term.endswith("*") else "") for term in terms)
+
+
+def _is_broad(expression):
+    # Stops reading the index after RANK_LIMIT matches
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT 1 OFFSET %s", [expression, RANK_LIMIT])
+        return cursor.fetchone() is not None
+
+
+def _fts_ids(terms, category, active_only, offset, limit):
+    expression = match_expression(terms)
+    conditions = [f"{FTS_TABLE} MATCH %s"]
+    params = [expression]
+    if category is not None:
+        conditions.append("listing.category_id = %s")
+        params.append(category)
+    if active_only:
+        conditions.append("listing.end_datetime > %s")
+        params.append(connection.ops.adapt_datetimefield_value(timezone.now()))
+    if _is_broad(expression):
+        # The index is read in id order, so the page is found without looking at every match
+        order = f"{FTS_TABLE}.rowid DESC"
+    else:
+        order = f"bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}), listing.id"
+    sql = (
+        f"SELECT listing.id FROM {FTS_TABLE} "
+        f"JOIN {AuctionListing._meta.db_table} listing ON listing.id = {FTS_TABLE}.rowid "
+        f"WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _like_ids(terms, category, active_only, offset, limit):
+    # Databases without the FTS5 index: every word in the title or description, newest first
+    listings = AuctionListing.objects.all()
+    for term in terms:
+        word = term.rstrip("*")
+        listings = listings.filter(Q(title__icontains=word) | Q(description__icontains=word))
+    if category is not None:
+        listings = listings.filter(category=category)
+    if active_only:
+        listings = listings.filter(end_datetime__gt=timezone.now())
+    return list(listings.order_by("-datetime_listed", "-id").values_list("id", flat=True)[offset:offset + limit])
+
+
+def search(text, category=None, active_only=True, page=1, page_size=PAGE_SIZE):
+    """
+    Listings matching every word of the query, best matches first (newest first past RANK_LIMIT
+    matches). category is a category id.
+    """
+    terms = parse_query(text)
+    if not terms:
+        return SearchResults([], text, page, page_size)
+
+    find = _fts_ids if connection.vendor == "sqlite" else _like_ids
+    # One extra row tells whether there is a next page
+    ids = find(terms, category, active_only, (page - 1) * page_size, page_size + 1)
+    listings = AuctionListing.objects.in_bulk(ids[:page_size])
+    return SearchResults(
+        items=[listings[pk] for pk in ids[:page_size] if pk in listings],
+        query=text,
+        page=page,
+        page_size=page_size,
+        has_next=len(ids) > page_size,
+    )
+
+
+def rebuild_index():
+    # Re-index every listing, only needed after writing to the listings table with the triggers dropped
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        # Merge the index segments the incremental updates left behind
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
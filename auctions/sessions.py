@@ -0,0 +1,46 @@
+"""
+Session engine (SESSION_ENGINE = "auctions.sessions"): sessions are read from the cache and written
+behind to the database.
+
+A change to the login (user, backend, password hash) or a new session is written through to the
+database right away. Other changes only go to the cache, the database copy is brought up to date
+by the first save after WRITE_BEHIND seconds, so it is at most that stale when the cache loses the
+session. Several processes need a shared cache (Memcached, Redis) for it.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+WRITE_BEHIND = getattr(settings, "AUCTIONS_SESSION_WRITE_BEHIND", 5 * 60)
+# Always written to the database
+LOGIN_KEYS = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY)
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = "auctions.sessions"
+
+    def _written_key(self, session_key):
+        # (time, login) of the last database write
+        return f"{self.cache_key_prefix}{session_key}:written"
+
+    def _login(self):
+        session = self._get_session()
+        return tuple(session.get(key) for key in LOGIN_KEYS)
+
+    def save(self, must_create=False):
+        written = None if must_create or self.session_key is None else self._cache.get(self._written_key(self.session_key))
+        if written is not None:
+            written_at, login = written
+            if login == self._login() and time.time() - written_at < WRITE_BEHIND:
+                self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+                return
+        super().save(must_create)
+        self._cache.set(self._written_key(self.session_key), (time.time(), self._login()), self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        session_key = session_key or self.session_key
+        super().delete(session_key)
+        if session_key is not None:
+            self._cache.delete(self._written_key(session_key))
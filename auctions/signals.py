@@ -0,0 +1,139 @@
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import analytics, catalog, feeds, ledger, notifications
+from .auth import forget_user, remember_user
+from .fragments import bump_listing_version, bump_listing_versions
+from .live import PRICE, notify
+from .models import AuctionListing, Bid, Category, Comment, User
+
+
+# Keep the listing bid stats up to date on every bid write
+@receiver(post_save, sender=Bid)
+def bid_saved(sender, instance, created, raw=False, **kwargs):
+    # Fixtures are loaded raw, run repair_bid_stats after loading them
+    if raw:
+        return
+    if created:
+        instance.auction.record_bid(instance)
+        # Same transaction as the bid, the watchers hear of it only if it's committed
+        notifications.record(instance.auction_id, notifications.BID, instance.user_id, instance.amount)
+    else:
+        instance.auction.refresh_bid_stats()
+        # An edited bid is the old one retracted and the new one placed
+        ledger.record(instance.auction_id, ledger.RETRACTED, instance.pk, instance.user_id)
+    placed = ledger.record(instance.auction_id, ledger.PLACED, instance.pk, instance.user_id, instance.amount)
+    if created:
+        analytics.bid_placed(instance, placed.recorded_at)
+        feeds.bid_placed(instance.auction_id, placed.recorded_at)
+    else:
+        # Not a new bid, only its amount changed
+        analytics.bid_edited(instance)
+    bump_listing_version(instance.auction_id)
+    notify(PRICE, [instance.auction_id])
+
+
+@receiver(post_delete, sender=Bid)
+def bid_deleted(sender, instance, **kwargs):
+    ledger.record(instance.auction_id, ledger.RETRACTED, instance.pk, instance.user_id)
+    bump_listing_version(instance.auction_id)
+    try:
+        listing = instance.auction
+    except AuctionListing.DoesNotExist:
+        # The whole auction was deleted along with its bids
+        return
+    analytics.bid_deleted(instance, listing.category_id)
+    listing.refresh_bid_stats()
+    notify(PRICE, [listing.pk])
+
+
+# Invalidate the cached fragments of the listing
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump_listing_version(instance.auction_id)
+
+
+@receiver(post_save, sender=AuctionListing)
+@receiver(post_delete, sender=AuctionListing)
+def listing_changed(sender, instance, **kwargs):
+    bump_listing_version(instance.pk)
+
+
+# Keep the category stats of the catalog up to date
+@receiver(post_save, sender=AuctionListing)
+def listing_saved(sender, instance, created, raw=False, **kwargs):
+    # Fixtures are loaded raw, run refresh_category_stats after loading them
+    if raw:
+        return
+    catalog.listing_saved(instance, created)
+
+
+@receiver(post_delete, sender=AuctionListing)
+def listing_deleted(sender, instance, **kwargs):
+    catalog.listing_deleted(instance)
+
+
+# Keep the watcher counts of the analytics report up to date
+@receiver(m2m_changed, sender=AuctionListing.watchers.through)
+def watchers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    analytics.watchers_changed(instance, action, reverse, pk_set)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    catalog.bump_catalog_version()
+    # The details fragment and the API show the category name, the listings are left without one
+    # on delete (ids taken beforehand, SET_NULL sends no signals)
+    listing_ids = getattr(instance, "_listing_ids", None)
+    if listing_ids is None and not kwargs.get("created"):
+        listing_ids = list(instance.auctionlisting_set.values_list("pk", flat=True))
+    bump_listing_versions(listing_ids or [])
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    instance._listing_ids = list(instance.auctionlisting_set.values_list("pk", flat=True))
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or instance._state.adding or (update_fields is not None and "username" not in update_fields):
+        return
+    previous = User.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+    instance._username_changed = previous is not None and previous != instance.username
+
+
+# Drop the cached user (auth.py) when it changes
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        # Logging in, the user is about to be loaded by the next request
+        remember_user(instance)
+    else:
+        forget_user(instance.pk)
+    if getattr(instance, "_username_changed", False):
+        instance._username_changed = False
+        # The fragments and the API show the username of sellers, winners, commenters and (the
+        # ledger history) bidders
+        listing_ids = AuctionListing.objects.filter(
+            Q(listed_by=instance) | Q(winner=instance)
+            | Q(pk__in=Comment.objects.filter(commented_by=instance).values("auction_id"))
+            | Q(pk__in=Bid.objects.filter(user=instance).values("auction_id"))
+        ).values_list("pk", flat=True)
+        bump_listing_versions(list(listing_ids))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    # The user's watches are deleted along with it, without an m2m_changed
+    instance._watched = list(instance.watchlist.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget_user(instance.pk)
+    if getattr(instance, "_watched", None):
+        analytics.refresh_watcher_counts(instance._watched)
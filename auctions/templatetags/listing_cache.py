@@ -0,0 +1,50 @@
+from django import template
+
+from auctions import fragments as listing_fragments
+from auctions.fragments import fragments
+
+register = template.Library()
+
+
+class ListingFragmentNode(template.Node):
+    def __init__(self, nodelist, name, listing_id, version=None):
+        self.nodelist = nodelist
+        self.name = name
+        self.listing_id = listing_id
+        self.version = version
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        listing_id = self.listing_id.resolve(context)
+        # A version missing from the context falls back to the current one
+        version = (self.version.resolve(context) if self.version else None) or None
+        return fragments.get_or_render(name, listing_id, lambda: self.nodelist.render(context), version)
+
+
+@register.tag
+def listingfragment(parser, token):
+    """
+    Cache the enclosed template until the listing version changes (a new bid, comment or edit):
+
+        {% listingfragment "comments" listing.id %} ... {% endlistingfragment %}
+
+    A third argument replaces the current listing version, pass the one read before the rows the
+    markup is rendered from, or a key naming what the markup shows:
+
+        {% listingfragment "details" listing.id version %}
+        {% listingfragment "card" listing.id listing|card_version %}
+
+    Only put markup that is the same for every user inside.
+    """
+    bits = token.split_contents()
+    if len(bits) not in (3, 4):
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name, a listing id and optionally a version")
+    nodelist = parser.parse(("endlistingfragment",))
+    parser.delete_first_token()
+    return ListingFragmentNode(nodelist, *(parser.compile_filter(bit) for bit in bits[1:]))
+
+
+@register.filter
+def card_version(listing):
+    # Key of the listing card, from what it shows (fragments.card_version)
+    return listing_fragments.card_version(listing)
@@ -0,0 +1,22 @@
+from django import template
+from django.urls import reverse
+
+from auctions import images
+from auctions.images import RENDITIONS, sign_url
+from auctions.views import DEFAULT_IMG
+
+register = template.Library()
+
+
+@register.filter
+def image(url, rendition):
+    """
+    URL of a resized copy of a listing image, served by the image proxy:
+
+        <img src="{{ listing.image_url|image:"thumb" }}">
+    """
+    if rendition not in RENDITIONS:
+        raise template.TemplateSyntaxError(f"Unknown image rendition {rendition!r}, expected one of {', '.join(RENDITIONS)}")
+    if not images.ENABLED:
+        return url or DEFAULT_IMG
+    return reverse("image", args=[rendition, sign_url(url or DEFAULT_IMG)])
@@ -1,3 +1,2064 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import hashlib
+import json
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import urllib.request
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from django.utils import timezone
+
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from asgiref.sync import sync_to_async
+
+from commerce.databases import database_from_url
+
+from . import analytics, archive, bidding, catalog, checks, feeds, images, ledger, live, notifications, proxy, ratelimit
+from .images import ImagePipeline, ImageStore, StubFetcher, placeholder_png
+from .db import STICKY_COOKIE, ArchiveRouter, ReplicaMiddleware, ReplicaRouter, set_journal_mode
+from .dashboard import build_dashboard, dashboard_listings, serialize_dashboard
+from .fragments import CACHE_ALIAS as FRAGMENT_CACHE, FragmentCache, fragments, listing_version, listing_versions
+from .pagination import SORTS, _page_queryset, encode_cursor, paginate
+from .profiling import QueryBudgetExceeded, percentile, profiles
+from .scheduler import AuctionScheduler, close_auctions
+from .search import parse_query, search
+from .sessions import WRITE_BEHIND, SessionStore
+from .benchmarks.bids import run_bid_stress
+from .benchmarks.load import parse_mix, run_load
+from .benchmarks.report import build_report
+from .benchmarks.seed import seed
+from .models import (
+    User, ArchivedBid, ArchivedComment, ArchivedListing, AuctionListing, Bid, BidRollup, Comment, Category, LedgerEvent, LedgerSnapshot, OutboxEvent, ProxyBid, SalesRollup,
+    TrendScore,
+)
+
+
+def create_listing(user, **kwargs):
+    fields = {
+        "title": "Listing",
+        "description": "Description",
+        "listed_by": user,
+        "initial_price": Decimal("10.00"),
+        "image_url": "https://example.com/image.png",
+    }
+    fields.update(kwargs)
+    return AuctionListing.objects.create(**fields)
+
+
+class BidStatsTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = create_listing(self.seller)
+
+    def test_new_listing_starts_at_initial_price(self):
+        self.assertEqual(self.listing.current_price, Decimal("10.00"))
+        self.assertEqual(self.listing.bid_count, 0)
+        self.assertIsNone(self.listing.highest_bid)
+
+    def test_bids_update_stats(self):
+        first = Bid.objects.create(user=self.bidder, auction=self.listing, amount=Decimal("12.00"))
+        Bid.objects.create(user=self.seller, auction=self.listing, amount=Decimal("11.00"))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal("12.00"))
+        self.assertEqual(self.listing.highest_bid, first)
+        self.assertEqual(self.listing.bid_count, 2)
+
+    def test_deleting_highest_bid_falls_back(self):
+        second = Bid.objects.create(user=self.bidder, auction=self.listing, amount=Decimal("11.00"))
+        first = Bid.objects.create(user=self.bidder, auction=self.listing, amount=Decimal("12.00"))
+        first.delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal("11.00"))
+        self.assertEqual(self.listing.highest_bid, second)
+        self.assertEqual(self.listing.bid_count, 1)
+
+        second.delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal("10.00"))
+        self.assertIsNone(self.listing.highest_bid)
+        self.assertEqual(self.listing.bid_count, 0)
+
+    def test_listing_save_keeps_bid_stats(self):
+        stale = AuctionListing.objects.get(pk=self.listing.pk)
+        Bid.objects.create(user=self.bidder, auction=self.listing, amount=Decimal("12.00"))
+        stale.title = "Renamed"
+        stale.save()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.title, "Renamed")
+        self.assertEqual(self.listing.current_price, Decimal("12.00"))
+        self.assertEqual(self.listing.bid_count, 1)
+
+    def test_repair_bid_stats(self):
+        Bid.objects.create(user=self.bidder, auction=self.listing, amount=Decimal("12.00"))
+        AuctionListing.objects.filter(pk=self.listing.pk).update(
+            current_price=Decimal("10.00"), highest_bid=None, bid_count=5
+        )
+        out = StringIO()
+        call_command("repair_bid_stats", stdout=out)
+        self.assertIn("Repaired 1 listing(s)", out.getvalue())
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal("12.00"))
+        self.assertEqual(self.listing.bid_count, 1)
+
+        out = StringIO()
+        call_command("repair_bid_stats", stdout=out)
+        self.assertIn("Repaired 0 listing(s)", out.getvalue())
+
+
+class PageQueriesTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.category = Category.objects.create(name="Books")
+
+    def add_listings(self, count):
+        for i in range(count):
+            listing = create_listing(self.seller, title=f"Listing {i}", category=self.category)
+            Bid.objects.create(user=self.bidder, auction=listing, amount=Decimal("20.00"))
+            Comment.objects.create(commented_by=self.bidder, auction=listing, comment_text="Nice")
+        return listing
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_index_queries_do_not_grow(self):
+        self.add_listings(2)
+        few = self.count_queries(reverse("index"))
+        self.add_listings(20)
+        self.assertEqual(self.count_queries(reverse("index")), few)
+
+    def test_listing_queries_do_not_grow(self):
+        self.client.force_login(self.bidder)
+        listing = self.add_listings(1)
+        url = reverse("listings", args=[listing.id])
+        few = self.count_queries(url)
+        for i in range(10):
+            Bid.objects.create(user=self.bidder, auction=listing, amount=Decimal(30 + i))
+            Comment.objects.create(commented_by=self.seller, auction=listing, comment_text="Thanks")
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_anonymous_visitors_are_not_winners(self):
+        listing = self.add_listings(1)
+        response = self.client.get(reverse("listings", args=[listing.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "You won this auction")
+
+    def test_watch_check_does_not_load_watchers(self):
+        self.client.force_login(self.bidder)
+        listing = self.add_listings(1)
+        listing.watchers.add(self.bidder)
+        url = reverse("listings", args=[listing.id])
+        # Fills the fragment cache
+        self.count_queries(url)
+        few = self.count_queries(url)
+        listing.watchers.add(*[User.objects.create_user(f"watcher{i}") for i in range(10)])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(len(context.captured_queries), few)
+        self.assertContains(response, "Unwatch")
+        # No query loads the watchers (users joined through the watchers table)
+        self.assertFalse(any('JOIN "auctions_auctionlisting_watchers"' in query["sql"] for query in context.captured_queries))
+
+    def test_dashboard_queries_do_not_grow(self):
+        self.client.force_login(self.bidder)
+        self.add_listings(2)
+        few = self.count_queries(reverse("dashboard"))
+        for listing in AuctionListing.objects.all():
+            listing.watchers.add(self.bidder)
+        self.add_listings(20)
+        self.assertEqual(self.count_queries(reverse("dashboard")), few)
+        self.assertEqual(self.count_queries(reverse("dashboard_json")), few)
+
+
+class DashboardTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="password")
+        self.user = User.objects.create_user("user", password="password")
+        self.rival = User.objects.create_user("rival", password="password")
+        self.leading = create_listing(self.seller, title="Leading")
+        Bid.objects.create(user=self.user, auction=self.leading, amount=Decimal("11.00"))
+        self.outbid = create_listing(self.seller, title="Outbid")
+        Bid.objects.create(user=self.user, auction=self.outbid, amount=Decimal("11.00"))
+        Bid.objects.create(user=self.user, auction=self.outbid, amount=Decimal("12.00"))
+        Bid.objects.create(user=self.rival, auction=self.outbid, amount=Decimal("15.00"))
+        self.won = create_listing(self.seller, title="Won", end_datetime=timezone.now() - timedelta(hours=1))
+        Bid.objects.create(user=self.user, auction=self.won, amount=Decimal("20.00"))
+        close_auctions([self.won.id])
+        self.watched = create_listing(self.seller, title="Watched")
+        self.watched.watchers.add(self.user)
+        # Not the user's business
+        create_listing(self.seller, title="Other").watchers.add(self.rival)
+
+    def test_sections(self):
+        dashboard = build_dashboard(self.user)
+        self.assertEqual(dashboard["watched"], [self.watched])
+        self.assertEqual(dashboard["bidding"], [self.leading, self.outbid])
+        self.assertEqual(dashboard["leading"], [self.leading])
+        self.assertEqual(dashboard["outbid"], [self.outbid])
+        self.assertEqual(dashboard["won"], [self.won])
+        outbid = dashboard["outbid"][0]
+        self.assertEqual((outbid.my_bid_count, outbid.my_top_bid), (2, Decimal("12.00")))
+        self.assertEqual([bid.amount for bid in outbid.my_bids], [Decimal("12.00"), Decimal("11.00")])
+
+    def test_json(self):
+        self.assertEqual(self.client.get(reverse("dashboard_json")).status_code, 403)
+        self.client.force_login(self.user)
+        data = self.client.get(reverse("dashboard_json")).json()
+        self.assertEqual(data["outbid"], [self.outbid.id])
+        self.assertEqual(data["won"], [self.won.id])
+        self.assertEqual(len(data["listings"]), 4)
+        outbid = next(listing for listing in data["listings"] if listing["id"] == self.outbid.id)
+        self.assertEqual(outbid["my_bids"], ["12.00", "11.00"])
+        self.assertEqual(outbid["current_price"], "15.00")
+
+    def test_no_full_scan(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("Query plans are only checked on SQLite")
+        plan = dashboard_listings(self.user).explain()
+        self.assertNotRegex(plan, r"\bSCAN auctions_auctionlisting\b", plan)
+
+
+class CatalogTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.books = Category.objects.create(name="Books")
+        self.games = Category.objects.create(name="Board & Card Games")
+
+    def stats(self, category):
+        category.refresh_from_db()
+        return category.active_count, category.min_price, category.max_price
+
+    def assertMatchesListings(self):
+        # The incrementally kept stats equal a full recalculation
+        stored = {c.pk: self.stats(c) for c in Category.objects.all()}
+        catalog.refresh_categories()
+        self.assertEqual({c.pk: self.stats(c) for c in Category.objects.all()}, stored)
+
+    def test_slugs(self):
+        self.assertEqual(self.games.slug, "board-card-games")
+        self.assertEqual(Category.objects.create(name="Board: Card Games").slug, "board-card-games-2")
+        # Renaming keeps the slug, links stay valid
+        self.books.name = "Old books"
+        self.books.save()
+        self.books.refresh_from_db()
+        self.assertEqual(self.books.slug, "books")
+
+    def test_stats_follow_listings(self):
+        cheap = create_listing(self.seller, category=self.books, initial_price=Decimal("5.00"))
+        create_listing(self.seller, category=self.books, initial_price=Decimal("50.00"))
+        create_listing(self.seller)
+        self.assertEqual(self.stats(self.books), (2, Decimal("5.00"), Decimal("50.00")))
+
+        # Moving the cheapest listing narrows the range of the old category
+        cheap.category = self.games
+        cheap.save()
+        self.assertEqual(self.stats(self.books), (1, Decimal("50.00"), Decimal("50.00")))
+        self.assertEqual(self.stats(self.games), (1, Decimal("5.00"), Decimal("5.00")))
+
+        # Bids and other edits leave the stats alone
+        bidding.place_bid(cheap.id, self.seller, Decimal("8.00"))
+        cheap.title = "Renamed"
+        cheap.save()
+        self.assertEqual(self.stats(self.games), (1, Decimal("5.00"), Decimal("5.00")))
+
+        cheap.end_datetime = timezone.now() - timedelta(minutes=1)
+        cheap.save()
+        self.assertEqual(close_auctions([cheap.id]), 1)
+        self.assertEqual(self.stats(self.games), (0, None, None))
+
+        AuctionListing.objects.filter(category=self.books).get().delete()
+        self.assertEqual(self.stats(self.books), (0, None, None))
+        self.assertMatchesListings()
+
+    def test_listings_loaded_without_the_catalog_fields(self):
+        listing = create_listing(self.seller, category=self.books)
+        listing = AuctionListing.objects.only("id", "title").get(pk=listing.pk)
+        listing.title = "Edited"
+        listing.save()
+        self.assertEqual(self.stats(self.books), (1, Decimal("10.00"), Decimal("10.00")))
+
+    def test_catalog_is_cached_until_a_change(self):
+        create_listing(self.seller, category=self.books)
+        first = catalog.get_catalog()
+        self.assertEqual([entry.name for entry in first], ["Board & Card Games", "Books"])
+        self.assertEqual(first.find("books").active_count, 1)
+        with self.assertNumQueries(0):
+            self.assertIs(catalog.get_catalog(), first)
+
+        create_listing(self.seller, category=self.books)
+        with self.assertNumQueries(1):
+            self.assertEqual(catalog.get_catalog().find("Books").active_count, 2)
+
+    def test_catalog_cache_must_be_shared(self):
+        self.assertEqual(checks.catalog_cache_check(None), [])
+        local = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        with override_settings(CACHES={**settings.CACHES, catalog.CACHE_ALIAS: local}):
+            self.assertEqual([error.id for error in checks.catalog_cache_check(None)], ["auctions.E004"])
+
+    def test_pages_read_the_catalog(self):
+        create_listing(self.seller, title="Atlas", category=self.books, initial_price=Decimal("7.50"))
+        catalog.get_catalog()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("categories", args=["all"]))
+        self.assertContains(response, reverse("categories", args=["books"]))
+        self.assertContains(response, "1 active")
+        self.assertContains(response, "$7.50")
+
+        # By slug, or by name for old links, the only query is the page of listings
+        for category in ("books", "Books"):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse("categories", args=[category]))
+            self.assertContains(response, "Atlas")
+        self.assertContains(self.client.get(reverse("categories", args=["nope"])), "Category not found")
+
+    def test_new_listing_form(self):
+        self.client.force_login(self.seller)
+        catalog.get_catalog()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("new"))
+        self.assertContains(response, "Board &amp; Card Games")
+        self.assertFalse(any("auctions_category" in query["sql"] for query in context.captured_queries))
+
+        response = self.client.post(reverse("new"), {
+            "title": "Chess set",
+            "description": "Wooden",
+            "end_datetime": (timezone.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S"),
+            "initial_price": "30.00",
+            "image_url": "https://example.com/chess.png",
+            "category": self.games.id,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stats(self.games), (1, Decimal("30.00"), Decimal("30.00")))
+
+    def test_refresh_command(self):
+        create_listing(self.seller, category=self.books)
+        Category.objects.filter(pk=self.books.pk).update(active_count=7)
+        out = StringIO()
+        call_command("refresh_category_stats", stdout=out)
+        self.assertIn("Repaired 1 category(ies)", out.getvalue())
+        self.assertEqual(self.stats(self.books)[0], 1)
+
+
+class LedgerTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "password")
+        self.listing = create_listing(self.seller)
+
+    def kinds(self):
+        return list(self.listing.ledger.order_by("id").values_list("kind", flat=True))
+
+    def bid(self, user, amount):
+        return Bid.objects.create(auction=self.listing, user=user, amount=Decimal(amount))
+
+    def test_bids_are_recorded(self):
+        bidding.place_bid(self.listing.id, self.alice, Decimal("11.00"))
+        bidding.place_bid(self.listing.id, self.bob, Decimal("12.00"))
+        Bid.objects.get(user=self.bob).delete()
+        self.assertEqual(self.kinds(), [ledger.PLACED, ledger.PLACED, ledger.RETRACTED])
+        times = list(self.listing.ledger.order_by("id").values_list("recorded_at", flat=True))
+        self.assertEqual(times, sorted(times))
+
+        state = ledger.auction_state(self.listing.id)
+        self.assertEqual(state.price, Decimal("11.00"))
+        self.assertEqual(state.leader[2], self.alice.id)
+        self.assertEqual(state.bid_count, 1)
+        with self.assertRaises(ValueError):
+            self.listing.ledger.first().save()
+
+    def test_close_and_winner(self):
+        bidding.place_bid(self.listing.id, self.alice, Decimal("11.00"))
+        AuctionListing.objects.filter(pk=self.listing.pk).update(end_datetime=timezone.now() - timedelta(minutes=1))
+        close_auctions([self.listing.id])
+        self.assertEqual(self.kinds(), [ledger.PLACED, ledger.CLOSED, ledger.WINNER_SET])
+        state = ledger.auction_state(self.listing.id)
+        self.assertIsNotNone(state.closed_at)
+        self.assertEqual(state.winner_id, self.alice.id)
+
+    def test_snapshot_and_tail_match_replay(self):
+        bids = [self.bid(self.alice if number % 2 else self.bob, f"{11 + number}.00") for number in range(30)]
+        ledger.auction_state(self.listing.id, snapshot_every=10)
+        self.assertEqual(LedgerSnapshot.objects.filter(auction=self.listing).count(), 1)
+
+        bids.append(self.bid(self.alice, "100.00"))
+        bids[3].delete()
+        state = ledger.auction_state(self.listing.id, snapshot_every=10)
+        replayed = ledger.replay(self.listing.id)
+        self.assertEqual((state.leader, state.bid_count), (replayed.leader, replayed.bid_count))
+        self.assertEqual(state.price, Decimal("100.00"))
+
+        # More bids retracted than the snapshot keeps, the state is replayed from the start
+        for bid in bids[10:]:
+            bid.delete()
+        state = ledger.auction_state(self.listing.id, snapshot_every=1000)
+        self.assertEqual(state.price, Decimal("20.00"))
+        self.assertEqual(state.bid_count, ledger.replay(self.listing.id).bid_count)
+
+    def test_bids_below_the_cut_are_not_lost(self):
+        bids = [self.bid(self.alice if number % 2 else self.bob, f"{number}.00") for number in range(1, 18)]
+        bids.pop().delete()
+        low = self.bid(self.alice, "0.50")
+        ledger.auction_state(self.listing.id, snapshot_every=0)
+        for bid in bids[1:]:
+            bid.delete()
+        # The 1.00 bid was cut from the snapshot, it still leads over the 0.50 placed afterwards
+        state = ledger.auction_state(self.listing.id)
+        self.assertEqual(state.leader[1], bids[0].id)
+        self.assertEqual(state.price, Decimal("1.00"))
+        self.assertEqual(state.bid_count, 2)
+        self.assertEqual(ledger.replay(self.listing.id).top[1][1], low.id)
+
+    def test_snapshot_command(self):
+        for number in range(5):
+            self.bid(self.alice, f"{11 + number}.00")
+        out = StringIO()
+        call_command("snapshot_ledgers", min_events=5, stdout=out)
+        self.assertIn("Saved snapshots of 1 auction(s)", out.getvalue())
+        self.assertEqual(ledger.latest_snapshot(self.listing.id).bid_count, 5)
+        self.assertEqual(ledger.snapshots_due(5), [])
+
+    def test_history_endpoint(self):
+        first = self.bid(self.alice, "11.00")
+        self.bid(self.bob, "12.00")
+        url = reverse("api:history", args=[self.listing.id])
+
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        events = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([event["amount"] for event in events], ["11.00", "12.00"])
+        self.assertEqual({event["user"] for event in events}, {None})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.bid(self.alice, "13.00")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+        self.client.force_login(self.seller)
+        response = self.client.get(url, {"after": LedgerEvent.objects.get(bid_id=first.id).id})
+        events = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([event["user"] for event in events], ["bob", "alice"])
+
+        self.assertEqual(self.client.get(reverse("api:history", args=[self.listing.id + 100])).status_code, 404)
+
+
+class PlaceBidTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = create_listing(self.seller)
+
+    def test_placed(self):
+        result = bidding.place_bid(self.listing.id, self.bidder, "12.50")
+        self.assertEqual(result.status, bidding.PLACED)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal("12.50"))
+        self.assertEqual(self.listing.highest_bid, result.bid)
+
+    def test_too_low(self):
+        result = bidding.place_bid(self.listing.id, self.bidder, "10.00")
+        self.assertEqual(result.status, bidding.TOO_LOW)
+        self.assertFalse(Bid.objects.exists())
+
+    def test_outbid_while_bidding(self):
+        bidding.place_bid(self.listing.id, self.seller, "15.00")
+        result = bidding.place_bid(self.listing.id, self.bidder, "12.00", seen_price="10.00")
+        self.assertEqual(result.status, bidding.OUTBID)
+        self.assertEqual(result.current_price, Decimal("15.00"))
+        self.assertEqual(Bid.objects.count(), 1)
+
+    def test_closed(self):
+        AuctionListing.objects.filter(pk=self.listing.pk).update(end_datetime=timezone.now())
+        result = bidding.place_bid(self.listing.id, self.bidder, "20.00")
+        self.assertEqual(result.status, bidding.CLOSED)
+
+    def test_view_reports_outbid(self):
+        self.client.force_login(self.bidder)
+        bidding.place_bid(self.listing.id, self.seller, "15.00")
+        response = self.client.post(reverse("listings", args=[self.listing.id]), {"amount": "12.00", "seen_price": "10.00"})
+        self.assertContains(response, "Someone outbid you while you were bidding.")
+
+
+class ProxyBiddingTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "password")
+        self.listing = create_listing(self.seller)
+
+    def price_and_leader(self):
+        self.listing.refresh_from_db()
+        return self.listing.current_price, self.listing.highest_bid.user
+
+    def test_increments(self):
+        self.assertEqual(proxy.increment(Decimal("0.50")), Decimal("0.05"))
+        self.assertEqual(proxy.increment(Decimal("1.00")), Decimal("0.25"))
+        self.assertEqual(proxy.increment(Decimal("24.99")), Decimal("0.50"))
+        self.assertEqual(proxy.increment(Decimal("10000")), Decimal("100.00"))
+
+    def test_book(self):
+        book = proxy.ProxyBook([(1, Decimal("50"), 1), (2, Decimal("30"), 2)])
+        self.assertEqual(book.resolve(Decimal("10")), (1, Decimal("31.00")))
+        # Capped at the leader's maximum
+        book.set(2, Decimal("49.80"), 3)
+        self.assertEqual(book.resolve(Decimal("10")), (1, Decimal("50")))
+        # Equal maximums, the earlier wins at the maximum
+        book.set(2, Decimal("50"), 4)
+        self.assertEqual(book.resolve(Decimal("10")), (1, Decimal("50")))
+        book.set(2, Decimal("60"), 5)
+        self.assertEqual(book.resolve(Decimal("10")), (2, Decimal("51.00")))
+        # The holder only moves when pushed
+        self.assertIsNone(proxy.ProxyBook([(2, Decimal("60"), 5)]).resolve(Decimal("51.00"), holder_id=2))
+
+    def test_single_maximum(self):
+        result = bidding.set_max_bid(self.listing.id, self.alice, "50.00")
+        self.assertEqual(result.status, bidding.PLACED)
+        self.assertEqual(self.price_and_leader(), (Decimal("10.50"), self.alice))
+        # Raising it while leading doesn't bid
+        self.assertEqual(bidding.set_max_bid(self.listing.id, self.alice, "80.00").status, bidding.PLACED)
+        self.assertEqual(Bid.objects.count(), 1)
+
+    def test_competing_maximums(self):
+        bidding.set_max_bid(self.listing.id, self.alice, "50.00")
+        result = bidding.set_max_bid(self.listing.id, self.bob, "30.00")
+        self.assertEqual((result.status, result.current_price), (bidding.PROXY_OUTBID, Decimal("31.00")))
+        self.assertEqual(self.price_and_leader(), (Decimal("31.00"), self.alice))
+
+        # A tie goes to the earlier maximum
+        result = bidding.set_max_bid(self.listing.id, self.bob, "50.00")
+        self.assertEqual(result.status, bidding.PROXY_OUTBID)
+        self.assertEqual(self.price_and_leader(), (Decimal("50.00"), self.alice))
+
+        result = bidding.set_max_bid(self.listing.id, self.bob, "75.00")
+        self.assertEqual(result.status, bidding.PLACED)
+        self.assertEqual(self.price_and_leader(), (Decimal("51.00"), self.bob))
+        self.assertEqual(Bid.objects.count(), 4)
+
+    def test_bid_answered_by_maximum(self):
+        bidding.set_max_bid(self.listing.id, self.alice, "50.00")
+        result = bidding.place_bid(self.listing.id, self.bob, "20.00")
+        self.assertEqual((result.status, result.current_price), (bidding.PROXY_OUTBID, Decimal("20.50")))
+        self.assertEqual(self.price_and_leader(), (Decimal("20.50"), self.alice))
+        # Bidding past the maximum wins
+        self.assertEqual(bidding.place_bid(self.listing.id, self.bob, "60.00").status, bidding.PLACED)
+        self.assertEqual(self.price_and_leader(), (Decimal("60.00"), self.bob))
+
+    def test_many_maximums_one_bid(self):
+        users = User.objects.bulk_create([User(username=f"bidder{number}") for number in range(500)])
+        ProxyBid.objects.bulk_create([
+            ProxyBid(auction=self.listing, user=user, max_amount=Decimal(20 + number))
+            for number, user in enumerate(users)
+        ])
+        result = bidding.set_max_bid(self.listing.id, self.alice, "1000.00")
+        self.assertEqual(result.status, bidding.PLACED)
+        self.assertEqual(self.price_and_leader(), (Decimal("529.00"), self.alice))
+        self.assertEqual(Bid.objects.count(), 1)
+
+    def test_view_sets_maximum(self):
+        self.client.force_login(self.alice)
+        response = self.client.post(reverse("listings", args=[self.listing.id]), {"amount": "40.00", "proxy": "on"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.price_and_leader(), (Decimal("10.50"), self.alice))
+
+
+class NotificationsTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "password")
+        self.carol = User.objects.create_user("carol", "carol@example.com", "password")
+        self.dave = User.objects.create_user("dave", "", "password")
+        self.listing = create_listing(self.seller, title="Chess set")
+        self.listing.watchers.add(self.carol, self.dave)
+
+    def process(self):
+        # Far enough ahead that the window of every event is over
+        return notifications.process_outbox(now=timezone.now() + timedelta(hours=1))
+
+    def mail_to(self, user):
+        return [message for message in mail.outbox if message.to == [user.email]]
+
+    def test_written_with_the_bid(self):
+        bidding.place_bid(self.listing.id, self.alice, "11.00")
+        bidding.place_bid(self.listing.id, self.bob, "10.50")
+        self.assertEqual(list(OutboxEvent.objects.values_list("kind", "actor", "amount")), [
+            (notifications.BID, self.alice.id, Decimal("11.00")),
+        ])
+        # The event of a rolled back bid goes with it
+        with transaction.atomic():
+            bidding.place_bid(self.listing.id, self.bob, "12.00")
+            transaction.set_rollback(True)
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_batched_and_deduplicated(self):
+        bidding.place_bid(self.listing.id, self.alice, "11.00")
+        bidding.place_bid(self.listing.id, self.bob, "12.00")
+        bidding.place_bid(self.listing.id, self.alice, "13.00")
+        result = self.process()
+        self.assertEqual((result["events"], result["messages"], result["skipped"]), (3, 2, 1))
+
+        [message] = self.mail_to(self.carol)
+        self.assertEqual(message.subject, "Chess set: 3 new bids, the price is now $13.00")
+        self.assertEqual(len(self.mail_to(self.bob)), 1)
+        # Alice made the latest bid herself
+        self.assertEqual(self.mail_to(self.alice), [])
+
+        self.assertEqual(self.process()["events"], 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_waits_for_the_window(self):
+        bidding.place_bid(self.listing.id, self.alice, "11.00")
+        event = OutboxEvent.objects.get()
+        self.assertEqual(notifications.process_outbox(now=event.created_at)["events"], 0)
+        self.assertEqual(notifications.outbox_metrics()["depth"], 1)
+        self.process()
+        metrics = notifications.outbox_metrics()
+        self.assertEqual(metrics["depth"], 0)
+        self.assertGreater(metrics["lag_p50"], 0)
+
+    def test_claimed_in_bounded_batches(self):
+        bidding.place_bid(self.listing.id, self.alice, "11.00")
+        bidding.place_bid(self.listing.id, self.bob, "12.00")
+        bidding.place_bid(self.listing.id, self.alice, "13.00")
+        first = OutboxEvent.objects.order_by("id").first()
+        OutboxEvent.objects.filter(pk=first.pk).update(created_at=first.created_at - timedelta(hours=1))
+        connection_depth = len(connection.atomic_blocks)
+
+        class Backend(mail.backends.locmem.EmailBackend):
+            def send_messages(backend, messages):
+                # Claims are committed before the emails go out
+                self.assertEqual(len(connection.atomic_blocks), connection_depth)
+                return super().send_messages(messages)
+        result = notifications.process_outbox(now=timezone.now() + timedelta(hours=1), connection=Backend(), limit=2)
+        self.assertEqual(result["events"], 3)
+        # The window cut by the first claim is sent whole by the second one
+        self.assertEqual([message.subject for message in self.mail_to(self.carol)], [
+            "Chess set: a new bid, the price is now $11.00",
+            "Chess set: 2 new bids, the price is now $13.00",
+        ])
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_failed_batch_is_released(self):
+        bidding.place_bid(self.listing.id, self.alice, "11.00")
+        failing = mock.Mock(send_messages=mock.Mock(side_effect=OSError("SMTP down")))
+        with self.assertRaises(OSError):
+            notifications.process_outbox(now=timezone.now() + timedelta(hours=1), connection=failing)
+        self.assertEqual(list(OutboxEvent.objects.values_list("claimed_at", "processed_at")), [(None, None)])
+        self.assertEqual(self.process()["events"], 1)
+
+    def test_unlisted_with_winner(self):
+        bidding.place_bid(self.listing.id, self.alice, "11.00")
+        self.client.force_login(self.seller)
+        self.client.get(reverse("listings", args=[self.listing.id]), {"unlist": "true"})
+        self.assertEqual(OutboxEvent.objects.filter(kind=notifications.UNLISTED, actor=self.seller).count(), 1)
+        self.process()
+        self.assertEqual(self.mail_to(self.alice)[0].subject, "Chess set: the seller closed the auction, you won!")
+        self.assertEqual(self.mail_to(self.carol)[0].subject, "Chess set: the seller closed the auction")
+        self.assertEqual(self.mail_to(self.seller), [])
+
+    def test_command(self):
+        bidding.place_bid(self.listing.id, self.alice, "11.00")
+        out = StringIO()
+        call_command("send_notifications", stats=True, stdout=out)
+        self.assertIn("Queue depth 1", out.getvalue())
+
+
+# One process, the local memory cache is shared enough
+@override_settings(
+    SESSION_ENGINE="auctions.sessions",
+    AUTHENTICATION_BACKENDS=["auctions.auth.CachedModelBackend", "django.contrib.auth.backends.ModelBackend"],
+)
+class SessionsTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("alice", "alice@example.com", "password")
+        self.client.force_login(self.user)
+
+    def queries_of(self, url, table):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query["sql"] for query in context.captured_queries if f'FROM "{table}"' in query["sql"]]
+
+    def test_no_session_or_user_queries(self):
+        self.assertEqual(self.queries_of(reverse("index"), "django_session"), [])
+        self.assertEqual(self.queries_of(reverse("index"), "auctions_user"), [])
+
+    def test_user_cache_invalidated(self):
+        self.user.first_name = "Alice"
+        self.user.save()
+        self.assertEqual(len(self.queries_of(reverse("dashboard"), "auctions_user")), 1)
+        self.assertEqual(self.queries_of(reverse("dashboard"), "auctions_user"), [])
+        # A new password logs the old session out
+        self.user.set_password("another password")
+        self.user.save()
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_write_behind(self):
+        def stored():
+            return Session.objects.get(session_key=store.session_key).get_decoded()
+
+        store = SessionStore()
+        store["step"] = 1
+        store.save()
+        store["step"] = 2
+        store.save()
+        self.assertEqual(stored()["step"], 1)
+        self.assertEqual(SessionStore(store.session_key)["step"], 2)
+
+        # Logging in is written through
+        store["_auth_user_id"] = str(self.user.pk)
+        store.save()
+        self.assertEqual(stored()["step"], 2)
+
+        store["step"] = 3
+        with mock.patch("auctions.sessions.time.time", return_value=time.time() + WRITE_BEHIND):
+            store.save()
+        self.assertEqual(stored()["step"], 3)
+
+    def test_needs_a_shared_cache(self):
+        self.assertEqual([error.id for error in checks.session_cache_check(None)], ["auctions.E002", "auctions.E003"])
+        with override_settings(
+            SESSION_ENGINE="django.contrib.sessions.backends.db",
+            AUTHENTICATION_BACKENDS=["django.contrib.auth.backends.ModelBackend"],
+        ):
+            self.assertEqual(checks.session_cache_check(None), [])
+
+
+class RateLimitTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = create_listing(self.seller)
+        self.now = [1000.0]
+        self.buckets = ratelimit.LocalBuckets()
+        self.buckets.clock = lambda: self.now[0]
+        self.async_client.force_login(self.bidder)
+
+    def test_burst_and_refill(self):
+        limiter = ratelimit.Limiter(self.buckets, limits={"bid": (1, 3)}, capacity=(100, 100))
+        decisions = [limiter.admit("bid", "u1", 1) for _ in range(4)]
+        self.assertEqual([decision.allowed for decision in decisions], [True, True, True, False])
+        self.assertAlmostEqual(decisions[-1].retry_after, 1.0)
+        # Other users and listings have their own buckets
+        self.assertTrue(limiter.admit("bid", "u2", 1).allowed)
+        self.assertTrue(limiter.admit("bid", "u1", 2).allowed)
+        self.now[0] += 1
+        self.assertTrue(limiter.admit("bid", "u1", 1).allowed)
+        self.assertFalse(limiter.admit("bid", "u1", 1).allowed)
+        self.assertEqual(limiter.counters(), {"bid.accepted": 6, "bid.shed": 2})
+
+    def test_bids_keep_the_reserve(self):
+        limiter = ratelimit.Limiter(self.buckets, capacity=(1, 10), reserve=0.5)
+        watches = [limiter.admit("watch", f"u{number}", 1).allowed for number in range(10)]
+        # Watches stop at half of the shared bucket, bids get the rest
+        self.assertEqual(watches.count(True), 5)
+        bids = [limiter.admit("bid", f"u{number}", 1).allowed for number in range(10)]
+        self.assertEqual(bids.count(True), 5)
+        # A shed request doesn't spend the user's own tokens
+        self.now[0] += 5
+        self.assertTrue(all(limiter.admit("bid", "u9", 1).allowed for _ in range(5)))
+
+    def test_cache_buckets(self):
+        buckets = ratelimit.CacheBuckets()
+        buckets.clock = lambda: self.now[0]
+        buckets.reset()
+        limiter = ratelimit.Limiter(buckets, limits={"comment": (1, 2)}, capacity=(100, 100))
+        self.assertEqual([limiter.admit("comment", "cache-test", 1).allowed for _ in range(3)], [True, True, False])
+        self.assertEqual(limiter.counters(), {"comment.accepted": 2, "comment.shed": 1})
+
+    def test_shed_before_database(self):
+        self.client.force_login(self.bidder)
+        url = reverse("listings", args=[self.listing.id])
+        with mock.patch.dict(ratelimit.LIMITS, {"watch": (0.001, 1), "bid": (0.001, 1)}):
+            self.assertEqual(self.client.get(url, {"watch": "true"}).status_code, 302)
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, {"watch": "false"})
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(context.captured_queries, [])
+            self.assertGreater(int(response["Retry-After"]), 0)
+            # Bids have their own lane
+            self.assertEqual(self.client.post(url, {"amount": "11.00"}).status_code, 302)
+            self.assertEqual(self.client.post(url, {"amount": "12.00"}).status_code, 429)
+        self.assertTrue(self.listing.watchers.filter(pk=self.bidder.pk).exists())
+        self.assertEqual(self.listing.bids.count(), 1)
+        # Reading the page isn't limited
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(ROOT_URLCONF="auctions.async_urls")
+    async def test_bid_endpoint_answers_json(self):
+        url = reverse("bid", args=[self.listing.id])
+        with mock.patch.dict(ratelimit.LIMITS, {"bid": (0.001, 1)}):
+            self.assertEqual((await self.async_client.post(url, {"amount": "11.00"})).status_code, 201)
+            response = await self.async_client.post(url, {"amount": "12.00"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["status"], "rate_limited")
+
+    def test_watch_doesnt_save_listing(self):
+        self.client.force_login(self.bidder)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse("listings", args=[self.listing.id]), {"watch": "true"})
+        # Only the watcher count is updated, not every field of the listing
+        saves = [query for query in context.captured_queries if 'SET "title"' in query["sql"]]
+        self.assertEqual(saves, [])
+        self.assertTrue(self.listing.watchers.filter(pk=self.bidder.pk).exists())
+
+
+class AnalyticsTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.books = Category.objects.create(name="Books")
+        self.listing = create_listing(self.seller, category=self.books)
+        self.other = create_listing(self.seller)
+
+    def rollups(self):
+        return (
+            sorted(BidRollup.objects.values_list("hour", "category", "bids", "volume"), key=str),
+            sorted(SalesRollup.objects.values_list("hour", "category", "closed", "sold", "revenue"), key=str),
+            sorted(AuctionListing.objects.values_list("pk", "watcher_count")),
+        )
+
+    def close(self, *listings):
+        AuctionListing.objects.filter(pk__in=[listing.pk for listing in listings]).update(end_datetime=timezone.now())
+        close_auctions([listing.pk for listing in listings])
+
+    def test_bids_and_sales(self):
+        bidding.place_bid(self.listing.id, self.bidder, "12.00")
+        bidding.place_bid(self.listing.id, self.seller, "15.00")
+        bidding.place_bid(self.other.id, self.bidder, "11.00")
+        hour = analytics.hour_of(timezone.now())
+        self.assertEqual(
+            sorted(BidRollup.objects.values_list("category", "bids", "volume"), key=str),
+            [(self.books.pk, 2, Decimal("27.00")), (None, 1, Decimal("11.00"))],
+        )
+        self.assertEqual(set(BidRollup.objects.values_list("hour", flat=True)), {hour})
+
+        unsold = create_listing(self.seller, category=self.books)
+        self.close(self.listing, self.other, unsold)
+        report = analytics.build_report()
+        books = next(row for row in report["categories"] if row["id"] == self.books.pk)
+        self.assertEqual((books["bids"], books["closed"], books["sold"]), (2, 2, 1))
+        self.assertEqual(books["average_price"], Decimal("15.00"))
+        self.assertEqual(books["sell_through"], 0.5)
+        self.assertEqual(report["totals"]["sold"], 2)
+        self.assertEqual(report["bids_per_hour"][-1]["bids"], 3)
+        self.assertEqual(len(report["bids_per_hour"]), analytics.HOURS)
+
+    def test_watcher_counts(self):
+        carol = User.objects.create_user("carol", "carol@example.com", "password")
+        self.listing.watchers.add(self.bidder, carol)
+        self.other.watchers.add(self.bidder)
+        self.listing.watchers.remove(carol)
+        # Removing someone who isn't watching changes nothing
+        self.listing.watchers.remove(carol)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.watcher_count, 1)
+        # Saving the listing doesn't write the count it was loaded with
+        AuctionListing.objects.get(pk=self.listing.pk).watchers.add(carol)
+        self.listing.title = "Renamed"
+        self.listing.save()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.watcher_count, 2)
+        self.assertEqual([row["id"] for row in analytics.build_report()["top_watched"]], [self.listing.pk, self.other.pk])
+
+        self.bidder.watchlist.clear()
+        carol.delete()
+        self.assertEqual(list(AuctionListing.objects.values_list("watcher_count", flat=True)), [0, 0])
+
+    def test_backfill_matches_live_rollups(self):
+        self.listing.watchers.add(self.bidder)
+        bidding.place_bid(self.listing.id, self.bidder, "12.00")
+        bidding.place_bid(self.other.id, self.bidder, "11.00")
+        self.close(self.listing)
+        live_rollups = self.rollups()
+        AuctionListing.objects.update(watcher_count=0)
+        BidRollup.objects.update(bids=0)
+
+        out = StringIO()
+        call_command("backfill_analytics", batch_size=1, stdout=out, stderr=StringIO())
+        self.assertIn("Rolled up 2 bid(s) and 1 closed auction(s)", out.getvalue())
+        self.assertEqual(self.rollups(), live_rollups)
+
+    def test_edits_and_deletes(self):
+        first = Bid.objects.create(auction=self.listing, user=self.bidder, amount=Decimal("12.00"))
+        second = Bid.objects.create(auction=self.listing, user=self.seller, amount=Decimal("15.00"))
+        first.amount = Decimal("13.00")
+        first.save()
+        second.amount = Decimal("14.50")
+        second.save()
+        self.assertEqual(list(BidRollup.objects.values_list("bids", "volume")), [(2, Decimal("27.50"))])
+        second.delete()
+        self.assertEqual(list(BidRollup.objects.values_list("bids", "volume")), [(1, Decimal("13.00"))])
+        live_rollups = self.rollups()
+
+        # Built again from the ledger, the numbers are the same
+        BidRollup.objects.update(bids=5)
+        analytics.backfill()
+        self.assertEqual(self.rollups(), live_rollups)
+
+    def test_failed_backfill_keeps_the_rollups(self):
+        bidding.place_bid(self.listing.id, self.bidder, "12.00")
+        live_rollups = self.rollups()
+
+        def interrupt(name, count):
+            self.assertEqual(self.rollups()[0], live_rollups[0])
+            raise RuntimeError("Interrupted")
+
+        with self.assertRaises(RuntimeError):
+            analytics.backfill(report=interrupt)
+        self.assertEqual(self.rollups(), live_rollups)
+
+    def test_report_reads_rollups_only(self):
+        bidding.place_bid(self.listing.id, self.bidder, "12.00")
+        analytics.build_report()
+        with CaptureQueriesContext(connection) as context:
+            analytics.build_report(days=7)
+        self.assertEqual(len(context.captured_queries), 4)
+        for query in context.captured_queries:
+            self.assertNotIn('"auctions_bid"', query["sql"])
+            self.assertNotIn('"auctions_auctionlisting_watchers"', query["sql"])
+
+    def test_staff_only(self):
+        self.client.force_login(self.bidder)
+        self.assertEqual(self.client.get(reverse("analytics_json")).status_code, 403)
+        self.assertEqual(self.client.get(reverse("analytics")).status_code, 302)
+        self.bidder.is_staff = True
+        self.bidder.save()
+        response = self.client.get(reverse("analytics_json"), {"days": "7"})
+        self.assertEqual(response.json()["days"], 7)
+        self.assertEqual(self.client.get(reverse("analytics")).status_code, 200)
+
+
+class ArchiveTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.watcher = User.objects.create_user("watcher", "watcher@example.com", "password")
+        self.books = Category.objects.create(name="Books")
+        self.old = create_listing(self.seller, category=self.books, title="Old auction")
+        bidding.place_bid(self.old.id, self.bidder, "12.00")
+        bidding.place_bid(self.old.id, self.bidder, "14.00")
+        Comment.objects.create(commented_by=self.watcher, auction=self.old, comment_text="Still want it")
+        self.old.watchers.add(self.watcher)
+        self.close(self.old, days=100)
+        self.recent = create_listing(self.seller, category=self.books, title="Recent auction")
+        self.close(self.recent, days=10)
+        self.open = create_listing(self.seller, title="Open auction")
+
+    def close(self, listing, days):
+        ended = timezone.now() - timedelta(days=days)
+        AuctionListing.objects.filter(pk=listing.pk).update(end_datetime=ended)
+        close_auctions([listing.pk], ended)
+
+    def test_moves_old_closed_auctions(self):
+        events = LedgerEvent.objects.filter(auction_id=self.old.pk).count()
+        self.assertEqual(archive.archive_auctions(batch_size=1), 1)
+        self.assertEqual(set(AuctionListing.objects.values_list("title", flat=True)), {"Recent auction", "Open auction"})
+        archived = ArchivedListing.objects.get(pk=self.old.pk)
+        self.assertEqual((archived.title, archived.winner_id, archived.category_id), ("Old auction", self.bidder.pk, self.books.pk))
+        self.assertEqual((archived.current_price, archived.bid_count), (Decimal("14.00"), 2))
+        self.assertEqual(archived.watcher_ids, [self.watcher.pk])
+        self.assertEqual(ArchivedBid.objects.filter(auction=archived).count(), 2)
+        self.assertEqual(ArchivedComment.objects.get().comment_text, "Still want it")
+
+        # Nothing of it is left in the live tables, the ledger keeps its history as it was
+        self.assertFalse(Bid.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(self.watcher.watchlist.exists())
+        self.assertEqual(LedgerEvent.objects.filter(auction_id=self.old.pk).count(), events)
+        self.assertEqual(archive.archive_auctions(), 0)
+
+    def test_dry_run_and_age(self):
+        out = StringIO()
+        call_command("archive_auctions", "--dry-run", stdout=out)
+        self.assertIn("1 auction(s)", out.getvalue())
+        self.assertEqual(ArchivedListing.objects.count(), 0)
+        call_command("archive_auctions", "--days", "5", stdout=out, stderr=StringIO())
+        self.assertEqual(set(ArchivedListing.objects.values_list("title", flat=True)), {"Old auction", "Recent auction"})
+
+    def test_resumes_a_stopped_run(self):
+        # Stopped while deleting: the whole batch stays live
+        with mock.patch.object(archive, "_delete", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                archive.archive_auctions()
+        self.assertTrue(AuctionListing.objects.filter(pk=self.old.pk).exists())
+        # Copied but not deleted yet (another archive database committed first)
+        archive._copy([self.old.pk])
+        self.assertEqual(archive.archive_auctions(), 1)
+        self.assertEqual(ArchivedBid.objects.count(), 2)
+        self.assertFalse(AuctionListing.objects.filter(pk=self.old.pk).exists())
+
+    def test_listing_page_reads_the_archive(self):
+        archive.archive_auctions()
+        self.client.force_login(self.bidder)
+        response = self.client.get(reverse("listings", args=[self.old.id]))
+        self.assertTemplateUsed(response, "auctions/archived_listing.html")
+        self.assertContains(response, "Old auction")
+        self.assertContains(response, "Still want it")
+        self.assertContains(response, "You won this auction")
+        response = self.client.get(reverse("listings", args=[self.open.id + 100]))
+        self.assertContains(response, "Error 404")
+
+    def test_dashboard_lists_archived_wins(self):
+        live_win = create_listing(self.seller, title="Live win")
+        bidding.place_bid(live_win.id, self.bidder, "20.00")
+        self.close(live_win, days=1)
+        archive.archive_auctions()
+
+        dashboard = build_dashboard(self.bidder)
+        self.assertEqual([listing.title for listing in dashboard["won"]], ["Live win", "Old auction"])
+        data = serialize_dashboard(dashboard)
+        won = next(listing for listing in data["listings"] if listing["id"] == self.old.pk)
+        self.assertEqual((won["category"], won["my_bid_count"]), ("Books", 2))
+        self.assertEqual(Decimal(won["my_top_bid"]), Decimal("14.00"))
+        self.assertEqual(won["my_bids"], ["14.00", "12.00"])
+        self.assertFalse(won["watching"])
+
+        self.client.force_login(self.bidder)
+        self.assertContains(self.client.get(reverse("dashboard")), "Old auction")
+
+    @override_settings(ROOT_URLCONF="auctions.async_urls")
+    async def test_async_listing_page_reads_the_archive(self):
+        await sync_to_async(archive.archive_auctions)()
+        response = await self.async_client.get(reverse("listings", args=[self.old.id]))
+        self.assertContains(response, "Old auction")
+        self.assertContains(response, "Still want it")
+
+
+class FeedsTestCase(TestCase):
+
+    def setUp(self):
+        feeds.clear()
+        self.now = timezone.now()
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidders = [User.objects.create_user(f"bidder{number}") for number in range(4)]
+        self.listings = [
+            create_listing(self.seller, title=f"Listing {number}", end_datetime=self.now + timedelta(hours=12 - number))
+            for number in range(8)
+        ]
+
+    def tearDown(self):
+        feeds.clear()
+
+    def bid(self, bids):
+        # (listing, hours ago) pairs, placed through the bid service in that order
+        prices = defaultdict(lambda: Decimal("10.00"))
+        times = [self.now - timedelta(hours=hours) for _, hours in bids]
+        with mock.patch.object(ledger, "now", side_effect=times):
+            for number, (listing, _) in enumerate(bids):
+                prices[listing.pk] += 1
+                result = bidding.place_bid(listing.pk, self.bidders[number % 4], prices[listing.pk])
+                self.assertTrue(result.placed)
+
+    def brute_force_trending(self):
+        # Every placed bid of the ledger decayed to now, summed per open listing
+        heat = defaultdict(float)
+        for auction_id, recorded_at in LedgerEvent.objects.filter(kind=LedgerEvent.PLACED).values_list("auction_id", "recorded_at"):
+            heat[auction_id] += 0.5 ** ((self.now - recorded_at).total_seconds() / feeds.HALF_LIFE)
+        open_ids = set(AuctionListing.objects.filter(end_datetime__gt=self.now, closed_at__isnull=True).values_list("pk", flat=True))
+        ranked = sorted((-value, pk) for pk, value in heat.items() if pk in open_ids and value >= 2 ** -feeds.HORIZON)
+        return [(pk, -value) for value, pk in ranked]
+
+    def assertMatchesBruteForce(self, feed):
+        expected = self.brute_force_trending()
+        self.assertEqual([entry.id for entry in feed.entries], [pk for pk, _ in expected])
+        for entry, (_, value) in zip(feed.entries, expected):
+            self.assertAlmostEqual(entry.heat, value, places=9)
+
+    def test_stale_feed_cards_stay_out_of_the_pages(self):
+        listing = create_listing(self.seller, title="Lamp", initial_price=Decimal("5.00"), end_datetime=self.now + timedelta(minutes=30))
+        bidding.place_bid(listing.pk, self.bidders[0], "6.00")
+        self.assertContains(self.client.get(reverse("feed", args=[feeds.ENDING])), "Price: $6.00")
+        bidding.place_bid(listing.pk, self.bidders[1], "9.00")
+        # The feed is TTL seconds old at most, the listing pages are current
+        self.assertContains(self.client.get(reverse("feed", args=[feeds.ENDING])), "Price: $6.00")
+        self.assertContains(self.client.get(reverse("index")), "Price: $9.00")
+        self.assertContains(self.client.get(reverse("search"), {"q": "Lamp"}), "Price: $9.00")
+
+    def test_edited_bids_are_not_new_activity(self):
+        self.bid([(self.listings[0], 1)])
+        score = TrendScore.objects.get(listing=self.listings[0]).score
+        bid = self.listings[0].bids.get()
+        bid.amount += 1
+        bid.save()
+        self.assertEqual(TrendScore.objects.get(listing=self.listings[0]).score, score)
+        feeds.rebuild(self.now)
+        self.assertAlmostEqual(TrendScore.objects.get(listing=self.listings[0]).score, score)
+
+    def test_trending_matches_brute_force(self):
+        rng = random.Random(3)
+        hot = self.listings[:6]
+        bids = sorted(((rng.choice(hot), rng.uniform(0, 8)) for _ in range(40)), key=lambda bid: -bid[1])
+        # Only bids long gone, out of the feed
+        self.bid([(self.listings[6], 30), *bids])
+        feed = feeds.build_feed(feeds.TRENDING, now=self.now)
+        self.assertNotIn(self.listings[6].pk, [entry.id for entry in feed.entries])
+        self.assertMatchesBruteForce(feed)
+
+        # Rebuilt from the ledger it ranks the same
+        self.assertEqual(feeds.rebuild(now=self.now), 6)
+        self.assertMatchesBruteForce(feeds.build_feed(feeds.TRENDING, now=self.now))
+
+    def test_ending_and_watched_match_brute_force(self):
+        for number, listing in enumerate(self.listings):
+            listing.watchers.add(*self.bidders[:number % 3])
+        ended = self.listings[-1]
+        AuctionListing.objects.filter(pk=ended.pk).update(end_datetime=self.now - timedelta(minutes=1))
+
+        open_listings = list(AuctionListing.objects.filter(end_datetime__gt=self.now, closed_at__isnull=True))
+        ending = feeds.build_feed(feeds.ENDING, now=self.now)
+        self.assertEqual(
+            [entry.id for entry in ending.entries],
+            [listing.pk for listing in sorted(open_listings, key=lambda listing: (listing.end_datetime, listing.pk))],
+        )
+        watched = feeds.build_feed(feeds.WATCHED, now=self.now)
+        counts = {listing.pk: listing.watchers.count() for listing in open_listings}
+        self.assertEqual(
+            [(entry.id, entry.heat) for entry in watched.entries],
+            sorted(((pk, count) for pk, count in counts.items() if count), key=lambda row: (-row[1], row[0])),
+        )
+
+    def test_compaction(self):
+        hot, closing, cold = self.listings[:3]
+        self.bid([(cold, 20), (closing, 1), (hot, 0.5)])
+        self.assertEqual(TrendScore.objects.count(), 3)
+        # Closed auctions leave right away, cold ones when compacted
+        AuctionListing.objects.filter(pk=closing.pk).update(end_datetime=self.now)
+        close_auctions([closing.pk], self.now)
+        self.assertEqual(feeds.compact(now=self.now), 1)
+        self.assertEqual(list(TrendScore.objects.values_list("listing_id", flat=True)), [hot.pk])
+        call_command("compact_feeds", "--rebuild", stdout=StringIO())
+        self.assertEqual(list(TrendScore.objects.values_list("listing_id", flat=True)), [hot.pk])
+
+    def test_reads_come_from_memory(self):
+        self.bid([(self.listings[2], 1)])
+        with self.assertNumQueries(1):
+            feed = feeds.get_feed(feeds.TRENDING)
+        with self.assertNumQueries(0):
+            self.assertIs(feeds.get_feed(feeds.TRENDING), feed)
+            start = time.perf_counter()
+            for _ in range(1000):
+                feeds.get_feed(feeds.TRENDING).top(20)
+            self.assertLess((time.perf_counter() - start) / 1000, 0.001)
+        # Another process finds it in the cache
+        feeds._local.feeds = {}
+        with self.assertNumQueries(0):
+            self.assertEqual(feeds.get_feed(feeds.TRENDING).entries, feed.entries)
+
+    def test_feed_pages(self):
+        self.bid([(self.listings[2], 1)])
+        response = self.client.get(reverse("feed", args=["trending"]))
+        self.assertContains(response, "Listing 2")
+        self.assertNotContains(response, "Listing 3")
+        self.assertContains(self.client.get(reverse("feed", args=["ending"])), "Listing 7")
+        self.assertEqual(self.client.get(reverse("feed", args=["unknown"])).status_code, 404)
+
+
+class BidStressTestCase(TransactionTestCase):
+
+    def test_no_lower_bid_is_accepted(self):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        users = [User.objects.create_user(f"bidder{i}") for i in range(4)]
+        listing = create_listing(seller)
+
+        results = run_bid_stress(listing, users, threads=4, bids_per_thread=25, seed=1, readers=2)
+
+        amounts = list(Bid.objects.filter(auction=listing).order_by("id").values_list("amount", flat=True))
+        self.assertEqual(len(amounts), results[bidding.PLACED])
+        self.assertTrue(all(a < b for a, b in zip(amounts, amounts[1:])))
+        listing.refresh_from_db()
+        self.assertEqual(listing.current_price, amounts[-1])
+        self.assertEqual(listing.bid_count, len(amounts))
+        self.assertGreater(results["bids_per_second"], 0)
+        self.assertGreater(results["reads"], 0)
+
+
+class AuctionSchedulerTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.now = timezone.now()
+
+    def test_save_does_not_pick_winner(self):
+        listing = create_listing(self.seller)
+        bidding.place_bid(listing.id, self.bidder, "20.00")
+        listing.end_datetime = self.now - timedelta(minutes=1)
+        listing.save()
+        listing.refresh_from_db()
+        self.assertIsNone(listing.winner)
+        self.assertIsNone(listing.closed_at)
+
+    def test_closes_ended_auctions_in_order(self):
+        ended = create_listing(self.seller, end_datetime=self.now + timedelta(minutes=1))
+        bidding.place_bid(ended.id, self.bidder, "20.00")
+        no_bids = create_listing(self.seller, end_datetime=self.now + timedelta(minutes=2))
+        later = create_listing(self.seller, end_datetime=self.now + timedelta(hours=1))
+
+        scheduler = AuctionScheduler(batch_size=1, clock=lambda: self.now)
+        scheduler.refresh()
+        self.assertEqual(len(scheduler), 2)
+        self.assertEqual(scheduler.run_pending(), 0)
+
+        scheduler.clock = lambda: self.now + timedelta(minutes=3)
+        self.assertEqual(scheduler.run_pending(), 2)
+        self.assertEqual(len(scheduler), 0)
+
+        ended.refresh_from_db()
+        no_bids.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(ended.winner, self.bidder)
+        self.assertIsNotNone(ended.closed_at)
+        self.assertIsNone(no_bids.winner)
+        self.assertIsNotNone(no_bids.closed_at)
+        self.assertIsNone(later.closed_at)
+
+    def test_unlist_sets_winner(self):
+        listing = create_listing(self.seller)
+        bidding.place_bid(listing.id, self.bidder, "20.00")
+        self.client.force_login(self.seller)
+        self.client.get(reverse("listings", args=[listing.id]), {"unlist": "true"})
+        listing.refresh_from_db()
+        self.assertEqual(listing.winner, self.bidder)
+
+
+@skipUnlessDBFeature("supports_explaining_query_execution")
+class QueryPlanTestCase(TestCase):
+    # Tables the hot queries must reach through an index
+    TABLES = ("auctions_auctionlisting", "auctions_auctionlisting_watchers", "auctions_bid", "auctions_comment")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("user", "user@example.com", "password")
+        cls.category = Category.objects.create(name="Books")
+        for i in range(50):
+            cls.listing = create_listing(cls.user, category=cls.category if i % 2 else None)
+            Bid.objects.create(user=cls.user, auction=cls.listing, amount=Decimal(20 + i))
+            Comment.objects.create(commented_by=cls.user, auction=cls.listing, comment_text="Comment")
+            cls.listing.watchers.add(cls.user)
+
+    def assertNoFullScan(self, queryset):
+        if connection.vendor != "sqlite":
+            self.skipTest("Query plans are only checked on SQLite")
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            for table in self.TABLES:
+                self.assertNotRegex(line, rf"\bSCAN {table}\b", f"Full table scan in plan:\n{plan}")
+
+    def test_active_listings(self):
+        self.assertNoFullScan(AuctionListing.objects.filter(end_datetime__gt=timezone.now()))
+
+    def test_deep_pages(self):
+        active = AuctionListing.objects.filter(end_datetime__gt=timezone.now())
+        for sort in SORTS:
+            cursor = encode_cursor(AuctionListing.objects.order_by("pk")[25], sort)
+            queryset, _, _ = _page_queryset(active, sort, cursor, 20)
+            self.assertNoFullScan(queryset)
+
+    def test_active_listings_of_category(self):
+        self.assertNoFullScan(AuctionListing.objects.filter(category=self.category.id, end_datetime__gt=timezone.now()))
+
+    def test_highest_bid(self):
+        self.assertNoFullScan(self.listing.bids.order_by("-amount"))
+
+    def test_watchlist(self):
+        self.assertNoFullScan(AuctionListing.objects.filter(watchers=self.user))
+
+    def test_comments(self):
+        self.assertNoFullScan(self.listing.comments.order_by('-datetime_commented'))
+
+    def test_auctions_to_close(self):
+        self.assertNoFullScan(
+            AuctionListing.objects.filter(closed_at__isnull=True, end_datetime__lte=timezone.now()).order_by("end_datetime")
+        )
+
+    def test_most_watched(self):
+        self.assertNoFullScan(
+            AuctionListing.objects.filter(closed_at__isnull=True, watcher_count__gt=0).order_by("-watcher_count", "pk")[:10]
+        )
+
+
+class PaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        now = timezone.now()
+        # Repeated end dates and prices so ties are broken by id
+        for i in range(23):
+            create_listing(
+                self.seller,
+                end_datetime=now + timedelta(hours=i % 5 + 1),
+                initial_price=Decimal(i % 4 + 1),
+            )
+        create_listing(self.seller, end_datetime=now - timedelta(hours=1))
+        self.listings = AuctionListing.objects.filter(end_datetime__gt=now)
+
+    def walk(self, sort, page_size):
+        seen, cursor = [], None
+        while True:
+            page = paginate(self.listings, sort, cursor, page_size)
+            self.assertLessEqual(len(page.items), page_size)
+            seen.extend(listing.pk for listing in page.items)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_listing_in_order(self):
+        for sort, (name, descending) in SORTS.items():
+            order = "-" if descending else ""
+            expected = list(self.listings.order_by(f"{order}{name}", f"{order}pk").values_list("pk", flat=True))
+            self.assertEqual(self.walk(sort, 5), expected, sort)
+
+    def test_invalid_cursor_and_sort_start_over(self):
+        first = paginate(self.listings, "ending", None, 5)
+        page = paginate(self.listings, "unknown", "not-a-cursor", 5)
+        self.assertEqual(page.sort, "ending")
+        self.assertTrue(page.is_first)
+        self.assertEqual(page.items, first.items)
+
+    def test_index_links_to_next_page(self):
+        response = self.client.get(reverse("index"), {"sort": "newest", "size": 10})
+        self.assertEqual(len(response.context["listings"]), 10)
+        self.assertContains(response, "Next page")
+        page = response.context["page"]
+        response = self.client.get(reverse("index"), {"sort": "newest", "size": 10, "cursor": page.next_cursor})
+        self.assertEqual(len(response.context["listings"]), 10)
+        self.assertContains(response, "First page")
+
+
+class ProfilingTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.category = Category.objects.create(name="Books")
+        for i in range(10):
+            self.listing = create_listing(self.seller, category=self.category)
+            bidding.place_bid(self.listing.id, self.bidder, Decimal(20 + i))
+            Comment.objects.create(commented_by=self.bidder, auction=self.listing, comment_text="Nice")
+            self.listing.watchers.add(self.bidder)
+        profiles.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("index"))
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+')
+
+    def test_rolling_percentiles(self):
+        for _ in range(3):
+            self.client.get(reverse("index"))
+        self.client.get(reverse("listings", args=[self.listing.id]))
+        summary = profiles.summary()
+        self.assertEqual(summary["index"]["count"], 3)
+        self.assertEqual(summary["listings"]["count"], 1)
+        self.assertIn("p99", summary["index"]["total_time"])
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 99), 4)
+
+    @override_settings(AUCTIONS_QUERY_BUDGETS={"index": 0}, AUCTIONS_QUERY_BUDGET_RAISE=True)
+    def test_budget_exceeded_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse("index"))
+
+    @override_settings(AUCTIONS_QUERY_BUDGETS={"index": 0}, AUCTIONS_QUERY_BUDGET_RAISE=False)
+    def test_budget_exceeded_reported(self):
+        response = self.client.get(reverse("index"))
+        self.assertIn("budget", response["Server-Timing"])
+
+    @override_settings(AUCTIONS_QUERY_BUDGET_RAISE=True)
+    def test_pages_stay_within_budget(self):
+        self.client.force_login(self.bidder)
+        for url in (
+            reverse("index"),
+            reverse("categories", args=["all"]),
+            reverse("categories", args=["Books"]),
+            reverse("watchlist"),
+            reverse("listings", args=[self.listing.id]),
+        ):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class DatabaseRoutingTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, view_name="index", write=False):
+        # Databases the router picks for a read before and after an optional write in the view
+        request.resolver_match = resolve(reverse(view_name))
+        seen = []
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            seen.append(self.router.db_for_read(AuctionListing))
+            if write:
+                seen.append(self.router.db_for_write(AuctionListing))
+                seen.append(self.router.db_for_read(AuctionListing))
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        response = middleware(request)
+        return seen, response
+
+    @override_settings(AUCTIONS_DATABASE_REPLICAS=["replica"], AUCTIONS_REPLICA_VIEWS=["index"])
+    def test_reads_of_listed_views_go_to_replica(self):
+        seen, response = self.route(self.factory.get("/"))
+        self.assertEqual(seen, ["replica"])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        # Outside a request everything stays on the primary
+        self.assertIsNone(self.router.db_for_read(AuctionListing))
+
+    @override_settings(AUCTIONS_DATABASE_REPLICAS=["replica"], AUCTIONS_REPLICA_VIEWS=["index"])
+    def test_writes_go_to_primary_and_stick(self):
+        seen, response = self.route(self.factory.get("/"), write=True)
+        self.assertEqual(seen, ["replica", "default", None])
+        self.assertEqual(response.cookies[STICKY_COOKIE]["max-age"], 10)
+
+        # The next request of that user reads from the primary
+        request = self.factory.get("/")
+        request.COOKIES[STICKY_COOKIE] = "1"
+        self.assertEqual(self.route(request)[0], [None])
+
+    @override_settings(AUCTIONS_DATABASE_REPLICAS=["replica"], AUCTIONS_REPLICA_VIEWS=["index"])
+    def test_other_views_and_methods_read_from_primary(self):
+        self.assertEqual(self.route(self.factory.get("/"), view_name="dashboard")[0], [None])
+        self.assertEqual(self.route(self.factory.post("/"))[0], [None])
+
+    @override_settings(AUCTIONS_DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        seen, response = self.route(self.factory.get("/"), write=True)
+        self.assertEqual(seen, [None, "default", None])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    @override_settings(AUCTIONS_DATABASE_REPLICAS=["replica"], AUCTIONS_REPLICA_VIEWS=["index"])
+    def test_transactions_read_from_primary(self):
+        request = self.factory.get("/")
+        request.resolver_match = resolve(reverse("index"))
+        seen = []
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            seen.append(self.router.db_for_read(AuctionListing))
+            # e.g. the select_for_update of place_bid
+            with mock.patch.object(connection, "in_atomic_block", True):
+                seen.append(self.router.db_for_read(AuctionListing))
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        middleware(request)
+        self.assertEqual(seen, ["replica", None])
+
+    def test_database_from_url(self):
+        sqlite = database_from_url("sqlite:///db.sqlite3", "/srv/commerce")
+        self.assertEqual(sqlite["NAME"], "/srv/commerce/db.sqlite3")
+        self.assertEqual(database_from_url("sqlite:////tmp/db.sqlite3", "/srv")["NAME"], "/tmp/db.sqlite3")
+
+        postgres = database_from_url("postgres://auctions:p%40ss@db:6432/auctions?sslmode=require", "/srv", pooler="pgbouncer")
+        self.assertEqual(postgres["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual((postgres["USER"], postgres["PASSWORD"]), ("auctions", "p@ss"))
+        self.assertEqual((postgres["HOST"], postgres["PORT"], postgres["NAME"]), ("db", "6432", "auctions"))
+        self.assertEqual(postgres["OPTIONS"], {"sslmode": "require"})
+        self.assertTrue(postgres["CONN_HEALTH_CHECKS"])
+        self.assertTrue(postgres["DISABLE_SERVER_SIDE_CURSORS"])
+        with self.assertRaises(ValueError):
+            database_from_url("mysql://localhost/auctions", "/srv")
+
+    @override_settings(AUCTIONS_ARCHIVE_DATABASE="archive")
+    def test_archive_models_go_to_archive_database(self):
+        router = ArchiveRouter()
+        self.assertEqual(router.db_for_read(ArchivedListing), "archive")
+        self.assertEqual(router.db_for_write(ArchivedBid), "archive")
+        self.assertIsNone(router.db_for_read(AuctionListing))
+        # What an archived row points at is read from the primary
+        archived = ArchivedListing(id=1)
+        archived._state.db = "archive"
+        self.assertEqual(router.db_for_read(User, instance=archived), "default")
+        self.assertTrue(router.allow_migrate("archive", "auctions", model_name="archivedcomment"))
+        self.assertFalse(router.allow_migrate("default", "auctions", model_name="archivedcomment"))
+        self.assertFalse(router.allow_migrate("archive", "auctions", model_name="auctionlisting"))
+        # RunPython operations of the live tables
+        self.assertFalse(router.allow_migrate("archive", "auctions"))
+        self.assertIsNone(router.allow_migrate("default", "auctions", model_name="auctionlisting"))
+
+    def test_sqlite_pragmas(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            settings_dict = {**connection.settings_dict, "NAME": os.path.join(tmpdir, "pragmas.sqlite3")}
+            wrapper = DatabaseWrapper(settings_dict)
+            wrapper.connect()
+            try:
+                # Connecting leaves the journal mode of the file alone
+                self.assertEqual(wrapper.connection.execute("PRAGMA journal_mode").fetchone()[0], "delete")
+                self.assertEqual(wrapper.connection.execute("PRAGMA synchronous").fetchone()[0], 2)
+                self.assertEqual(wrapper.connection.execute("PRAGMA temp_store").fetchone()[0], 2)
+            finally:
+                wrapper.close()
+            wrapper = DatabaseWrapper(settings_dict)
+            self.assertEqual(set_journal_mode(wrapper), "wal")
+            wrapper.close()
+            # It stays on, and new connections get synchronous=NORMAL with it
+            wrapper = DatabaseWrapper(settings_dict)
+            wrapper.connect()
+            try:
+                self.assertEqual(wrapper.connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+                self.assertEqual(wrapper.connection.execute("PRAGMA synchronous").fetchone()[0], 1)
+            finally:
+                wrapper.close()
+
+
+class ImageProxyTestCase(TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.fetcher = StubFetcher({"https://example.com/text.png": b"not an image"}, size=(600, 300))
+        self.pipeline = ImagePipeline(ImageStore(tmpdir.name), self.fetcher, workers=2, wait=2)
+        self.addCleanup(self.pipeline.shutdown)
+        for name, value in (("pipeline", self.pipeline), ("ENABLED", True)):
+            patcher = mock.patch.object(images, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.listing = create_listing(self.seller, image_url="https://example.com/big.png")
+
+    def image_url(self, rendition="thumb", url="https://example.com/big.png"):
+        return reverse("image", args=[rendition, images.sign_url(url)])
+
+    def test_pages_link_to_renditions(self):
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, self.image_url("thumb"))
+        self.assertNotContains(response, 'src="https://example.com/big.png"')
+        response = self.client.get(reverse("listings", args=[self.listing.id]))
+        self.assertContains(response, self.image_url("detail"))
+
+    def test_fetched_once_and_cached_for_good(self):
+        for _ in range(3):
+            with self.assertNumQueries(0):
+                response = self.client.get(self.image_url())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+            body = b"".join(response.streaming_content)
+        self.client.get(self.image_url("detail"))
+        self.assertEqual(self.fetcher.fetches, {"https://example.com/big.png": 1})
+        self.assertIn(images.sniff(body), ("png", "jpeg"))
+
+        response = self.client.get(self.image_url(), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_content_addressed_files(self):
+        data = placeholder_png(20, 10, seed=3)
+        self.fetcher.images.update({"https://a.example/1.png": data, "https://b.example/2.png": data})
+        first = self.pipeline.rendition("https://a.example/1.png", "thumb")
+        second = self.pipeline.rendition("https://b.example/2.png", "thumb")
+        self.assertEqual(first["path"], second["path"])
+        extension = "jpeg" if images.Image else "png"
+        with open(self.pipeline.store.path(first["path"]), "rb") as file:
+            self.assertTrue(first["path"].endswith(f"{hashlib.sha256(file.read()).hexdigest()}.{extension}"))
+
+    def test_new_renditions_reuse_the_original(self):
+        self.pipeline.rendition("https://example.com/big.png", "thumb")
+        with mock.patch.dict(images.RENDITIONS, {"tiny": (50, 50)}):
+            self.assertIsNotNone(self.pipeline.rendition("https://example.com/big.png", "tiny"))
+        self.assertEqual(self.fetcher.fetches["https://example.com/big.png"], 1)
+
+    def test_failures_fall_back_to_the_original(self):
+        self.fetcher.images["https://example.com/gone.png"] = images.FetchError("HTTP 404")
+        for url in ("https://example.com/gone.png", "https://example.com/text.png"):
+            for _ in range(2):
+                response = self.client.get(self.image_url(url=url))
+                self.assertRedirects(response, url, fetch_redirect_response=False)
+            # Not fetched again until RETRY_AFTER
+            self.assertEqual(self.fetcher.fetches[url], 1)
+
+    def test_rejects_unsigned_urls(self):
+        token = images.sign_url("https://example.com/big.png")
+        self.assertEqual(self.client.get(reverse("image", args=["thumb", token[:-1] + "x"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("image", args=["huge", token])).status_code, 404)
+        self.assertEqual(self.fetcher.fetches, {})
+
+    def test_off_links_the_originals(self):
+        with mock.patch.object(images, "ENABLED", False):
+            response = self.client.get(reverse("index"))
+            self.assertContains(response, 'src="https://example.com/big.png"')
+            response = self.client.get(self.image_url())
+        self.assertRedirects(response, "https://example.com/big.png", fetch_redirect_response=False)
+        self.assertEqual(self.fetcher.fetches, {})
+
+    def test_requests_do_not_wait_for_the_fetch(self):
+        self.pipeline.wait = 0
+        release = threading.Event()
+        fetch = self.fetcher.__call__
+        self.pipeline.fetcher = lambda url: release.wait(5) and fetch(url)
+        response = self.client.get(self.image_url())
+        self.assertRedirects(response, "https://example.com/big.png", fetch_redirect_response=False)
+        release.set()
+        self.pipeline.submit("https://example.com/big.png").result(timeout=5)
+        self.assertEqual(self.client.get(self.image_url()).status_code, 200)
+
+    def test_fetcher_only_reaches_public_addresses(self):
+        fetcher = images.HTTPFetcher(timeout=1)
+        for url in (
+            "file:///etc/passwd", "ftp://example.com/a.png", "http://127.0.0.1/a.png", "http://localhost:8000/a.png",
+            "http://10.0.0.1/a.png", "http://169.254.169.254/latest/meta-data", "http://[::1]/a.png",
+            "http://[::ffff:192.168.0.1]/a.png",
+        ):
+            with self.assertRaises(images.FetchError, msg=url):
+                fetcher(url)
+        public = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("93.184.216.34", 80))]
+        with mock.patch("socket.getaddrinfo", return_value=public):
+            self.assertEqual(images.public_addresses("example.com", 80), public)
+        # Redirects are checked too, the connection to the new host goes through the same lookup
+        request = urllib.request.Request("https://example.com/a.png")
+        with self.assertRaises(images.FetchError):
+            images._RedirectHandler().redirect_request(request, None, 302, "Found", {}, "ftp://example.com/a.png")
+
+    @skipUnless(images.Image, "Resizing needs Pillow")
+    def test_renditions_fit_their_size(self):
+        for name, (width, height) in images.RENDITIONS.items():
+            found = self.pipeline.rendition("https://example.com/big.png", name)
+            with images.Image.open(self.pipeline.store.path(found["path"])) as image:
+                self.assertLessEqual(image.width, width)
+                self.assertLessEqual(image.height, height)
+
+
+class FragmentCacheTestCase(TestCase):
+
+    def setUp(self):
+        caches[FRAGMENT_CACHE].clear()
+        fragments.clear()
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = create_listing(self.seller)
+        Comment.objects.create(commented_by=self.bidder, auction=self.listing, comment_text="First comment")
+        bidding.place_bid(self.listing.id, self.bidder, "12.00")
+        self.url = reverse("listings", args=[self.listing.id])
+
+    def test_anonymous_hot_listing_skips_bids_and_comments(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertContains(response, "First comment")
+        self.assertEqual(len(context.captured_queries), 1)
+        for query in context.captured_queries:
+            self.assertNotIn("auctions_bid", query["sql"])
+            self.assertNotIn("auctions_comment", query["sql"])
+        self.assertGreater(fragments.stats()["hits"], 0)
+
+    def test_writes_bump_the_version(self):
+        version = listing_version(self.listing.id)
+        bidding.place_bid(self.listing.id, self.bidder, "15.00")
+        self.assertGreater(listing_version(self.listing.id), version)
+
+        self.client.get(self.url)
+        self.client.force_login(self.bidder)
+        self.client.post(self.url, {"comment_text": "Second comment"})
+        self.client.logout()
+        self.assertContains(self.client.get(self.url), "Second comment")
+        self.assertContains(self.client.get(reverse("index")), "Price: $15.00")
+
+    def test_renders_before_the_commit_are_not_kept(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(commented_by=self.bidder, auction=self.listing, comment_text="Second comment")
+            # Another process rendering from the rows committed so far, after the first bump
+            fragments.get_or_render("comments", self.listing.id, lambda: "First comment only")
+        self.assertEqual(fragments.get_or_render("comments", self.listing.id, lambda: "Both comments"), "Both comments")
+
+    def test_renames_bump_the_version(self):
+        category = Category.objects.create(name="Books")
+        self.listing.category = category
+        self.listing.save()
+        Comment.objects.create(commented_by=self.bidder, auction=create_listing(self.seller), comment_text="Hi")
+        commented = Comment.objects.filter(commented_by=self.bidder).values_list("auction_id", flat=True)
+        self.assertContains(self.client.get(self.url), "Books")
+
+        category.name = "Old books"
+        category.save()
+        self.assertContains(self.client.get(self.url), "Old books")
+        versions = {listing_id: listing_version(listing_id) for listing_id in commented}
+        self.bidder.username = "collector"
+        self.bidder.save()
+        self.assertContains(self.client.get(self.url), "collector:")
+        for listing_id, version in versions.items():
+            self.assertGreater(listing_version(listing_id), version)
+        category.delete()
+        self.assertContains(self.client.get(self.url), "No Category Listed")
+
+    def test_fragment_cache_must_be_shared(self):
+        self.assertEqual(checks.fragment_cache_check(None), [])
+        local = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        with override_settings(CACHES={**settings.CACHES, FRAGMENT_CACHE: local}):
+            self.assertEqual([error.id for error in checks.fragment_cache_check(None)], ["auctions.E001"])
+
+    def test_lru_eviction_and_counters(self):
+        cache = FragmentCache(size=2)
+        for name in ("a", "b", "c"):
+            cache.get_or_render(name, self.listing.id, lambda: name)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(list(cache.lru), [cache.key("b", self.listing.id), cache.key("c", self.listing.id)])
+        self.assertEqual(cache.get_or_render("c", self.listing.id, lambda: "new"), "c")
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 3)
+
+
+@override_settings(ROOT_URLCONF="auctions.async_urls")
+class AsyncViewsTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="password")
+        self.bidder = User.objects.create_user("bidder", password="password")
+        self.category = Category.objects.create(name="Books")
+        self.listing = create_listing(self.seller, category=self.category)
+        self.listing.watchers.add(self.bidder)
+        self.async_client.force_login(self.bidder)
+
+    async def test_pages(self):
+        for url in (
+            reverse("index"),
+            reverse("categories", args=["all"]),
+            reverse("categories", args=["Books"]),
+            reverse("watchlist"),
+            reverse("listings", args=[self.listing.id]),
+        ):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+        response = await self.async_client.get(reverse("watchlist"))
+        self.assertEqual(list(response.context["listings"]), [self.listing])
+
+    async def test_watchlist_needs_login(self):
+        await self.async_client.get(reverse("logout"))
+        response = await self.async_client.get(reverse("watchlist"))
+        self.assertEqual(response.status_code, 302)
+
+    async def test_bid(self):
+        url = reverse("bid", args=[self.listing.id])
+        response = await self.async_client.post(url, {"amount": "12.00", "seen_price": "10.00"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["status"], bidding.PLACED)
+        self.assertEqual(response.json()["current_price"], "12.00")
+
+        response = await self.async_client.post(url, {"amount": "11.00", "seen_price": "10.00"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["status"], bidding.OUTBID)
+        self.assertEqual(await Bid.objects.filter(auction=self.listing).acount(), 1)
+
+        response = await self.async_client.post(reverse("bid", args=[0]), {"amount": "20.00"})
+        self.assertEqual(response.status_code, 404)
+
+
+class LiveEventsTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="password")
+        self.bidder = User.objects.create_user("bidder", password="password")
+        self.listing = create_listing(self.seller)
+        self.listing.watchers.add(self.bidder)
+
+    def tearDown(self):
+        # The test client doesn't close the streams it didn't read to the end
+        live.hub.topics.clear()
+
+    async def test_back_pressure(self):
+        hub = live.Hub(max_pending=2)
+        subscription = hub.subscribe([live.listing_topic(1), live.listing_topic(2), live.listing_topic(3)])
+        # Published from another thread like the bid signals
+        await sync_to_async(hub.publish, thread_sensitive=False)(live.PRICE, 1, {"bid_count": 1})
+        await sync_to_async(hub.publish, thread_sensitive=False)(live.PRICE, 1, {"bid_count": 2})
+        await asyncio.sleep(0)
+        self.assertEqual(subscription.coalesced, 1)
+        hub.publish(live.PRICE, 2, {"bid_count": 1})
+        hub.publish(live.PRICE, 3, {"bid_count": 1})
+        await asyncio.sleep(0)
+        events = await subscription.get(timeout=1)
+        # Listing 1 was the oldest when the connection fell two listings behind
+        self.assertEqual([event.listing for event in events], [2, 3])
+        self.assertEqual(subscription.dropped, 1)
+        self.assertEqual(await subscription.get(timeout=0.01), [])
+
+        # The subscription is closed when its stream ends
+        hub.publish(live.PRICE, 1, {"bid_count": 3})
+        chunks = [chunk async for chunk in live.stream(subscription, max_age=0)]
+        self.assertEqual(chunks, [b"retry: 1000\n\n"])
+        self.assertEqual(hub.publish(live.PRICE, 1, {}), 0)
+        self.assertEqual(hub.stats()["subscriptions"], 0)
+
+    def place_bid(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return bidding.place_bid(self.listing.id, self.bidder, amount)
+
+    @override_settings(ROOT_URLCONF="auctions.async_urls")
+    async def test_listing_and_watcher_streams(self):
+        response = await self.async_client.get(reverse("listing_events", args=[self.listing.id]))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        listing_stream = aiter(response.streaming_content)
+        await anext(listing_stream)
+        self.assertIn(b'"current_price": "10.00"', await anext(listing_stream))
+
+        await sync_to_async(self.async_client.force_login)(self.bidder)
+        response = await self.async_client.get(reverse("events"))
+        user_stream = aiter(response.streaming_content)
+        await anext(user_stream)
+
+        await sync_to_async(self.place_bid)("12.00")
+        for stream in (listing_stream, user_stream):
+            event = await anext(stream)
+            self.assertTrue(event.startswith(b"id: "))
+            self.assertIn(b"event: price", event)
+            self.assertIn(b'"bid_count": 1', event)
+
+    async def test_unknown_listing(self):
+        with override_settings(ROOT_URLCONF="auctions.async_urls"):
+            response = await self.async_client.get(reverse("listing_events", args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(live.hub.topics)
+
+
+class SearchTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("user", password="password")
+        self.books = Category.objects.create(name="Books")
+        self.bike = create_listing(self.user, title="Red racing bicycle", description="Barely used")
+        self.book = create_listing(
+            self.user, title="Cookbook", description="Recipes, with a bicycle on the cover", category=self.books
+        )
+        self.ended = create_listing(
+            self.user, title="Old bicycle", description="Rusty", end_datetime=timezone.now() - timedelta(days=1)
+        )
+
+    def test_parse_query(self):
+        self.assertEqual(parse_query("red bic"), ["red", "bic*"])
+        self.assertEqual(parse_query("red bicycle "), ["red", "bicycle"])
+        # FTS5 syntax is dropped, one letter words are never prefixes
+        self.assertEqual(parse_query('bi* "NEAR(a)"'), ["bi*", "near", "a"])
+
+    def test_ranking_and_filters(self):
+        # A title match ranks above a description match
+        self.assertEqual(search("bicycle").items, [self.bike, self.book])
+        self.assertEqual(search("bicycle", active_only=False).items[-1], self.book)
+        self.assertIn(self.ended, search("bicycle", active_only=False).items)
+        self.assertEqual(search("bicycle", category=self.books.id).items, [self.book])
+        self.assertEqual(search("racing bic").items, [self.bike])
+        self.assertEqual(search("unknown").items, [])
+
+    def test_index_follows_edits(self):
+        self.bike.title = "Blue tandem"
+        self.bike.save()
+        self.assertEqual(search("tandem").items, [self.bike])
+        self.assertEqual(search("racing").items, [])
+        self.book.delete()
+        self.assertEqual(search("cookbook").items, [])
+
+    def test_broad_queries_newest_first(self):
+        with mock.patch("auctions.search.RANK_LIMIT", 1):
+            self.assertEqual(search("bicycle", active_only=False).items, [self.ended, self.book, self.bike])
+
+    def test_pages(self):
+        first = search("bicycle", page_size=1)
+        self.assertTrue(first.has_next)
+        second = search("bicycle", page=2, page_size=1)
+        self.assertEqual(second.items, [self.book])
+        self.assertFalse(second.has_next)
+
+    def test_view(self):
+        response = self.client.get(reverse("search"), {"q": "bicycle", "category": self.books.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["results"].items, [self.book])
+
+
+class APITestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="password")
+        self.bidder = User.objects.create_user("bidder", password="password")
+        self.category = Category.objects.create(name="Books")
+        self.listing = create_listing(self.seller, title="Atlas", category=self.category)
+        for amount in ("11.00", "12.00", "12.00", "13.00"):
+            Bid.objects.create(user=self.bidder, auction=self.listing, amount=Decimal(amount))
+
+    def test_listing_etag(self):
+        url = reverse("api:listing", args=[self.listing.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["current_price"], "13.00")
+        self.assertEqual(response.json()["category"], "Books")
+        etag = response["ETag"]
+
+        # Revalidating doesn't touch the database
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Bid.objects.create(user=self.bidder, auction=self.listing, amount=Decimal("14.00"))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get(reverse("api:listing", args=[0])).status_code, 404)
+
+    def test_listings_pages(self):
+        for i in range(3):
+            create_listing(self.seller, title=f"Listing {i}")
+        url = reverse("api:listings")
+        first = self.client.get(url, {"size": 2, "sort": "newest"})
+        data = first.json()
+        self.assertEqual(len(data["results"]), 2)
+        second = self.client.get(url, {"size": 2, "sort": "newest", "cursor": data["next_cursor"]}).json()
+        ids = [row["id"] for row in data["results"] + second["results"]]
+        self.assertEqual(len(set(ids)), 4)
+        self.assertEqual(self.client.get(url, {"category": "books"}).json()["results"][0]["title"], "Atlas")
+        self.assertEqual(self.client.get(url, {"category": "Books"}).json()["results"], [])
+
+        response = self.client.get(url, {"size": 2, "sort": "newest"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        # A new listing moves into the first page
+        create_listing(self.seller, title="Newer")
+        response = self.client.get(url, {"size": 2, "sort": "newest"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_listings_body_is_not_older_than_its_etag(self):
+        url = reverse("api:listings")
+        first = self.client.get(url)
+        versions = listing_versions
+
+        def write_in_between(ids):
+            # A bid committing after the page was read, its version bump is already done
+            AuctionListing.objects.filter(pk=self.listing.id).update(current_price=Decimal("20.00"))
+            return versions(ids)
+        with mock.patch("auctions.api.listing_versions", write_in_between):
+            response = self.client.get(url)
+        self.assertEqual(response["ETag"], first["ETag"])
+        self.assertEqual(response.json()["results"][0]["current_price"], "20.00")
+
+    def test_bids_pages(self):
+        url = reverse("api:bids", args=[self.listing.id])
+        data = self.client.get(url, {"size": 2}).json()
+        amounts = [row["amount"] for row in data["results"]]
+        data = self.client.get(url, {"size": 2, "cursor": data["next_cursor"]}).json()
+        amounts += [row["amount"] for row in data["results"]]
+        self.assertEqual(amounts, ["13.00", "12.00", "12.00", "11.00"])
+        self.assertIsNone(data["next_cursor"])
+
+    def test_gzip(self):
+        url = reverse("api:listings")
+        plain = self.client.get(url, {"size": 50})
+        for i in range(10):
+            create_listing(self.seller, title=f"Listing {i}")
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response["ETag"].endswith('-gzip"'))
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))["results"]), 11)
+        # The compressed variant's tag revalidates too
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("Content-Encoding", plain)
+
+    def test_read_only(self):
+        self.assertEqual(self.client.post(reverse("api:categories")).status_code, 405)
+        self.assertEqual(self.client.get(reverse("api:categories")).json()["results"][0]["name"], "Books")
+
+
+class ImportExportTestCase(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        category = Category.objects.create(name="Books")
+        self.listing = create_listing(self.seller, category=category, datetime_listed=timezone.now() - timedelta(days=3))
+        bidding.place_bid(self.listing.id, self.bidder, "12.00")
+        bidding.place_bid(self.listing.id, self.seller, "14.00")
+        Comment.objects.create(commented_by=self.bidder, auction=self.listing, comment_text="Nice")
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_jsonl_round_trip(self):
+        call_command("export_auctions", self.path("dump.jsonl"), stderr=StringIO())
+        listed = self.listing.datetime_listed
+        AuctionListing.objects.all().delete()
+        User.objects.exclude(username="seller").delete()
+
+        out = StringIO()
+        call_command("import_auctions", self.path("dump.jsonl"), batch_size=1, stdout=out, stderr=StringIO())
+        self.assertIn("Imported 1 auctions, 2 bids, 1 comments", out.getvalue())
+
+        listing = AuctionListing.objects.get(pk=self.listing.pk)
+        self.assertEqual(listing.datetime_listed, listed)
+        self.assertEqual(listing.category.name, "Books")
+        self.assertEqual(listing.category.active_count, 1)
+        self.assertEqual(listing.current_price, Decimal("14.00"))
+        self.assertEqual(listing.bid_count, 2)
+        self.assertEqual(listing.highest_bid.user, self.seller)
+        self.assertEqual(listing.comments.get().commented_by.username, "bidder")
+        # Users missing from the database are created without a usable password
+        self.assertFalse(User.objects.get(username="bidder").has_usable_password())
+
+    def test_csv_per_type(self):
+        for name in ("auctions", "bids", "comments"):
+            call_command("export_auctions", self.path(f"{name}.csv"), type=[name], stderr=StringIO())
+        AuctionListing.objects.all().delete()
+
+        for name in ("auctions", "bids", "comments"):
+            call_command("import_auctions", self.path(f"{name}.csv"), type=name, stdout=StringIO(), stderr=StringIO())
+        listing = AuctionListing.objects.get(pk=self.listing.pk)
+        self.assertEqual(listing.current_price, Decimal("14.00"))
+        self.assertEqual(listing.bid_count, 2)
+        self.assertEqual(listing.comments.count(), 1)
+
+
+class LoadTestTestCase(TransactionTestCase):
+
+    def test_seed_and_replay(self):
+        counts = seed(users=10, categories=3, listings=20, bids=2, comments=1, watchers=2, random_seed=1)
+        self.assertEqual(counts["auction"], 20)
+        self.assertEqual(AuctionListing.objects.count(), 20)
+        self.assertEqual(sum(AuctionListing.objects.values_list("bid_count", flat=True)), Bid.objects.count())
+
+        with override_settings(ALLOWED_HOSTS=["localhost"]):
+            # One worker, the shared in-memory test database locks whole tables on write
+            samples, elapsed = run_load(workers=1, requests=30, random_seed=1, anonymous=0)
+        report = build_report(samples, elapsed)
+        self.assertEqual(report["requests"], 30)
+        for endpoint in report["endpoints"].values():
+            self.assertEqual(endpoint["errors"], 0)
+            self.assertLessEqual(endpoint["p50"], endpoint["p99"])
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("index=3,bid=1"), {"index": 3.0, "bid": 1.0})
+        with self.assertRaises(ValueError):
+            parse_mix("unknown=1")
@@ -0,0 +1,279 @@
+"""
+Streaming import and export of auctions, bids and comments (JSONL or CSV).
+
+Records are plain dicts with a "type" key. Users and categories are written by
+name, auctions keep their ids so bids and comments can point at them.
+"""
+import csv
+import datetime
+import json
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from . import analytics, ledger
+from .catalog import refresh_categories
+from .fragments import bump_listing_versions
+from .models import AuctionListing, Bid, Category, Comment, User
+
+BATCH_SIZE = 1000
+
+# Exported columns per record type, in file order
+FIELDS = {
+    "auction": [
+        "id", "title", "description", "listed_by", "datetime_listed", "end_datetime",
+        "initial_price", "image_url", "category", "winner", "closed_at",
+    ],
+    "bid": ["id", "auction", "user", "amount"],
+    "comment": ["id", "auction", "commented_by", "datetime_commented", "comment_text"],
+}
+# Command line names of the record types
+TYPES = {"auctions": "auction", "bids": "bid", "comments": "comment"}
+
+# values() lookups for every exported column that isn't a plain field
+_LOOKUPS = {
+    "auction": {"listed_by": "listed_by__username", "category": "category__name", "winner": "winner__username"},
+    "bid": {"auction": "auction_id", "user": "user__username"},
+    "comment": {"auction": "auction_id", "commented_by": "commented_by__username"},
+}
+_MODELS = {"auction": AuctionListing, "bid": Bid, "comment": Comment}
+
+
+def export_records(record_types=("auction", "bid", "comment"), chunk_size=BATCH_SIZE):
+    # Auctions come first so an import always sees an auction before its bids and comments
+    for record_type in record_types:
+        lookups = _LOOKUPS[record_type]
+        columns = [lookups.get(name, name) for name in FIELDS[record_type]]
+        rows = _MODELS[record_type].objects.order_by("pk").values_list(*columns)
+        for row in rows.iterator(chunk_size=chunk_size):
+            record = dict(zip(FIELDS[record_type], row))
+            record["type"] = record_type
+            yield record
+
+
+class _Encoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder rounds datetimes to milliseconds, keep them exact
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def write_jsonl(records, file):
+    count = 0
+    for count, record in enumerate(records, 1):
+        file.write(json.dumps(record, cls=_Encoder))
+        file.write("\n")
+    return count
+
+
+def write_csv(records, file, record_type):
+    writer = csv.DictWriter(file, FIELDS[record_type], extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for count, record in enumerate(records, 1):
+        writer.writerow({name: "" if value is None else value for name, value in record.items()})
+    return count
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file, record_type):
+    for row in csv.DictReader(file):
+        # CSV has no nulls, empty cells are read as missing values
+        record = {name: value if value != "" else None for name, value in row.items()}
+        record["type"] = record_type
+        yield record
+
+
+def progress(records, report, every=10000):
+    # Pass the records through, calling report(count, rows per second) every so often and at the end
+    start = time.perf_counter()
+    count = 0
+    for count, record in enumerate(records, 1):
+        yield record
+        if count % every == 0:
+            report(count, count / (time.perf_counter() - start))
+    elapsed = time.perf_counter() - start
+    report(count, count / elapsed if elapsed else 0.0)
+
+
+class Importer:
+    """
+    Buffers records per type and writes them with bulk_create, one transaction per batch.
+
+    Users and categories are looked up through maps filled one batch at a time (missing ones are
+    created), the bid stats of every touched auction and the stats of every touched category are
+    recalculated once at the end, when the closed auctions are added to the sales rollups.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.users = {}
+        self.categories = {}
+        self.buffers = {record_type: [] for record_type in FIELDS}
+        self.counts = {record_type: 0 for record_type in FIELDS}
+        self.touched_auctions = set()
+        self.touched_categories = set()
+        self.closed_auctions = set()
+
+    def feed(self, record):
+        record_type = record.get("type")
+        if record_type not in self.buffers:
+            raise ValueError(f"Unknown record type: {record_type!r}")
+        buffer = self.buffers[record_type]
+        buffer.append(record)
+        if len(buffer) >= self.batch_size:
+            self.flush(record_type)
+
+    def run(self, records):
+        for record in records:
+            self.feed(record)
+        self.finish()
+        return self.counts
+
+    def flush(self, record_type):
+        # Bids and comments need their auction to exist
+        if record_type != "auction":
+            self.flush("auction")
+        records = self.buffers[record_type]
+        if not records:
+            return
+        self.buffers[record_type] = []
+        with transaction.atomic():
+            objects = getattr(self, f"_build_{record_type}s")(records)
+            _MODELS[record_type].objects.bulk_create(objects, batch_size=self.batch_size)
+            self._record(record_type, objects)
+        self.counts[record_type] += len(objects)
+
+    def finish(self):
+        for record_type in FIELDS:
+            self.flush(record_type)
+        touched = sorted(self.touched_auctions)
+        for start in range(0, len(touched), self.batch_size):
+            batch = touched[start:start + self.batch_size]
+            AuctionListing.refresh_bid_stats_of(batch)
+            bump_listing_versions(batch)
+        self.touched_auctions.clear()
+        # Final prices are only known once the bid stats are
+        closed = sorted(self.closed_auctions)
+        for start in range(0, len(closed), self.batch_size):
+            analytics.listings_closed(closed[start:start + self.batch_size])
+        self.closed_auctions.clear()
+        if self.touched_categories:
+            refresh_categories(sorted(self.touched_categories))
+            self.touched_categories.clear()
+        # Auctions were inserted with their own ids, move the sequences past them (PostgreSQL)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [AuctionListing]):
+                cursor.execute(sql)
+
+    def _record(self, record_type, objects):
+        # Imported bids and closed auctions go to the ledger like live ones
+        if record_type == "bid":
+            events = ledger.record_many((bid.auction_id, ledger.PLACED, bid.pk, bid.user_id, bid.amount) for bid in objects)
+            analytics.events_recorded(events)
+        elif record_type == "auction":
+            events = []
+            for auction in objects:
+                if auction.closed_at:
+                    events.append((auction.pk, ledger.CLOSED, None, None, None))
+                    self.closed_auctions.add(auction.pk)
+                if auction.winner_id:
+                    events.append((auction.pk, ledger.WINNER_SET, None, auction.winner_id, None))
+            ledger.record_many(events)
+
+    def _resolve_users(self, usernames):
+        missing = {name for name in usernames if name and name not in self.users}
+        if not missing:
+            return
+        self.users.update(User.objects.filter(username__in=missing).values_list("username", "id"))
+        new = missing - self.users.keys()
+        if new:
+            # Imported users can't log in until they reset their password
+            password = make_password(None)
+            User.objects.bulk_create([User(username=name, password=password) for name in new])
+            self.users.update(User.objects.filter(username__in=new).values_list("username", "id"))
+
+    def _resolve_categories(self, names):
+        missing = {name for name in names if name and name not in self.categories}
+        if not missing:
+            return
+        self.categories.update(Category.objects.filter(name__in=missing).values_list("name", "id"))
+        new = missing - self.categories.keys()
+        if new:
+            taken = set(Category.objects.values_list("slug", flat=True))
+            categories = []
+            for name in sorted(new):
+                categories.append(Category(name=name, slug=Category.unique_slug(name, taken)))
+                taken.add(categories[-1].slug)
+            Category.objects.bulk_create(categories)
+            self.categories.update(Category.objects.filter(name__in=new).values_list("name", "id"))
+
+    def _value(self, model, name, value):
+        return None if value is None else model._meta.get_field(name).to_python(value)
+
+    def _build_auctions(self, records):
+        self._resolve_users([r.get("listed_by") for r in records] + [r.get("winner") for r in records])
+        self._resolve_categories([r.get("category") for r in records])
+        auctions = []
+        for r in records:
+            parsed = {
+                name: self._value(AuctionListing, name, r.get(name))
+                for name in ("id", "end_datetime", "initial_price", "closed_at", "datetime_listed")
+            }
+            auction = AuctionListing(
+                id=parsed["id"],
+                title=r["title"],
+                description=r.get("description") or "",
+                listed_by_id=self.users[r["listed_by"]],
+                end_datetime=parsed["end_datetime"],
+                initial_price=parsed["initial_price"],
+                current_price=parsed["initial_price"],
+                image_url=r.get("image_url") or "",
+                category_id=self.categories.get(r.get("category")),
+                winner_id=self.users.get(r.get("winner")),
+                closed_at=parsed["closed_at"],
+            )
+            if parsed["datetime_listed"]:
+                auction.datetime_listed = parsed["datetime_listed"]
+            if auction.category_id:
+                self.touched_categories.add(auction.category_id)
+            auctions.append(auction)
+        return auctions
+
+    def _build_bids(self, records):
+        self._resolve_users([r.get("user") for r in records])
+        bids = []
+        for r in records:
+            auction_id = int(r["auction"])
+            self.touched_auctions.add(auction_id)
+            bids.append(Bid(
+                auction_id=auction_id,
+                user_id=self.users[r["user"]],
+                amount=self._value(Bid, "amount", r["amount"])
+            ))
+        return bids
+
+    def _build_comments(self, records):
+        self._resolve_users([r.get("commented_by") for r in records])
+        comments = []
+        for r in records:
+            auction_id = int(r["auction"])
+            self.touched_auctions.add(auction_id)
+            comment = Comment(
+                auction_id=auction_id,
+                commented_by_id=self.users[r["commented_by"]],
+                comment_text=r.get("comment_text") or ""
+            )
+            if r.get("datetime_commented"):
+                comment.datetime_commented = self._value(Comment, "datetime_commented", r["datetime_commented"])
+            comments.append(comment)
+        return comments
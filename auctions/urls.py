@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import include, path
 
 from . import views
 
@@ -6,9 +6,17 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("categories/<str:category>/", views.categories, name="categories"),
     path("new", views.new, name="new"),
+    path("search", views.search, name="search"),
+    path("feeds/<str:name>", views.feed, name="feed"),
+    path("dashboard", views.dashboard, name="dashboard"),
+    path("dashboard.json", views.dashboard_json, name="dashboard_json"),
+    path("analytics", views.analytics_report, name="analytics"),
+    path("analytics.json", views.analytics_json, name="analytics_json"),
     path("watchlist", views.watchlist, name="watchlist"),
+    path("images/<str:rendition>/<str:token>", views.image, name="image"),
     path("listings/<str:id>", views.listings, name="listings"),
     path("login", views.login_view, name="login"),
     path("logout", views.logout_view, name="logout"),
-    path("register", views.register, name="register")
+    path("register", views.register, name="register"),
+    path("api/v1/", include("auctions.api_urls"))
 ]
@@ -1,18 +1,29 @@
 from django.contrib.auth import authenticate, login, logout
 from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, JsonResponse
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.shortcuts import render
 from django.urls import reverse
 from django import forms
 from datetime import datetime
 from django.utils import timezone
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_safe
 import decimal
 import pytz
 
 
-from .models import User, AuctionListing, Bid, Comment, Category, get_default_end_datetime
+from . import analytics, feeds, images
+from .archive import archived_listing
+from .bidding import PROXY_OUTBID, place_bid, set_max_bid
+from .catalog import category_choices, get_catalog
+from .fragments import listing_version
+from .dashboard import build_dashboard, is_watching, serialize_dashboard
+from .models import User, AuctionListing, Comment, get_default_end_datetime
+from .pagination import PAGE_SIZE, paginate_request
+from .scheduler import close_auctions
+from .search import search as search_listings
 
 DEFAULT_IMG = "https://upload.wikimedia.org/wikipedia/commons/thumb/3/3f/Placeholder_view_vector.svg/310px-Placeholder_view_vector.svg.png"
 
@@ -23,7 +34,8 @@ class NewAuctionForm(forms.Form):
     end_datetime = forms.DateTimeField(initial=get_default_end_datetime)
     initial_price = forms.DecimalField(max_digits=10, decimal_places=2, min_value=0, initial=0.00, required=True)
     image_url = forms.URLField(label="Auction image URL", required=False, empty_value=DEFAULT_IMG)
-    category = forms.ModelChoiceField(queryset=Category.objects.all(), empty_label="--None--", required=False)
+    # Choices come from the cached category catalog instead of a query per render
+    category = forms.TypedChoiceField(choices=category_choices("--None--"), coerce=int, empty_value=None, required=False)
     
     def clean_initial_price(self):
         initial_price = self.cleaned_data.get('initial_price')
@@ -34,8 +46,18 @@ class NewAuctionForm(forms.Form):
 class NewCommentForm(forms.Form):
     comment_text = forms.CharField(label="Add a new comment", widget=forms.Textarea)
 
+class SearchForm(forms.Form):
+    q = forms.CharField(label="Search", max_length=200, required=False)
+    category = forms.TypedChoiceField(choices=category_choices("All categories"), coerce=int, empty_value=None, required=False)
+    ended = forms.BooleanField(label="Include ended auctions", required=False)
+    page = forms.IntegerField(min_value=1, required=False, widget=forms.HiddenInput)
+
 class NewBidForm(forms.Form):
     amount = forms.DecimalField()
+    # Price shown to the bidder, tells "outbid while bidding" apart from a low bid
+    seen_price = forms.DecimalField(widget=forms.HiddenInput, required=False)
+    # The amount is a maximum, the proxy engine bids for the user up to it
+    proxy = forms.BooleanField(label="Bid automatically up to this amount", required=False)
 
     # Modified __init__ to add dynamic min and initial value
     # Code by: my favourite rubber duck <3
@@ -67,7 +89,7 @@ def new(request):
                 end_datetime=form.cleaned_data["end_datetime"],
                 initial_price=form.cleaned_data["initial_price"],
                 image_url=form.cleaned_data["image_url"],
-                category=form.cleaned_data["category"]
+                category_id=form.cleaned_data["category"]
             )
             al.save()
 
@@ -88,55 +110,71 @@ def new(request):
 
 
 def listings(request, id):
+    # Read before the listing: a fragment rendered from rows older than the version would be kept under it
+    version = listing_version(id)
     try:
-        listing = AuctionListing.objects.get(id=id)
+        listings = AuctionListing.objects.select_related("listed_by", "category")
+        # Only signed in users see whose bid is the highest, anonymous views don't touch the bids
+        if request.user.is_authenticated:
+            listings = listings.select_related("highest_bid").annotate(is_watching=is_watching(request.user))
+        listing = listings.get(id=id)
     except ObjectDoesNotExist:
+        # Old closed auctions are read from the archive
+        archived, comments = archived_listing(id)
+        if archived is not None:
+            return render(request, "auctions/archived_listing.html", {
+                "listing": archived,
+                "comments": comments,
+            })
         # Renders an error if listing id doesn't exists
         return render(request, "auctions/listings.html", {
             "message": "Error 404: Listing doesn't exists"
         })
     
-    # Add or remove user to watchers when button clicked
+    # Add or remove user to watchers when button clicked, only the watchers table changes
     if request.GET.get('watch') == "true":
         listing.watchers.add(request.user)
-        listing.save()
         return HttpResponseRedirect(request.path_info)
     elif request.GET.get('watch') == "false":
         listing.watchers.remove(request.user)
-        listing.save()
         return HttpResponseRedirect(request.path_info)
     
     # Validates new Bid and insert in DB
     if request.POST.get('amount'):
-        form = NewBidForm(
-            min_amount=decimal.Decimal(listing.current_price), 
-            initial={'amount': decimal.Decimal(listing.current_price)},
-            data=request.POST
-        )
+        form = NewBidForm(data=request.POST)
 
         # Check if data is valid
         if form.is_valid():
-            # Add the new bid to the DB
-            bid = Bid(
-                user = request.user,
-                auction = listing,
-                amount = form.cleaned_data["amount"]
-            )
-            bid.save()
-
-            return HttpResponseRedirect(request.path_info)
+            # The bid service checks the amount against the price at write time
+            if form.cleaned_data["proxy"]:
+                result = set_max_bid(listing.id, request.user, form.cleaned_data["amount"])
+            else:
+                result = place_bid(
+                    listing.id,
+                    request.user,
+                    form.cleaned_data["amount"],
+                    seen_price=form.cleaned_data["seen_price"]
+                )
+            if result.placed:
+                return HttpResponseRedirect(request.path_info)
+            message = result.message if result.status == PROXY_OUTBID else f"Error: {result.message}"
         else:
-            # Renders an error if invalid bid
-            return render(request, "auctions/listings.html", {
-                "listing": listing,
-                "comments": listing.comments.all().order_by('-datetime_commented'),
-                "new_comment": NewCommentForm(),
-                "new_bid": NewBidForm(
-                    min_amount= decimal.Decimal(listing.current_price), 
-                    initial={'amount': decimal.Decimal(listing.current_price)
-                }),
-                "message": "Error: Invalid bid amount"
-            })
+            message = "Error: Invalid bid amount"
+
+        # Renders an error if invalid bid, with the price as it is now
+        version = listing_version(listing.id)
+        listing.refresh_from_db()
+        return render(request, "auctions/listings.html", {
+            "listing": listing,
+            "version": version,
+            "comments": listing.comments.select_related("commented_by").order_by('-datetime_commented'),
+            "new_comment": NewCommentForm(),
+            "new_bid": NewBidForm(
+                min_amount= decimal.Decimal(listing.current_price), 
+                initial={'amount': decimal.Decimal(listing.current_price), 'seen_price': listing.current_price
+            }),
+            "message": message
+        })
             
         
     # Unlist Auction and determine winner
@@ -144,6 +182,7 @@ def listings(request, id):
         # Changing end date_time to present time to finish the auction
         listing.end_datetime = datetime.now(pytz.UTC)
         listing.save()
+        close_auctions([listing.id], listing.end_datetime, unlisted=True)
         return HttpResponseRedirect(request.path_info)
     
     # Handle new message form
@@ -161,25 +200,56 @@ def listings(request, id):
                 comment_text = form.cleaned_data["comment_text"]
             )
             comment.save()
+            version = listing_version(listing.id)
 
     # Render listing page with details
     return render(request, "auctions/listings.html", {
         "listing": listing,
-        "comments": listing.comments.all().order_by('-datetime_commented'),
+        "version": version,
+        "comments": listing.comments.select_related("commented_by").order_by('-datetime_commented'),
         "new_comment": NewCommentForm(),
         "new_bid": NewBidForm(
             min_amount= decimal.Decimal(listing.current_price), 
-            initial={'amount': decimal.Decimal(listing.current_price)
+            initial={'amount': decimal.Decimal(listing.current_price), 'seen_price': listing.current_price
         })
     })
 
 
+@login_required
+def dashboard(request):
+    return render(request, "auctions/dashboard.html", {
+        "dashboard": build_dashboard(request.user)
+    })
+
+
+def dashboard_json(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Login required"}, status=403)
+    return JsonResponse(serialize_dashboard(build_dashboard(request.user)))
+
+
+# Marketplace analytics of the last ?days= days, read from the rollups only
+@staff_member_required
+def analytics_report(request):
+    return render(request, "auctions/analytics.html", {
+        "report": analytics.build_report(analytics.parse_days(request.GET.get("days")))
+    })
+
+
+def analytics_json(request):
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff only"}, status=403)
+    return JsonResponse(analytics.build_report(analytics.parse_days(request.GET.get("days"))))
+
+
 @login_required
 def watchlist(request):
     # Renders all listings in your watchlist
     listings = AuctionListing.objects.filter(watchers=request.user)
+    page = paginate_request(request, listings, default_sort="newest")
     return render(request, "auctions/index.html", {
-        "listings": listings,
+        "listings": page.items,
+        "page": page,
         "title": "Watchlist"
     })
 
@@ -187,38 +257,98 @@ def watchlist(request):
 def index(request):
     # Filter auction listings by active (before end time passes)
     listings = AuctionListing.objects.filter(end_datetime__gt=timezone.now())
+    page = paginate_request(request, listings)
 
     return render(request, "auctions/index.html", {
-        "listings": listings,
+        "listings": page.items,
+        "page": page,
         "title": "Active listings"
     })
 
 
-def categories(request, category='all'):
+def feed(request, name):
+    # Ranked feeds, read from memory (feeds.py)
     try:
-        if category == 'all':
-            # Get all categories
-            categories = Category.objects.all().order_by("-name")
-            # Render all categories
-            return render(request, "auctions/categories.html", {
-                "categories": categories
-            })
-        else:
-            # Get category object
-            cat = Category.objects.get(name=category)
-            # Get all auction listings where category match and are active
-            listings = AuctionListing.objects.filter(category=cat.id, end_datetime__gt=timezone.now())
-            # Render all listings of current category
-            return render(request, "auctions/index.html", {
-                "listings": listings,
-                "category": category,
-                "title": "Active listings"
-            })
-    except:
+        listings = feeds.get_feed(name).top(PAGE_SIZE)
+    except KeyError:
+        raise Http404("No such feed")
+
+    return render(request, "auctions/index.html", {
+        "listings": listings,
+        "title": feeds.FEEDS[name],
+        "feeds": feeds.FEEDS,
+        "feed": name
+    })
+
+
+def search(request):
+    form = SearchForm(request.GET)
+    results = None
+    if form.is_valid() and form.cleaned_data["q"]:
+        results = search_listings(
+            form.cleaned_data["q"],
+            category=form.cleaned_data["category"],
+            active_only=not form.cleaned_data["ended"],
+            page=form.cleaned_data["page"] or 1
+        )
+    # Links to the other pages keep the query and filters
+    params = request.GET.copy()
+    params.pop("page", None)
+    return render(request, "auctions/search.html", {
+        "form": form,
+        "results": results,
+        "params": params.urlencode()
+    })
+
+
+def categories(request, category='all'):
+    # Categories, their slugs and stats come from the cached catalog, not the database
+    catalog = get_catalog()
+    if category == 'all':
+        # Render all categories
+        return render(request, "auctions/categories.html", {
+            "categories": catalog
+        })
+
+    entry = catalog.find(category)
+    if entry is None:
         return render(request, "auctions/index.html", {
             "listings": None,
             "message": "Error 404: Category not found"
         })
+    # Get all auction listings where category match and are active
+    listings = AuctionListing.objects.filter(category=entry.id, end_datetime__gt=timezone.now())
+    page = paginate_request(request, listings)
+    # Render all listings of current category
+    return render(request, "auctions/index.html", {
+        "listings": page.items,
+        "page": page,
+        "category": entry.name,
+        "title": "Active listings"
+    })
+
+
+@require_safe
+def image(request, rendition, token):
+    # A resized copy of a listing image, the token is the signed URL of the original
+    url = images.unsign_url(token)
+    if url is None or rendition not in images.RENDITIONS:
+        raise Http404("Unknown image")
+    found = images.pipeline.rendition(url, rendition) if images.ENABLED else None
+    if found is None:
+        # Not ready yet or can't be fetched (or the proxy is off), the browser loads the original this time
+        response = HttpResponseRedirect(url)
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    etag = f'"{found["etag"]}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(images.pipeline.store.path(found["path"]), "rb"), content_type=found["type"])
+    response["ETag"] = etag
+    response["Cache-Control"] = images.CACHE_CONTROL
+    return response
 
 
 def login_view(request):
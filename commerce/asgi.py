@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
+# Serve the async versions of the auctions views
+os.environ.setdefault('AUCTIONS_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()